@@ -3,9 +3,14 @@
 
 import asyncio
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Awaitable
 from loguru import logger
 from datetime import datetime
+from app.services.lifecycle import lifecycle
+
+class AgentCancelledError(Exception):
+    """Agent被取消时抛出的异常"""
+    pass
 
 class BaseAgent(ABC):
     """基础Agent类"""
@@ -16,6 +21,11 @@ class BaseAgent(ABC):
         self.status = "idle"
         self.created_at = datetime.now()
         self.last_activity = datetime.now()
+        self.children: List["BaseAgent"] = []
+        self.cancel_reason: Optional[str] = None
+        self._cancelled = False
+        self._cancel_event: Optional[asyncio.Event] = None
+        self.resources = lifecycle.scope(agent_id)  # Agent持有的浏览器、会话等资源
         
     @abstractmethod
     async def execute(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -36,12 +46,101 @@ class BaseAgent(ABC):
         self.last_activity = datetime.now()
         logger.info(f"Agent {self.agent_id} 状态更新: {status}")
     
+    def add_child(self, agent: "BaseAgent") -> "BaseAgent":
+        """登记子Agent，取消时会级联取消"""
+        self.children.append(agent)
+        if self._cancelled:
+            agent.cancel(self.cancel_reason)
+        return agent
+    
+    def cancel(self, reason: Optional[str] = None):
+        """
+        协作式取消Agent及其所有子Agent
+        
+        Args:
+            reason: 取消原因
+        """
+        if not self._cancelled:
+            self._cancelled = True
+            self.cancel_reason = reason or "任务已取消"
+            if self._cancel_event:
+                self._cancel_event.set()
+            logger.info(f"Agent {self.agent_id} 已取消: {self.cancel_reason}")
+        
+        for child in self.children:
+            child.cancel(self.cancel_reason)
+    
+    def release(self):
+        """释放Agent登记的所有资源，可重复调用"""
+        self.resources.close()
+    
+    @property
+    def is_cancelled(self) -> bool:
+        """是否已被取消"""
+        return self._cancelled
+    
+    def check_cancelled(self):
+        """如果已取消则抛出AgentCancelledError"""
+        if self._cancelled:
+            raise AgentCancelledError(self.cancel_reason)
+    
+    def _get_cancel_event(self) -> asyncio.Event:
+        # 延迟创建，避免在事件循环之外构造Agent时绑定错误的循环
+        if self._cancel_event is None:
+            self._cancel_event = asyncio.Event()
+            if self._cancelled:
+                self._cancel_event.set()
+        return self._cancel_event
+    
+    async def sleep(self, seconds: float):
+        """可被取消打断的等待"""
+        self.check_cancelled()
+        try:
+            await asyncio.wait_for(self._get_cancel_event().wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            return
+        self.check_cancelled()
+    
+    async def run_cancellable(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        执行一个可等待对象，取消时立即放弃等待
+        
+        用于浏览器操作和LLM调用等耗时步骤，取消后不再占用调用方。
+        
+        Args:
+            awaitable: 要执行的协程或Future
+            
+        Returns:
+            awaitable的执行结果
+        """
+        if self._cancelled:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            self.check_cancelled()
+        
+        task = asyncio.ensure_future(awaitable)
+        waiter = asyncio.ensure_future(self._get_cancel_event().wait())
+        try:
+            done, _ = await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            waiter.cancel()
+        
+        if task in done:
+            return task.result()
+        
+        task.cancel()
+        raise AgentCancelledError(self.cancel_reason)
+    
     def get_info(self) -> Dict[str, Any]:
         """获取Agent信息"""
         return {
             "agent_id": self.agent_id,
             "agent_type": self.agent_type,
             "status": self.status,
+            "cancelled": self._cancelled,
             "created_at": self.created_at.isoformat(),
             "last_activity": self.last_activity.isoformat()
-        } 
\ No newline at end of file
+        }
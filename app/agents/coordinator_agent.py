@@ -5,14 +5,57 @@
 
 import asyncio
 import uuid
-from typing import Dict, Any, List
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Set
 from loguru import logger
-from app.agents.base_agent import BaseAgent
+from app.agents.base_agent import BaseAgent, AgentCancelledError
 from app.agents.search_agent import SearchAgent
 from app.agents.negotiation_agent import NegotiationAgent
-from app.models.schema import TaskProgress, TaskStatus, ProductInfo
+from app.models.schema import TaskProgress, TaskStatus, UserCredentials
+from app.models.listing import Listing
+from app.services.chat_session import ChatMultiplexer
+from app.services.deepseek_client import deepseek_client
+from app.services.search_cache import search_cache
+from app.services.price_stats import price_index, listing_target
+from app.services.seller_profiles import seller_profiles
+from app.services.detail_enricher import detail_enricher
+from app.services.image_pipeline import image_pipeline
+from app.services.tracing import tracer
 from config.settings import settings
 
+class NegotiationCollector:
+    """谈判结果收集器 - 按完成顺序记录每个谈判Agent的结果"""
+    
+    def __init__(self, agents: List[NegotiationAgent]):
+        self.agents = agents
+        self.results: Dict[int, Dict[str, Any]] = {}
+    
+    def record(self, index: int, result: Dict[str, Any]):
+        """记录一个已完成的谈判结果"""
+        self.results[index] = result
+    
+    def has_result(self, agent: NegotiationAgent) -> bool:
+        return self.agents.index(agent) in self.results
+    
+    @property
+    def finished_count(self) -> int:
+        return len(self.results)
+    
+    def collect(self, reason: str) -> List[Dict[str, Any]]:
+        """
+        汇总谈判结果
+        
+        Args:
+            reason: 未完成谈判的说明
+            
+        Returns:
+            与Agent顺序一致的结果列表，未完成的谈判使用其当前对话快照
+        """
+        return [
+            self.results[i] if i in self.results else agent.snapshot(reason)
+            for i, agent in enumerate(self.agents)
+        ]
+
 class CoordinatorAgent(BaseAgent):
     """协调Agent - 负责整体任务协调和管理"""
     
@@ -20,6 +63,12 @@ class CoordinatorAgent(BaseAgent):
         super().__init__(agent_id, "coordinator_agent")
         self.task_progress = {}
         self.active_agents = {}
+        self.task_agents: Dict[str, List[BaseAgent]] = {}  # 每个任务下的Agent树
+        self.batch_tasks: Dict[str, List[str]] = {}  # 批次ID -> 子任务ID
+        self.cancelled_tasks: Set[str] = set()
+        self.progress_versions: Dict[str, int] = {}  # 每次进度变化递增
+        self._progress_json: Dict[str, Tuple[int, str]] = {}  # 按版本缓存的序列化结果
+        self._progress_events: Dict[str, asyncio.Event] = {}
         
     async def execute(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -31,69 +80,400 @@ class CoordinatorAgent(BaseAgent):
         Returns:
             最终比价结果
         """
+        task_id = task_data.get("task_id") or str(uuid.uuid4())
+        
+        with tracer.span("coordinator.execute", task_id=task_id):
+            try:
+                # 初始化任务进度
+                progress = TaskProgress(
+                    task_id=task_id,
+                    status=TaskStatus.INITIALIZING,
+                    message="初始化比价任务..."
+                )
+                self.task_progress[task_id] = progress
+                self._bump_progress_version(task_id)
+                
+                logger.info(f"开始执行比价任务: {task_id}")
+                
+                # 第一阶段：搜索商品
+                await self._update_progress(task_id, TaskStatus.SEARCHING, "正在搜索商品...", 10)
+                
+                search_agent = self._register_agent(task_id, SearchAgent(f"search_{task_id}"))
+                
+                with tracer.span("stage.search"):
+                    search_result = await search_agent.execute(task_data)
+                
+                if search_result.get("cancelled", False):
+                    return await self._cancelled_result(task_id, search_result.get("error", ""))
+                
+                if not search_result.get("success", False):
+                    await self._update_progress(task_id, TaskStatus.FAILED, f"搜索失败: {search_result.get('error', '')}", 0)
+                    return {"task_id": task_id, "success": False, "error": search_result.get("error", "")}
+                
+                products: List[Listing] = search_result.get("products", [])
+                # 搜索用到的关键词，用于查找市场价格统计
+                task_data = {**task_data, "keywords": search_agent.search_keywords(
+                    task_data.get("query", ""), search_result.get("requirement_analysis", {})
+                )}
+                await self._update_progress(task_id, TaskStatus.SEARCHING, f"找到 {len(products)} 个商品", 30)
+                
+                if not products:
+                    await self._update_progress(task_id, TaskStatus.COMPLETED, "未找到符合条件的商品", 100)
+                    return {"task_id": task_id, "success": True, "products": [], "best_deal": None}
+                
+                # 复用搜索阶段已登录的浏览器会话，谈判不再额外启动Chrome
+                chat_session = ChatMultiplexer(search_agent.goofish_service)
+                try:
+                    return await self._negotiate_and_compare(task_id, products, task_data, chat_session)
+                finally:
+                    # 关闭会话复用，浏览器随搜索Agent一同释放
+                    chat_session.close()
+                
+            except asyncio.CancelledError:
+                await self._update_progress(task_id, TaskStatus.CANCELLED, "任务已取消", 0)
+                raise
+                
+            except Exception as e:
+                logger.error(f"协调Agent执行失败: {e}")
+                await self._update_progress(task_id, TaskStatus.FAILED, f"执行失败: {str(e)}", 0)
+                return {"task_id": task_id, "success": False, "error": str(e)}
+            
+            finally:
+                # 无论成功、失败还是取消都释放资源
+                self._release_task(task_id)
+    
+    async def execute_products(self, task_data: Dict[str, Any], products: List[Listing],
+                               goofish_service) -> Dict[str, Any]:
+        """
+        对已找到的商品直接谈判和比价，跳过搜索阶段
+        
+        Args:
+            task_data: 任务数据
+            products: 待谈判的商品
+            goofish_service: 已登录的咸鱼服务，由调用方负责关闭
+            
+        Returns:
+            最终比价结果
+        """
+        task_id = task_data.get("task_id") or str(uuid.uuid4())
+        
+        self.task_progress[task_id] = TaskProgress(
+            task_id=task_id,
+            status=TaskStatus.SEARCHING,
+            message=f"找到 {len(products)} 个商品",
+            progress=30
+        )
+        self._bump_progress_version(task_id)
+        
+        chat_session = ChatMultiplexer(goofish_service)
         try:
-            task_id = str(uuid.uuid4())
+            return await self._negotiate_and_compare(task_id, products, task_data, chat_session)
             
-            # 初始化任务进度
-            progress = TaskProgress(
-                task_id=task_id,
-                status=TaskStatus.INITIALIZING,
-                message="初始化比价任务..."
-            )
-            self.task_progress[task_id] = progress
+        except asyncio.CancelledError:
+            await self._update_progress(task_id, TaskStatus.CANCELLED, "任务已取消", 0)
+            raise
+            
+        except Exception as e:
+            logger.error(f"协调Agent执行失败: {e}")
+            await self._update_progress(task_id, TaskStatus.FAILED, f"执行失败: {str(e)}", 0)
+            return {"task_id": task_id, "success": False, "error": str(e)}
+        
+        finally:
+            chat_session.close()
+            self._release_task(task_id)
+    
+    async def _negotiate_and_compare(self, task_id: str, products: List[Listing], task_data: Dict[str, Any],
+                                     chat_session: ChatMultiplexer) -> Dict[str, Any]:
+        """
+        谈判和比价阶段
+        
+        Args:
+            task_id: 任务ID
+            products: 筛选后的商品
+            task_data: 任务数据
+            chat_session: 已登录的共享聊天会话
             
-            logger.info(f"开始执行比价任务: {task_id}")
+        Returns:
+            最终比价结果
+        """
+        # 第二阶段：并行谈判
+        await self._update_progress(task_id, TaskStatus.COMMUNICATING, "开始与卖家沟通...", 40)
+        
+        # 谈判名额有限，优先分给可能很快回复的卖家
+        products = seller_profiles.prioritize(products)
+        
+        with tracer.span("stage.negotiate", task_id=task_id, products=len(products)):
+            negotiation_results = await self._parallel_negotiate(task_id, products, task_data, chat_session)
+        
+        if self._is_task_cancelled(task_id):
+            return await self._cancelled_result(task_id, "任务已取消")
+        
+        # 谈判期间到达的详情补到结果中，顺序不变，与谈判结果一一对应
+        products = detail_enricher.apply(products)
+        image_pipeline.submit(products)
+        
+        # 第三阶段：比价分析
+        await self._update_progress(task_id, TaskStatus.COMPARING, "分析比价结果...", 80)
+        
+        with tracer.span("stage.compare", task_id=task_id):
+            best_deal = self._find_best_deal(products, negotiation_results)
+        
+        # 完成任务
+        await self._update_progress(task_id, TaskStatus.COMPLETED, "比价完成", 100)
+        
+        return {
+            "task_id": task_id,
+            "success": True,
+            "products": [p.to_dict() for p in products],
+            "negotiations": negotiation_results,
+            "best_deal": best_deal.to_dict() if best_deal else None
+        }
+    
+    async def execute_batch(self, batch_id: str, tasks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量执行比价任务
+        
+        所有查询的需求一起分析，搜索关键词取并集后每个只搜索一次，
+        同一账号的查询共用一个登录会话。
+        
+        Args:
+            batch_id: 批次ID
+            tasks: 每个查询的任务数据，需包含task_id
             
-            # 第一阶段：搜索商品
-            await self._update_progress(task_id, TaskStatus.SEARCHING, "正在搜索商品...", 10)
+        Returns:
+            批次结果，results中按输入顺序给出每个查询的比价结果
+        """
+        task_ids = [task["task_id"] for task in tasks]
+        self.batch_tasks[batch_id] = task_ids
+        
+        try:
+            for task_id in task_ids:
+                self.task_progress[task_id] = TaskProgress(
+                    task_id=task_id,
+                    status=TaskStatus.INITIALIZING,
+                    message="初始化批量比价任务..."
+                )
+                self._bump_progress_version(task_id)
             
-            search_agent = SearchAgent(f"search_{task_id}")
-            self.active_agents[search_agent.agent_id] = search_agent
+            logger.info(f"开始执行批量比价任务: {batch_id}，共 {len(tasks)} 个查询")
             
-            search_result = await search_agent.execute(task_data)
+            # 一起分析所有查询的需求
+            analyses = await deepseek_client.analyze_product_requirements(
+                [task.get("query", "") for task in tasks]
+            )
+            if self._is_task_cancelled(batch_id):
+                raise AgentCancelledError("任务已取消")
             
-            if not search_result.get("success", False):
-                await self._update_progress(task_id, TaskStatus.FAILED, f"搜索失败: {search_result.get('error', '')}", 0)
-                return {"task_id": task_id, "success": False, "error": search_result.get("error", "")}
+            # 每个账号只登录一次
+            accounts: Dict[str, SearchAgent] = {}
+            account_credentials: Dict[str, UserCredentials] = {}
+            for task in tasks:
+                credentials = UserCredentials(**task.get("credentials", {}))
+                if credentials.username not in accounts:
+                    accounts[credentials.username] = self._register_agent(
+                        batch_id, SearchAgent(f"search_{batch_id}_{len(accounts)}")
+                    )
+                    account_credentials[credentials.username] = credentials
             
-            products = [ProductInfo(**p) for p in search_result.get("products", [])]
-            await self._update_progress(task_id, TaskStatus.SEARCHING, f"找到 {len(products)} 个商品", 30)
+            for task_id in task_ids:
+                await self._update_progress(task_id, TaskStatus.LOGGING_IN, "正在登录...", 5)
             
-            if not products:
-                await self._update_progress(task_id, TaskStatus.COMPLETED, "未找到符合条件的商品", 100)
-                return {"task_id": task_id, "success": True, "products": [], "best_deal": None}
+            with tracer.span("stage.login", task_id=batch_id, accounts=len(accounts)):
+                login_results = await asyncio.gather(*[
+                    agent.login(account_credentials[username]) for username, agent in accounts.items()
+                ], return_exceptions=True)
+            if self._is_task_cancelled(batch_id):
+                raise AgentCancelledError("任务已取消")
+            logged_in = {
+                username: agent for (username, agent), ok in zip(accounts.items(), login_results) if ok is True
+            }
             
-            # 第二阶段：并行谈判
-            await self._update_progress(task_id, TaskStatus.COMMUNICATING, "开始与卖家沟通...", 40)
+            if not logged_in:
+                for task_id in task_ids:
+                    await self._update_progress(task_id, TaskStatus.FAILED, "登录失败", 0)
+                return {"batch_id": batch_id, "success": False, "error": "登录失败", "results": []}
             
-            negotiation_results = await self._parallel_negotiate(task_id, products, task_data)
+            # 关键词取并集，每个关键词按所有查询中最高的价格上限只搜索一次
+            keyword_prices: Dict[str, float] = {}
+            task_keywords: List[List[str]] = []
+            for task, analysis in zip(tasks, analyses):
+                search_agent = accounts[task["credentials"]["username"]]
+                keywords = search_agent.search_keywords(task.get("query", ""), analysis)
+                task_keywords.append(keywords)
+                for keyword in keywords:
+                    keyword_prices[keyword] = max(keyword_prices.get(keyword, 0), task.get("max_price", 0))
             
-            # 第三阶段：比价分析
-            await self._update_progress(task_id, TaskStatus.COMPARING, "分析比价结果...", 80)
+            for task_id in task_ids:
+                await self._update_progress(task_id, TaskStatus.SEARCHING, "正在搜索商品...", 10)
             
-            best_deal = self._find_best_deal(products, negotiation_results)
+            with tracer.span("stage.search", task_id=batch_id, keywords=len(keyword_prices)):
+                keyword_results = await self._search_keywords(keyword_prices, list(logged_in.values()))
+            logger.info(f"批量任务 {batch_id}: {len(tasks)} 个查询共搜索 {len(keyword_prices)} 个关键词")
             
-            # 完成任务
-            await self._update_progress(task_id, TaskStatus.COMPLETED, "比价完成", 100)
+            # 每个账号的Cookie只读一次，之后浏览器交给聊天会话串行使用
+            account_cookies = {
+                username: await asyncio.to_thread(agent.goofish_service.get_cookies)
+                for username, agent in logged_in.items()
+            }
             
-            # 清理资源
-            search_agent.close()
+            # 每个查询独立筛选、谈判和比价；同一账号共用一个聊天会话
+            chat_sessions = {
+                username: ChatMultiplexer(agent.goofish_service) for username, agent in logged_in.items()
+            }
+            try:
+                results = await asyncio.gather(*[
+                    self._execute_batch_item(
+                        task, analysis, keywords, keyword_results, accounts, account_cookies, chat_sessions
+                    )
+                    for task, analysis, keywords in zip(tasks, analyses, task_keywords)
+                ])
+            finally:
+                for chat_session in chat_sessions.values():
+                    chat_session.close()
             
             return {
-                "task_id": task_id,
+                "batch_id": batch_id,
                 "success": True,
-                "products": [p.dict() for p in products],
-                "negotiations": negotiation_results,
-                "best_deal": best_deal.dict() if best_deal else None
+                "searched_keywords": len(keyword_prices),
+                "results": results
             }
             
+        except AgentCancelledError as e:
+            for task_id in task_ids:
+                await self._update_progress(task_id, TaskStatus.CANCELLED, str(e) or "任务已取消", 0)
+            return {"batch_id": batch_id, "success": False, "cancelled": True, "error": str(e), "results": []}
+            
+        except asyncio.CancelledError:
+            for task_id in task_ids:
+                await self._update_progress(task_id, TaskStatus.CANCELLED, "任务已取消", 0)
+            raise
+            
         except Exception as e:
-            logger.error(f"协调Agent执行失败: {e}")
-            if 'task_id' in locals():
+            logger.error(f"批量比价执行失败: {e}")
+            for task_id in task_ids:
                 await self._update_progress(task_id, TaskStatus.FAILED, f"执行失败: {str(e)}", 0)
-            return {"success": False, "error": str(e)}
+            return {"batch_id": batch_id, "success": False, "error": str(e), "results": []}
+        
+        finally:
+            self._release_task(batch_id)
+            for task_id in self.batch_tasks.pop(batch_id, []):
+                self._release_task(task_id)
     
-    async def _parallel_negotiate(self, task_id: str, products: List[ProductInfo], task_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def _search_keywords(self, keyword_prices: Dict[str, float],
+                               search_agents: List[SearchAgent]) -> Dict[str, List[Listing]]:
+        """把去重后的关键词分配给已登录的会话，各会话内串行、会话之间并行搜索"""
+        assignments: Dict[int, List[str]] = {}
+        for i, keyword in enumerate(keyword_prices):
+            assignments.setdefault(i % len(search_agents), []).append(keyword)
+        
+        results: Dict[str, List[Listing]] = {}
+        
+        async def search_with(agent: SearchAgent, keywords: List[str]):
+            for keyword in keywords:
+                agent.check_cancelled()
+                results[keyword] = await agent.run_cancellable(
+                    search_cache.search(agent.goofish_service, keyword, keyword_prices[keyword])
+                )
+        
+        await asyncio.gather(*[
+            search_with(search_agents[index], keywords) for index, keywords in assignments.items()
+        ])
+        return results
+    
+    async def _execute_batch_item(self, task_data: Dict[str, Any], analysis: Dict[str, Any], keywords: List[str],
+                                  keyword_results: Dict[str, List[Listing]], accounts: Dict[str, SearchAgent],
+                                  account_cookies: Dict[str, Dict[str, str]],
+                                  chat_sessions: Dict[str, ChatMultiplexer]) -> Dict[str, Any]:
+        """批量任务中单个查询的筛选、谈判和比价"""
+        task_id = task_data["task_id"]
+        max_price = task_data.get("max_price", 0)
+        username = task_data["credentials"]["username"]
+        
+        try:
+            if username not in chat_sessions:
+                await self._update_progress(task_id, TaskStatus.FAILED, "登录失败", 0)
+                return {"task_id": task_id, "success": False, "error": "登录失败"}
+            
+            candidates = [
+                product for keyword in keywords
+                for product in keyword_results.get(keyword, []) if product.price <= max_price
+            ]
+            products = await accounts[username].select_products(candidates, analysis, account_cookies[username])
+            await self._update_progress(task_id, TaskStatus.SEARCHING, f"找到 {len(products)} 个商品", 30)
+            
+            if not products:
+                await self._update_progress(task_id, TaskStatus.COMPLETED, "未找到符合条件的商品", 100)
+                return {"task_id": task_id, "success": True, "products": [], "best_deal": None}
+            
+            task_data = {**task_data, "keywords": keywords}
+            return await self._negotiate_and_compare(task_id, products, task_data, chat_sessions[username])
+            
+        except Exception as e:
+            logger.error(f"批量任务 {task_id} 执行失败: {e}")
+            await self._update_progress(task_id, TaskStatus.FAILED, f"执行失败: {str(e)}", 0)
+            return {"task_id": task_id, "success": False, "error": str(e)}
+    
+    def _register_agent(self, task_id: str, agent: BaseAgent) -> BaseAgent:
+        """登记任务下的子Agent，便于统一取消和清理"""
+        if self._is_task_cancelled(task_id):
+            agent.cancel("任务已取消")
+        self.task_agents.setdefault(task_id, []).append(agent)
+        self.active_agents[agent.agent_id] = agent
+        self.add_child(agent)
+        return agent
+    
+    def _release_task(self, task_id: str):
+        """释放任务占用的Agent和浏览器"""
+        self.cancelled_tasks.discard(task_id)
+        for agent in self.task_agents.pop(task_id, []):
+            self.active_agents.pop(agent.agent_id, None)
+            if agent in self.children:
+                self.children.remove(agent)
+            agent.release()
+    
+    def _is_task_cancelled(self, task_id: str) -> bool:
+        return task_id in self.cancelled_tasks
+    
+    async def _cancelled_result(self, task_id: str, reason: str) -> Dict[str, Any]:
+        await self._update_progress(task_id, TaskStatus.CANCELLED, reason or "任务已取消", 0)
+        return {"task_id": task_id, "success": False, "cancelled": True, "error": reason or "任务已取消"}
+    
+    def cancel_task(self, task_id: str, reason: str = "用户取消任务") -> bool:
+        """
+        取消比价任务
+        
+        级联取消任务下的所有Agent，并立即关闭浏览器，使资源尽快回到排队中的任务。
+        
+        Args:
+            task_id: 任务ID
+            reason: 取消原因
+            
+        Returns:
+            是否找到了正在运行的任务
+        """
+        if task_id in self.batch_tasks:
+            # 取消批次：取消其下所有查询，并关闭共享的登录会话
+            for sub_task_id in self.batch_tasks[task_id]:
+                self.cancel_task(sub_task_id, reason)
+        
+        agents = self.task_agents.get(task_id)
+        if not agents and task_id not in self.batch_tasks:
+            return False
+        
+        logger.info(f"取消比价任务 {task_id}: {reason}")
+        self.cancelled_tasks.add(task_id)
+        for agent in agents or []:
+            agent.cancel(reason)
+            agent.release()
+        
+        if task_id in self.task_progress:
+            self.task_progress[task_id].status = TaskStatus.CANCELLED
+            self.task_progress[task_id].message = reason
+            self._bump_progress_version(task_id)
+        return True
+    
+    async def _parallel_negotiate(self, task_id: str, products: List[Listing], task_data: Dict[str, Any],
+                                  chat_session: ChatMultiplexer) -> List[Dict[str, Any]]:
         """
         并行与多个卖家谈判
         
@@ -101,73 +481,135 @@ class CoordinatorAgent(BaseAgent):
             task_id: 任务ID
             products: 商品列表
             task_data: 任务数据
+            chat_session: 已登录的共享聊天会话，浏览器命令经由其串行执行
             
         Returns:
             谈判结果列表
         """
         max_price = task_data.get("max_price", 0)
-        target_price = max_price * 0.8  # 目标价格为最高价格的80%
+        
+        # 有足够的市场价格样本时按市场行情定目标价，否则取最高价格的80%
+        market_queries = [task_data.get("query", "")] + task_data.get("keywords", [])
+        market_target = price_index.target_price(market_queries, max_price)
+        if market_target is not None:
+            logger.info(f"市场目标价: {market_target}（最高价格 {max_price}）")
         
         # 限制并发谈判数量
         max_concurrent = min(len(products), settings.MAX_CONCURRENT_AGENTS)
         selected_products = products[:max_concurrent]
         
         # 创建谈判任务
-        negotiation_tasks = []
         negotiation_agents = []
-        
-        # 这里需要共享咸鱼服务实例，实际实现中需要考虑线程安全
-        from app.services.goofish_service import XianyuService
-        shared_xianyu_service = XianyuService()
+        negotiation_inputs = []
         
         for i, product in enumerate(selected_products):
             agent_id = f"negotiation_{task_id}_{i}"
-            agent = NegotiationAgent(agent_id, product.seller_id)
+            agent = self._register_agent(task_id, NegotiationAgent(agent_id, product.seller_id))
             negotiation_agents.append(agent)
             
-            task_data_copy = {
-                "product_info": product.dict(),
-                "target_price": target_price,
-                "xianyu_service": shared_xianyu_service
-            }
+            if market_target is not None:
+                target_price = listing_target(market_target, product.price)
+            else:
+                target_price = max_price * 0.8
+            
+            # 卖家此前对该商品的最低报价以下不再压价
+            floor_price = seller_profiles.floor_for(product)
+            if floor_price is not None and target_price < floor_price:
+                target_price = floor_price
             
-            task = agent.execute(task_data_copy)
-            negotiation_tasks.append(task)
+            negotiation_inputs.append({
+                "product_info": product,
+                "target_price": target_price,
+                "goofish_service": chat_session
+            })
+        
+        collector = NegotiationCollector(negotiation_agents)
+        negotiation_tasks = [
+            asyncio.create_task(self._run_negotiation(task_id, i, agent, negotiation_inputs[i], collector))
+            for i, agent in enumerate(negotiation_agents)
+        ]
         
         # 并行执行谈判
         logger.info(f"开始并行谈判，共 {len(negotiation_tasks)} 个任务")
         
         try:
-            # 设置超时时间
-            results = await asyncio.wait_for(
-                asyncio.gather(*negotiation_tasks, return_exceptions=True),
-                timeout=settings.AGENT_TIMEOUT
-            )
+            # 全局截止时间：到期后保留已完成的结果，未完成的取当前最佳对话
+            _, pending = await asyncio.wait(negotiation_tasks, timeout=settings.AGENT_TIMEOUT)
             
-            # 处理结果
-            negotiation_results = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    logger.error(f"谈判任务 {i} 失败: {result}")
-                    negotiation_results.append({
-                        "success": False,
-                        "error": str(result),
-                        "seller_id": selected_products[i].seller_id
-                    })
-                else:
-                    negotiation_results.append(result)
+            if pending:
+                logger.warning(f"谈判任务超时，{len(pending)} 个谈判未完成，保留已有结果")
+                for agent in negotiation_agents:
+                    if not collector.has_result(agent):
+                        agent.cancel("谈判超时")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
             
-            return negotiation_results
+            return collector.collect("谈判超时")
             
+        finally:
+            # 任务被外部取消时，确保子任务不会继续运行
+            for task in negotiation_tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _run_negotiation(self, task_id: str, index: int, agent: NegotiationAgent,
+                               task_data: Dict[str, Any], collector: "NegotiationCollector") -> Dict[str, Any]:
+        """在单个谈判的截止时间内执行谈判，并把结果交给收集器"""
+        try:
+            result = await asyncio.wait_for(
+                self._negotiate_with_early_stop(agent, task_data, collector.agents),
+                timeout=settings.NEGOTIATION_TIMEOUT
+            )
         except asyncio.TimeoutError:
-            logger.warning("谈判任务超时")
-            return [{"success": False, "error": "谈判超时"} for _ in selected_products]
+            logger.warning(f"与卖家 {agent.seller_id} 的谈判超过 {settings.NEGOTIATION_TIMEOUT} 秒，保留当前对话")
+            result = agent.snapshot("谈判超时")
+        except Exception as e:
+            logger.error(f"谈判任务 {index} 失败: {e}")
+            result = {
+                "success": False,
+                "error": str(e),
+                "seller_id": agent.seller_id
+            }
         
-        finally:
-            # 清理资源
-            shared_xianyu_service.close()
+        collector.record(index, result)
+        
+        finished = collector.finished_count
+        total = len(collector.agents)
+        await self._update_progress(
+            task_id, TaskStatus.COMMUNICATING, f"已完成 {finished}/{total} 个谈判", 40 + 40 * finished / total
+        )
+        return result
     
-    def _find_best_deal(self, products: List[ProductInfo], negotiations: List[Dict[str, Any]]) -> ProductInfo:
+    async def _negotiate_with_early_stop(self, agent: NegotiationAgent, task_data: Dict[str, Any],
+                                         siblings: List[NegotiationAgent]) -> Dict[str, Any]:
+        """执行单个谈判，达到"足够好"的价格时停止其余谈判"""
+        chat_session: ChatMultiplexer = task_data["goofish_service"]
+        product: Listing = task_data["product_info"]
+        result = await chat_session.negotiate_exclusively(
+            product.seller_id, product.id, lambda: agent.execute(task_data)
+        )
+        
+        if settings.EARLY_STOP_MODE != "off" and self._is_good_enough(result, task_data.get("target_price", 0)):
+            logger.info(f"卖家 {agent.seller_id} 已达到满意价格 {result.get('final_price')}，停止其余谈判")
+            for other in siblings:
+                if other is agent:
+                    continue
+                if settings.EARLY_STOP_MODE == "deprioritize":
+                    other.wind_down()
+                else:
+                    other.cancel("已有谈判达到满意价格")
+        
+        return result
+    
+    def _is_good_enough(self, result: Dict[str, Any], target_price: float) -> bool:
+        """判断谈判结果是否满足提前结束规则"""
+        if not result.get("success", False):
+            return False
+        final_price = result.get("final_price")
+        return final_price is not None and final_price <= target_price * settings.GOOD_ENOUGH_PRICE_RATIO
+    
+    def _find_best_deal(self, products: List[Listing], negotiations: List[Dict[str, Any]]) -> Listing:
         """
         找到最佳交易
         
@@ -182,21 +624,19 @@ class CoordinatorAgent(BaseAgent):
         best_price = float('inf')
         
         for i, product in enumerate(products):
-            if i < len(negotiations):
-                negotiation = negotiations[i]
-                if negotiation.get("success", False):
-                    final_price = negotiation.get("final_price", product.price)
-                    if final_price < best_price:
-                        best_price = final_price
-                        best_product = product
-                        # 更新商品价格为谈判后的价格
-                        best_product.price = final_price
-            
-            # 如果没有谈判结果，使用原价格
-            if product.price < best_price:
-                best_price = product.price
+            # 谈判成功时使用谈判后的价格，否则使用原价格
+            price = product.price
+            if i < len(negotiations) and negotiations[i].get("success", False):
+                final_price = negotiations[i].get("final_price")
+                price = final_price if final_price is not None else product.price
+            
+            if price < best_price:
+                best_price = price
                 best_product = product
         
+        # 商品可能被搜索缓存共享，返回带谈判价格的副本而不修改原记录
+        if best_product is not None and best_product.price != best_price:
+            best_product = best_product.replace(price=best_price)
         return best_product
     
     async def _update_progress(self, task_id: str, status: TaskStatus, message: str, progress: float):
@@ -205,10 +645,73 @@ class CoordinatorAgent(BaseAgent):
             self.task_progress[task_id].status = status
             self.task_progress[task_id].message = message
             self.task_progress[task_id].progress = progress
+            self._bump_progress_version(task_id)
             logger.info(f"任务 {task_id} 进度更新: {message} ({progress}%)")
     
+    def _bump_progress_version(self, task_id: str):
+        """进度发生变化：递增版本号并唤醒等待中的订阅者"""
+        self.task_progress[task_id].updated_at = datetime.now()
+        self.progress_versions[task_id] = self.progress_versions.get(task_id, 0) + 1
+        event = self._progress_events.pop(task_id, None)
+        if event:
+            event.set()
+    
     def get_task_progress(self, task_id: str) -> Dict[str, Any]:
         """获取任务进度"""
         if task_id in self.task_progress:
             return self.task_progress[task_id].dict()
-        return None 
\ No newline at end of file
+        return None
+    
+    def get_progress_version(self, task_id: str) -> Optional[int]:
+        """获取任务进度的当前版本号，任务不存在时返回None"""
+        if task_id not in self.task_progress:
+            return None
+        return self.progress_versions.get(task_id, 0)
+    
+    def get_task_progress_json(self, task_id: str) -> Optional[Tuple[int, str]]:
+        """
+        获取序列化后的任务进度
+        
+        每个版本只序列化一次，所有轮询和订阅请求共用。
+        
+        Returns:
+            (版本号, 进度JSON)，任务不存在时返回None
+        """
+        progress = self.task_progress.get(task_id)
+        if progress is None:
+            return None
+        
+        version = self.progress_versions.get(task_id, 0)
+        cached = self._progress_json.get(task_id)
+        if cached is None or cached[0] != version:
+            cached = (version, progress.json())
+            self._progress_json[task_id] = cached
+        return cached
+    
+    def is_task_finished(self, task_id: str) -> bool:
+        progress = self.task_progress.get(task_id)
+        return progress is not None and progress.status in (
+            TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED
+        )
+    
+    async def wait_for_progress(self, task_id: str, version: int, timeout: float) -> bool:
+        """
+        等待任务进度离开指定版本
+        
+        Args:
+            task_id: 任务ID
+            version: 调用方已知的版本号
+            timeout: 最长等待时间(秒)
+            
+        Returns:
+            进度是否已经更新
+        """
+        if self.get_progress_version(task_id) != version:
+            return True
+        
+        event = self._progress_events.setdefault(task_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False 
\ No newline at end of file
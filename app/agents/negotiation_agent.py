@@ -2,12 +2,16 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any
 from loguru import logger
-from app.agents.base_agent import BaseAgent
-from app.services.goofish_service import GoofishService
+from app.agents.base_agent import BaseAgent, AgentCancelledError
 from app.services.deepseek_client import deepseek_client
-from app.models.schema import ProductInfo, CommunicationRecord
+from app.services.price_parser import extract_offer
+from app.services.seller_profiles import seller_profiles
+from app.models.listing import Listing
+from app.services.tracing import tracer
+from config.settings import settings
 
 class NegotiationAgent(BaseAgent):
     """谈判Agent - 负责与单个卖家进行价格谈判"""
@@ -18,6 +22,8 @@ class NegotiationAgent(BaseAgent):
         self.goofish_service = None
         self.conversation_history = []
         self.max_rounds = 3  # 最大谈判轮数
+        self.current_round = 0
+        self.current_price = None
         
     async def execute(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -32,7 +38,7 @@ class NegotiationAgent(BaseAgent):
         try:
             self.update_status("initializing")
             
-            product_info = task_data.get("product_info", {})
+            product_info: Listing = task_data["product_info"]
             target_price = task_data.get("target_price", 0)
             goofish_service = task_data.get("goofish_service")
             
@@ -45,7 +51,7 @@ class NegotiationAgent(BaseAgent):
             
             self.goofish_service = goofish_service
             
-            logger.info(f"开始与卖家 {self.seller_id} 谈判商品: {product_info.get('title', '')}")
+            logger.info(f"开始与卖家 {self.seller_id} 谈判商品: {product_info.title}")
             
             # 开始谈判流程
             self.update_status("negotiating")
@@ -61,6 +67,19 @@ class NegotiationAgent(BaseAgent):
                 "rounds": len(self.conversation_history) // 2  # 每轮包含发送和接收
             }
             
+        except AgentCancelledError as e:
+            logger.info(f"与卖家 {self.seller_id} 的谈判已取消: {e}")
+            self.update_status("cancelled")
+            return {
+                "success": False,
+                "cancelled": True,
+                "error": str(e),
+                "seller_id": self.seller_id,
+                "final_price": self.current_price,
+                "conversation_history": self.conversation_history,
+                "rounds": len(self.conversation_history) // 2
+            }
+            
         except Exception as e:
             logger.error(f"谈判Agent执行失败: {e}")
             self.update_status("failed")
@@ -70,7 +89,7 @@ class NegotiationAgent(BaseAgent):
                 "final_price": None
             }
     
-    async def _negotiate_with_seller(self, product_info: Dict[str, Any], target_price: float) -> float:
+    async def _negotiate_with_seller(self, product_info: Listing, target_price: float) -> float:
         """
         与卖家进行谈判
         
@@ -81,30 +100,46 @@ class NegotiationAgent(BaseAgent):
         Returns:
             最终谈判价格
         """
-        current_price = product_info.get("price", 0)
+        current_price = product_info.price
         original_price = current_price
+        self.current_price = current_price
         
-        for round_num in range(self.max_rounds):
-            logger.info(f"谈判第 {round_num + 1} 轮")
-            
-            # 生成谈判消息
-            seller_info = {"seller_id": self.seller_id}
-            message = await deepseek_client.generate_negotiation_message(
-                product_info, seller_info, self.conversation_history, target_price
-            )
-            
-            # 发送消息给卖家
-            success = await self.goofish_service.send_message_to_seller(self.seller_id, message)
-            if success:
-                self.conversation_history.append({
-                    "type": "sent",
-                    "message": message,
-                    "timestamp": asyncio.get_event_loop().time()
-                })
-            
-            # 等待卖家回复
-            response = await self.goofish_service.get_seller_response(self.seller_id)
-            if response:
+        round_num = 0
+        while round_num < self.max_rounds:
+            with tracer.span("negotiation.round", round=round_num + 1, seller_id=self.seller_id):
+                self.check_cancelled()
+                self.current_round = round_num
+                logger.info(f"谈判第 {round_num + 1} 轮")
+                
+                # 生成谈判消息
+                seller_info = {"seller_id": self.seller_id}
+                message = await self.run_cancellable(deepseek_client.generate_negotiation_message(
+                    product_info.to_dict(), seller_info, self.conversation_history, target_price
+                ))
+                
+                # 发送消息给卖家
+                success = await self.run_cancellable(
+                    self.goofish_service.send_message_to_seller(self.seller_id, message)
+                )
+                if success:
+                    self.conversation_history.append({
+                        "type": "sent",
+                        "message": message,
+                        "timestamp": asyncio.get_event_loop().time()
+                    })
+                
+                # 等待卖家回复，回复到达时立即继续
+                sent_at = time.monotonic()
+                response = await self.run_cancellable(
+                    self.goofish_service.get_seller_response(self.seller_id, settings.SELLER_REPLY_TIMEOUT)
+                )
+                if success:
+                    # 消息没发出去时不计入卖家的回复记录
+                    seller_profiles.record_reply(self.seller_id, time.monotonic() - sent_at if response else None)
+                if not response:
+                    logger.info(f"卖家 {self.seller_id} 未在 {settings.SELLER_REPLY_TIMEOUT} 秒内回复，结束谈判")
+                    break
+                
                 self.conversation_history.append({
                     "type": "received",
                     "message": response,
@@ -115,18 +150,45 @@ class NegotiationAgent(BaseAgent):
                 new_price = self._extract_price_from_response(response, current_price)
                 if new_price and new_price < current_price:
                     current_price = new_price
+                    self.current_price = current_price
                     logger.info(f"卖家降价至: {current_price}")
+                    seller_profiles.record_offer(self.seller_id, product_info.id, current_price)
                     
                     # 如果达到目标价格，结束谈判
                     if current_price <= target_price:
                         logger.info("达到目标价格，谈判成功")
                         break
-            
-            # 等待一段时间再进行下一轮
-            await asyncio.sleep(2)
+                
+            round_num += 1
         
         return current_price
     
+    def snapshot(self, reason: str) -> Dict[str, Any]:
+        """
+        获取尚未结束的谈判的当前结果
+        
+        Args:
+            reason: 谈判未完成的原因
+            
+        Returns:
+            包含当前价格和对话历史的部分结果，卖家已回复时视为有效报价
+        """
+        replied = any(record["type"] == "received" for record in self.conversation_history)
+        return {
+            "success": replied and self.current_price is not None,
+            "partial": True,
+            "error": reason,
+            "seller_id": self.seller_id,
+            "final_price": self.current_price,
+            "conversation_history": list(self.conversation_history),
+            "rounds": len(self.conversation_history) // 2
+        }
+    
+    def wind_down(self):
+        """降低优先级：完成当前轮次后结束谈判"""
+        self.max_rounds = min(self.max_rounds, self.current_round + 1)
+        logger.info(f"与卖家 {self.seller_id} 的谈判将在本轮后结束")
+    
     def _extract_price_from_response(self, response: str, current_price: float) -> float:
         """
         从卖家回复中提取价格信息
@@ -138,30 +200,5 @@ class NegotiationAgent(BaseAgent):
         Returns:
             提取到的价格，如果没有则返回当前价格
         """
-        import re
-        
-        # 查找价格模式
-        price_patterns = [
-            r'(\d+\.?\d*)元',
-            r'(\d+\.?\d*)块',
-            r'(\d+\.?\d*)',
-        ]
-        
-        for pattern in price_patterns:
-            matches = re.findall(pattern, response)
-            if matches:
-                try:
-                    price = float(matches[0])
-                    # 价格合理性检查
-                    if 0 < price < current_price * 2:
-                        return price
-                except ValueError:
-                    continue
-        
-        # 如果提到优惠但没有具体价格，假设优惠5-15元
-        if any(keyword in response for keyword in ["优惠", "便宜", "减"]):
-            import random
-            discount = random.uniform(5, 15)
-            return max(current_price - discount, current_price * 0.8)
-        
-        return current_price 
\ No newline at end of file
+        offer = extract_offer(response, current_price)
+        return offer if offer is not None else current_price
\ No newline at end of file
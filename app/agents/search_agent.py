@@ -2,20 +2,30 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from loguru import logger
-from app.agents.base_agent import BaseAgent
-from app.services.goofish_service import GoofishService
+from app.agents.base_agent import BaseAgent, AgentCancelledError
+from app.services.goofish_service import create_goofish_service
 from app.services.deepseek_client import deepseek_client
-from app.models.schema import ProductInfo, UserCredentials
+from app.services.search_cache import search_cache
+from app.services.dedup import deduplicate_products
+from app.services.image_pipeline import image_pipeline
+from app.services.ranking import ranking_engine
+from app.services.detail_enricher import detail_enricher
+from app.models.schema import UserCredentials
+from app.models.listing import Listing
+from app.services.tracing import traced
 
 class SearchAgent(BaseAgent):
     """搜索Agent - 负责商品搜索和筛选"""
     
     def __init__(self, agent_id: str):
         super().__init__(agent_id, "search_agent")
-        self.goofish_service = GoofishService()
+        self.goofish_service = create_goofish_service()
+        self.resources.add(self.goofish_service.close)
+        self.max_keywords = 3  # 限制搜索关键词数量
     
+    @traced("search_agent.execute")
     async def execute(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         执行搜索任务
@@ -35,11 +45,12 @@ class SearchAgent(BaseAgent):
             
             # 分析用户需求
             logger.info(f"分析用户需求: {query}")
-            requirement_analysis = await deepseek_client.analyze_product_requirement(query)
+            requirement_analysis = await self.run_cancellable(
+                deepseek_client.analyze_product_requirement(query)
+            )
             
             # 登录咸鱼
-            self.update_status("logging_in")
-            login_success = await self.goofish_service.login(credentials)
+            login_success = await self.login(credentials)
             
             if not login_success:
                 return {
@@ -52,27 +63,38 @@ class SearchAgent(BaseAgent):
             self.update_status("searching_products")
             
             # 使用分析出的关键词进行搜索
-            keywords = requirement_analysis.get("keywords", [query])
             all_products = []
             
-            for keyword in keywords[:3]:  # 限制搜索关键词数量
+            for keyword in self.search_keywords(query, requirement_analysis):
+                self.check_cancelled()
                 logger.info(f"搜索关键词: {keyword}")
-                products = await self.goofish_service.search_products(keyword, max_price)
+                products = await self.run_cancellable(
+                    search_cache.search(self.goofish_service, keyword, max_price)
+                )
                 all_products.extend(products)
             
             # 去重和筛选
-            unique_products = self._deduplicate_products(all_products)
-            filtered_products = self._filter_products(unique_products, requirement_analysis)
+            filtered_products = await self.select_products(all_products, requirement_analysis)
             
             self.update_status("completed")
             
             return {
                 "success": True,
-                "products": [product.dict() for product in filtered_products],
+                "products": filtered_products,
                 "requirement_analysis": requirement_analysis,
                 "total_found": len(filtered_products)
             }
             
+        except AgentCancelledError as e:
+            logger.info(f"搜索Agent已取消: {e}")
+            self.update_status("cancelled")
+            return {
+                "success": False,
+                "cancelled": True,
+                "error": str(e),
+                "products": []
+            }
+            
         except Exception as e:
             logger.error(f"搜索Agent执行失败: {e}")
             self.update_status("failed")
@@ -82,27 +104,56 @@ class SearchAgent(BaseAgent):
                 "products": []
             }
     
-    def _deduplicate_products(self, products: List[ProductInfo]) -> List[ProductInfo]:
-        """去重商品"""
-        seen_titles = set()
-        unique_products = []
+    def search_keywords(self, query: str, analysis: Dict[str, Any]) -> List[str]:
+        """需求分析给出的搜索关键词"""
+        return (analysis.get("keywords") or [query])[:self.max_keywords]
+    
+    async def login(self, credentials: UserCredentials) -> bool:
+        """登录咸鱼账号，登录后的浏览器会话可供后续搜索和谈判复用"""
+        self.update_status("logging_in")
+        return await self.run_cancellable(self.goofish_service.login(credentials))
+    
+    async def select_products(self, products: List[Listing], analysis: Dict[str, Any],
+                              cookies: Optional[Dict[str, str]] = None) -> List[Listing]:
+        """
+        对搜索结果去重，按需求分析筛选，入选的商品先用已缓存的详情补全
         
-        for product in products:
-            # 简单的标题去重
-            title_key = product.title.lower().strip()
-            if title_key not in seen_titles:
-                seen_titles.add(title_key)
-                unique_products.append(product)
+        Args:
+            products: 搜索到的商品
+            analysis: 需求分析结果
+            cookies: 抓取详情用的登录Cookie，缺省时从浏览器读取；浏览器由多个查询共用时应由调用方读取一次后传入
+            
+        Returns:
+            入选的商品
+        """
+        unique_products = self._deduplicate_products(products)
+        
+        if cookies is None:
+            # 读取Cookie会访问浏览器，放到线程中执行
+            cookies = await asyncio.to_thread(self.goofish_service.get_cookies)
+        prefetched = detail_enricher.prefetch(unique_products, cookies)
+        selected = self._filter_products(unique_products, analysis)
         
+        # 不等待详情：还没拿到的详情在谈判期间继续抓取，生成结果时再补上
+        detail_enricher.select(selected, cookies, prefetched)
+        enriched = detail_enricher.apply(selected)
+        if all(a is b for a, b in zip(enriched, selected)):
+            return selected
+        image_pipeline.submit(enriched)
+        # 补全描述和成色后对入选商品重新排序
+        return self._filter_products(enriched, analysis)
+    
+    def _deduplicate_products(self, products: List[Listing]) -> List[Listing]:
+        """去重商品：合并同一商品、同一卖家重新上架的近似商品以及使用相同照片的商品"""
+        unique_products = deduplicate_products(products, image_pipeline.image_hashes)
+        if len(unique_products) < len(products):
+            logger.info(f"合并了 {len(products) - len(unique_products)} 个重复商品")
         return unique_products
     
-    def _filter_products(self, products: List[ProductInfo], analysis: Dict[str, Any]) -> List[ProductInfo]:
-        """根据需求分析筛选商品"""
-        # 这里可以根据分析结果进行更智能的筛选
-        # 目前简单按价格排序
-        return sorted(products, key=lambda x: x.price)[:10]  # 返回最便宜的10个
+    def _filter_products(self, products: List[Listing], analysis: Dict[str, Any]) -> List[Listing]:
+        """根据需求分析对商品打分，返回得分最高的若干个"""
+        return ranking_engine.rank(products, analysis)
     
     def close(self):
         """关闭资源"""
-        if self.goofish_service:
-            self.goofish_service.close() 
+        self.release() 
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+from fastapi import WebSocket
+from typing import Dict, Set, Optional, Union
+from loguru import logger
+from app.api.messages import EncodedMessage
+from config.settings import settings
+
+def _as_encoded(message: Union[str, EncodedMessage]) -> EncodedMessage:
+    if isinstance(message, EncodedMessage):
+        return message
+    return EncodedMessage(None, message)
+
+class ClientConnection:
+    """单个WebSocket连接 - 有界发送队列由独立的发送任务消费"""
+    
+    def __init__(self, websocket: WebSocket, client_id: str, max_queue: int, binary: bool = False):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.binary = binary  # 是否使用二进制编码
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.topics: Set[str] = set()
+        self.dropped = 0
+        self.sender: Optional[asyncio.Task] = None
+    
+    def enqueue(self, message: EncodedMessage) -> bool:
+        """
+        把消息放入发送队列，不等待网络发送
+        
+        Returns:
+            是否成功入队；队列已满且策略为断开连接时返回False
+        """
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            if settings.WS_SLOW_CONSUMER_POLICY == "disconnect":
+                return False
+            
+            # 丢弃最旧的消息，保留最新状态
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            self.dropped += 1
+            return True
+
+class ConnectionManager:
+    """WebSocket连接管理 - 按任务ID订阅，只向订阅者推送"""
+    
+    def __init__(self):
+        self.active_connections: Dict[str, ClientConnection] = {}
+        self.subscriptions: Dict[str, Set[str]] = {}  # 任务ID -> 客户端ID集合
+
+    async def connect(self, websocket: WebSocket, client_id: str, binary: bool = False):
+        await websocket.accept()
+        
+        # 同一客户端重连时替换旧连接
+        if client_id in self.active_connections:
+            self.disconnect(client_id)
+        
+        connection = ClientConnection(websocket, client_id, settings.WS_SEND_QUEUE_SIZE, binary)
+        connection.sender = asyncio.create_task(self._send_loop(connection))
+        self.active_connections[client_id] = connection
+        logger.info(f"WebSocket连接建立: {client_id}")
+
+    def disconnect(self, client_id: str):
+        connection = self.active_connections.pop(client_id, None)
+        if not connection:
+            return
+        
+        for topic in connection.topics:
+            subscribers = self.subscriptions.get(topic)
+            if subscribers:
+                subscribers.discard(client_id)
+                if not subscribers:
+                    del self.subscriptions[topic]
+        
+        if connection.sender and connection.sender is not asyncio.current_task():
+            connection.sender.cancel()
+        logger.info(f"WebSocket连接断开: {client_id}")
+
+    def subscribe(self, client_id: str, topic: str) -> bool:
+        """订阅任务消息"""
+        connection = self.active_connections.get(client_id)
+        if not connection:
+            return False
+        connection.topics.add(topic)
+        self.subscriptions.setdefault(topic, set()).add(client_id)
+        return True
+
+    def unsubscribe(self, client_id: str, topic: str):
+        """取消订阅任务消息"""
+        connection = self.active_connections.get(client_id)
+        if connection:
+            connection.topics.discard(topic)
+        subscribers = self.subscriptions.get(topic)
+        if subscribers:
+            subscribers.discard(client_id)
+            if not subscribers:
+                del self.subscriptions[topic]
+
+    async def _send_loop(self, connection: ClientConnection):
+        """连接专属的发送任务，慢客户端只会阻塞自己"""
+        try:
+            while True:
+                message = await connection.queue.get()
+                if connection.binary:
+                    await connection.websocket.send_bytes(message.binary())
+                else:
+                    await connection.websocket.send_text(message.text())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"发送消息失败: {e}")
+            self.disconnect(connection.client_id)
+
+    def _enqueue(self, connection: ClientConnection, message: EncodedMessage):
+        if not connection.enqueue(message):
+            logger.warning(f"客户端 {connection.client_id} 消费过慢，断开连接")
+            self.disconnect(connection.client_id)
+            asyncio.create_task(self._close_quietly(connection.websocket))
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            pass
+
+    async def send_personal_message(self, message: Union[str, EncodedMessage], client_id: str):
+        connection = self.active_connections.get(client_id)
+        if connection:
+            self._enqueue(connection, _as_encoded(message))
+
+    async def publish(self, topic: str, message: Union[str, EncodedMessage]):
+        """向订阅了该任务的客户端推送消息，开销只与订阅者数量相关"""
+        message = _as_encoded(message)
+        for client_id in list(self.subscriptions.get(topic, ())):
+            connection = self.active_connections.get(client_id)
+            if connection:
+                self._enqueue(connection, message)
+
+    async def broadcast_message(self, message: Union[str, EncodedMessage]):
+        """广播消息给所有连接的客户端"""
+        message = _as_encoded(message)
+        for connection in list(self.active_connections.values()):
+            self._enqueue(connection, message)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "connections": len(self.active_connections),
+            "topics": len(self.subscriptions),
+            "queued_messages": sum(c.queue.qsize() for c in self.active_connections.values()),
+            "dropped_messages": sum(c.dropped for c in self.active_connections.values())
+        }
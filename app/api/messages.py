@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from config.settings import settings
+
+# 可选依赖：更快的JSON编码器和二进制编码
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+def dumps(obj: Any) -> str:
+    """JSON序列化，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+class EncodedMessage:
+    """序列化一次、发给所有订阅者的消息帧
+    
+    文本和二进制编码都在首次使用时生成并缓存，之后所有连接共用同一份数据。
+    """
+    
+    __slots__ = ("payload", "_text", "_binary")
+    
+    def __init__(self, payload: Optional[Dict[str, Any]], text: Optional[str] = None):
+        self.payload = payload
+        self._text = text
+        self._binary: Optional[bytes] = None
+    
+    def text(self) -> str:
+        if self._text is None:
+            self._text = dumps(self.payload)
+        return self._text
+    
+    def binary(self) -> bytes:
+        if self._binary is None:
+            if msgpack is not None and self.payload is not None:
+                self._binary = msgpack.packb(self.payload, default=str)
+            else:
+                self._binary = self.text().encode("utf-8")
+        return self._binary
+
+def binary_supported() -> bool:
+    return msgpack is not None
+
+class ProgressStream:
+    """单个任务的进度流 - 以版本号为基准只发送变化的步骤"""
+    
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.version = 0
+        self.steps: List[Dict[str, Any]] = []
+        self.percentage = 0.0
+    
+    def update(self, steps: List[Dict[str, Any]], percentage: float) -> Dict[str, Any]:
+        """
+        更新进度并生成增量消息
+        
+        Args:
+            steps: 完整的步骤列表
+            percentage: 总进度百分比
+            
+        Returns:
+            progress_delta消息，只包含相对上一版本发生变化的步骤
+        """
+        changes = {
+            str(i): step for i, step in enumerate(steps)
+            if i >= len(self.steps) or self.steps[i] != step
+        }
+        
+        self.version += 1
+        self.steps = list(steps)
+        self.percentage = percentage
+        
+        return {
+            "type": "progress_delta",
+            "data": {
+                "task_id": self.task_id,
+                "version": self.version,
+                "base_version": self.version - 1,
+                "length": len(steps),
+                "changes": changes,
+                "percentage": percentage,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """完整进度消息，用于新订阅者或版本不一致时重新同步"""
+        return {
+            "type": "progress",
+            "data": {
+                "task_id": self.task_id,
+                "version": self.version,
+                "steps": self.steps,
+                "percentage": self.percentage,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+
+def chunk_message(message: Dict[str, Any], chunk_size: Optional[int] = None) -> List[EncodedMessage]:
+    """
+    把较大的消息拆分为多个result_chunk帧
+    
+    消息只序列化一次，客户端按序号拼接后再解析。
+    
+    Args:
+        message: 原始消息
+        chunk_size: 每帧最大字符数，默认使用 WS_CHUNK_SIZE
+        
+    Returns:
+        待发送的消息帧列表
+    """
+    chunk_size = chunk_size or settings.WS_CHUNK_SIZE
+    text = dumps(message)
+    if len(text) <= chunk_size:
+        return [EncodedMessage(message, text)]
+    
+    task_id = message.get("data", {}).get("task_id")
+    parts = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    return [
+        EncodedMessage({
+            "type": "result_chunk",
+            "data": {
+                "task_id": task_id,
+                "message_type": message.get("type"),
+                "index": i,
+                "total": len(parts),
+                "chunk": part
+            }
+        })
+        for i, part in enumerate(parts)
+    ]
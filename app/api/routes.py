@@ -2,67 +2,87 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
+import itertools
+from collections import OrderedDict
 from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from typing import Dict, Any
+from fastapi.responses import HTMLResponse, Response, StreamingResponse, FileResponse
+from typing import Dict, Any, List, Optional
 from loguru import logger
 import json
 import time
 from datetime import datetime
 
-from app.models.schema import SearchRequest
+from app.models.schema import SearchRequest, BatchSearchRequest, WatchRequest, UserCredentials
+from app.models.listing import Listing
 from app.agents.coordinator_agent import CoordinatorAgent
+from app.api.connections import ConnectionManager
+from app.api.messages import EncodedMessage, ProgressStream, chunk_message, binary_supported
+from app.services.search_cache import search_cache
+from app.services.price_stats import price_index
+from app.services.listing_store import listing_store
+from app.services.seller_profiles import seller_profiles
+from app.services.image_pipeline import image_pipeline, content_type
+from app.services.detail_enricher import detail_enricher
+from app.services.deepseek_client import deepseek_client
+from app.services.goofish_service import GoofishService
+from app.services.watchlist import watchlist, Watch
+from app.services.tracing import tracer
+from app.services.warmup import warmup
+from app.services.lifecycle import lifecycle
+from config.settings import settings
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
-# 全局协调Agent实例
-coordinator = CoordinatorAgent("main_coordinator")
+# 全局协调Agent实例，首次使用时创建
+_coordinator: Optional[CoordinatorAgent] = None
 
-# WebSocket连接管理
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, websocket: WebSocket, client_id: str):
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
-        logger.info(f"WebSocket连接建立: {client_id}")
-
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            logger.info(f"WebSocket连接断开: {client_id}")
-
-    async def send_personal_message(self, message: str, client_id: str):
-        if client_id in self.active_connections:
-            try:
-                await self.active_connections[client_id].send_text(message)
-            except Exception as e:
-                logger.error(f"发送消息失败: {e}")
-                self.disconnect(client_id)
-
-    async def broadcast_message(self, message: str):
-        """广播消息给所有连接的客户端"""
-        for client_id in list(self.active_connections.keys()):
-            await self.send_personal_message(message, client_id)
+def get_coordinator() -> CoordinatorAgent:
+    """获取全局协调Agent"""
+    global _coordinator
+    if _coordinator is None:
+        _coordinator = CoordinatorAgent("main_coordinator")
+    return _coordinator
+
+# 正在运行的比价任务
+running_tasks: Dict[str, asyncio.Task] = {}
+
+# 每个运行中任务的进度流，用于生成增量进度消息
+progress_streams: Dict[str, ProgressStream] = {}
 
+# 已完成批次的汇总结果，只保留最近的 BATCH_MAX_RESULTS 个
+batch_results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# WebSocket连接管理
 manager = ConnectionManager()
 
+# 任务ID序号，同一毫秒内提交的多个任务不会拿到相同的ID
+_task_seq = itertools.count(1)
+
+def new_task_id(prefix: str = "task") -> str:
+    """生成任务ID"""
+    return f"{prefix}_{int(time.time() * 1000)}_{next(_task_seq)}"
+
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """主页"""
     return templates.TemplateResponse("index.html", {"request": request})
 
+def check_admission():
+    """服务关闭过程中不再接收新任务"""
+    if not lifecycle.accepting:
+        raise HTTPException(status_code=503, detail="服务正在关闭，暂不接收新任务")
+
 @router.post("/api/start_comparison")
 async def start_comparison(search_request: SearchRequest):
     """开始比价"""
+    check_admission()
     try:
         logger.info(f"收到比价请求: {search_request.query}")
         
         # 生成任务ID
-        task_id = f"task_{int(time.time() * 1000)}"
+        task_id = new_task_id()
         
         # 准备任务数据
         task_data = {
@@ -75,8 +95,12 @@ async def start_comparison(search_request: SearchRequest):
             }
         }
         
+        # 发起请求的客户端在任务启动前订阅，避免错过第一条消息
+        if search_request.client_id:
+            manager.subscribe(search_request.client_id, task_id)
+        
         # 异步执行比价任务
-        asyncio.create_task(execute_comparison_task(task_data))
+        start_task(task_data)
         
         return {
             "success": True,
@@ -88,6 +112,192 @@ async def start_comparison(search_request: SearchRequest):
         logger.error(f"启动比价任务失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/api/batch_comparison")
+async def start_batch_comparison(batch_request: BatchSearchRequest):
+    """批量比价：多个查询共享需求分析、登录会话和搜索结果"""
+    check_admission()
+    try:
+        if not batch_request.requests:
+            raise HTTPException(status_code=400, detail="批量请求不能为空")
+        if len(batch_request.requests) > settings.BATCH_MAX_QUERIES:
+            raise HTTPException(status_code=400, detail=f"单次最多提交 {settings.BATCH_MAX_QUERIES} 个查询")
+        
+        logger.info(f"收到批量比价请求: {len(batch_request.requests)} 个查询")
+        
+        batch_id = new_task_id("batch")
+        tasks = []
+        for i, search_request in enumerate(batch_request.requests):
+            task_id = f"{batch_id}_{i}"
+            tasks.append({
+                "task_id": task_id,
+                "batch_id": batch_id,
+                "query": search_request.query,
+                "max_price": search_request.max_price,
+                "credentials": {
+                    "username": search_request.credentials.username,
+                    "password": search_request.credentials.password
+                }
+            })
+            
+            client_id = search_request.client_id or batch_request.client_id
+            if client_id:
+                manager.subscribe(client_id, task_id)
+        
+        if batch_request.client_id:
+            manager.subscribe(batch_request.client_id, batch_id)
+        
+        task = lifecycle.track(asyncio.create_task(execute_batch_task(batch_id, tasks)))
+        running_tasks[batch_id] = task
+        
+        def cleanup(_):
+            running_tasks.pop(batch_id, None)
+            for task_data in tasks:
+                progress_streams.pop(task_data["task_id"], None)
+        
+        task.add_done_callback(cleanup)
+        
+        return {
+            "success": True,
+            "message": "批量比价任务已启动",
+            "batch_id": batch_id,
+            "task_ids": [task_data["task_id"] for task_data in tasks]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"启动批量比价任务失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/batch/{batch_id}")
+async def get_batch_result(batch_id: str):
+    """获取批量比价任务的状态或结果"""
+    if batch_id in batch_results:
+        return {"success": True, "status": "completed", "result": batch_results[batch_id]}
+    
+    task_ids = get_coordinator().batch_tasks.get(batch_id)
+    if task_ids is None:
+        return {"success": False, "error": "批次不存在"}
+    
+    return {
+        "success": True,
+        "status": "running",
+        "progress": {task_id: get_coordinator().get_task_progress(task_id) for task_id in task_ids}
+    }
+
+@router.post("/api/watchlist")
+async def add_watch(watch_request: WatchRequest):
+    """添加监控查询，出现新商品或降价时推送通知"""
+    check_admission()
+    try:
+        # 需求只分析一次，之后每次检查直接按关键词搜索
+        analysis = await deepseek_client.analyze_product_requirement(watch_request.query)
+        keywords = (analysis.get("keywords") or [watch_request.query])[:3]
+        
+        watch = watchlist.add_watch(
+            watch_request.query,
+            watch_request.max_price,
+            watch_request.credentials,
+            keywords,
+            watch_request.interval,
+            analysis
+        )
+        
+        if watch_request.client_id:
+            manager.subscribe(watch_request.client_id, watch.watch_id)
+        
+        return {"success": True, "message": "监控已添加", "watch_id": watch.watch_id, "keywords": keywords}
+        
+    except Exception as e:
+        logger.error(f"添加监控失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/watchlist")
+async def list_watches():
+    """获取监控列表"""
+    return {"success": True, "watches": watchlist.list_watches()}
+
+@router.delete("/api/watchlist/{watch_id}")
+async def remove_watch(watch_id: str):
+    """删除监控查询"""
+    if not watchlist.remove_watch(watch_id):
+        return {"success": False, "error": "监控不存在"}
+    return {"success": True, "message": "监控已删除", "watch_id": watch_id}
+
+@router.post("/api/watchlist/credentials")
+async def resume_watches(credentials: UserCredentials):
+    """重新提供账号凭证，恢复重启后暂停的监控"""
+    resumed = watchlist.set_credentials(credentials)
+    return {"success": True, "resumed": resumed}
+
+async def handle_watch_hits(watch: Watch, products: List[Listing], goofish_service: GoofishService):
+    """监控发现新商品或降价时通知订阅者，并对这些商品发起谈判"""
+    task_id = new_task_id()
+    
+    # 监控的订阅者同时接收本次谈判的进度
+    for client_id in list(manager.subscriptions.get(watch.watch_id, ())):
+        manager.subscribe(client_id, task_id)
+    
+    await manager.publish(watch.watch_id, EncodedMessage({
+        "type": "watch_hit",
+        "data": {
+            "watch_id": watch.watch_id,
+            "query": watch.query,
+            "task_id": task_id,
+            "products": [product.to_dict() for product in products],
+            "timestamp": datetime.now().isoformat()
+        }
+    }))
+    
+    task_data = {
+        "task_id": task_id,
+        "query": watch.query,
+        "max_price": watch.max_price,
+        "keywords": watch.keywords,
+        "watch_id": watch.watch_id
+    }
+    
+    # 在监控的账号锁内完成谈判，期间该账号的浏览器不会被搜索占用
+    start_time = time.time()
+    result = await get_coordinator().execute_products(task_data, products, goofish_service)
+    await publish_task_result(task_id, task_data, result, start_time)
+    progress_streams.pop(task_id, None)
+
+watchlist.on_hits = handle_watch_hits
+
+def start_task(task_data: Dict[str, Any]) -> asyncio.Task:
+    """启动比价任务并登记，以便后续取消"""
+    task_id = task_data["task_id"]
+    task = lifecycle.track(asyncio.create_task(execute_comparison_task(task_data)))
+    running_tasks[task_id] = task
+    
+    def cleanup(_):
+        running_tasks.pop(task_id, None)
+        progress_streams.pop(task_id, None)
+    
+    task.add_done_callback(cleanup)
+    return task
+
+@router.delete("/api/tasks/{task_id}")
+async def cancel_comparison(task_id: str):
+    """取消比价任务"""
+    try:
+        cancelled = get_coordinator().cancel_task(task_id)
+        
+        task = running_tasks.get(task_id)
+        if task and not task.done():
+            task.cancel()
+            cancelled = True
+        
+        if not cancelled:
+            return {"success": False, "error": "任务不存在或已结束"}
+        
+        return {"success": True, "message": "比价任务已取消", "task_id": task_id}
+        
+    except Exception as e:
+        logger.error(f"取消比价任务失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 async def execute_comparison_task(task_data: Dict[str, Any]):
     """执行比价任务"""
     task_id = task_data.get("task_id", "unknown")
@@ -95,7 +305,7 @@ async def execute_comparison_task(task_data: Dict[str, Any]):
     
     try:
         # 发送任务开始状态
-        await send_task_status("initializing", "初始化中", "正在准备比价任务...", {
+        await send_task_status(task_id, "initializing", "初始化中", "正在准备比价任务...", {
             "searchedCount": 0,
             "negotiatedCount": 0,
             "lowestPrice": 0,
@@ -103,7 +313,7 @@ async def execute_comparison_task(task_data: Dict[str, Any]):
         })
         
         # 发送初始进度
-        await send_progress_update([
+        await send_progress_update(task_id, [
             {
                 "title": "任务初始化",
                 "status": "running",
@@ -112,93 +322,185 @@ async def execute_comparison_task(task_data: Dict[str, Any]):
             }
         ], 5)
         
-        await asyncio.sleep(1)  # 模拟初始化时间
-        
         # 执行协调Agent
-        result = await coordinator.execute(task_data)
-        
-        if result.get("success", False):
-            # 发送完成状态
-            await send_task_status("completed", "已完成", "比价任务已成功完成", {
-                "searchedCount": len(result.get("products", [])),
-                "negotiatedCount": len([n for n in result.get("negotiations", []) if n.get("success", False)]),
-                "lowestPrice": result.get("best_deal", {}).get("price", 0),
-                "savedAmount": task_data.get("max_price", 0) - result.get("best_deal", {}).get("price", 0)
-            })
-            
-            # 发送最终进度
-            end_time = time.time()
-            duration = f"{int(end_time - start_time)}秒"
-            
-            final_steps = [
-                {
-                    "title": "任务初始化",
-                    "status": "completed",
-                    "description": "比价任务准备完成",
-                    "timestamp": datetime.fromtimestamp(start_time).isoformat(),
-                    "duration": "1秒"
-                },
-                {
-                    "title": "商品搜索",
-                    "status": "completed",
-                    "description": f"找到 {len(result.get('products', []))} 个符合条件的商品",
-                    "timestamp": datetime.fromtimestamp(start_time + 10).isoformat(),
-                    "duration": "8秒"
-                },
-                {
-                    "title": "价格谈判",
-                    "status": "completed",
-                    "description": f"成功谈判 {len([n for n in result.get('negotiations', []) if n.get('success', False)])} 个商品",
-                    "timestamp": datetime.fromtimestamp(start_time + 25).isoformat(),
-                    "duration": "15秒"
-                },
-                {
-                    "title": "结果分析",
-                    "status": "completed",
-                    "description": "比价分析完成，找到最佳选择",
-                    "timestamp": datetime.fromtimestamp(end_time).isoformat(),
-                    "duration": "2秒"
-                }
-            ]
-            
-            await send_progress_update(final_steps, 100)
-            
-            # 发送任务完成消息
-            await manager.broadcast_message(json.dumps({
-                "type": "task_completed",
-                "data": {
-                    **result,
-                    "execution_time": duration,
-                    "task_id": task_id
-                }
-            }))
-            
-        else:
-            # 发送失败状态
-            await send_task_status("failed", "失败", f"任务执行失败: {result.get('error', '未知错误')}")
-            
-            await manager.broadcast_message(json.dumps({
-                "type": "error",
-                "message": result.get("error", "任务执行失败")
-            }))
+        result = await get_coordinator().execute(task_data)
+        
+        await publish_task_result(task_id, task_data, result, start_time)
             
+    except asyncio.CancelledError:
+        logger.info(f"比价任务 {task_id} 已取消")
+        await send_task_status(task_id, "cancelled", "已取消", "比价任务已取消")
+        raise
+        
     except Exception as e:
         logger.error(f"执行比价任务失败: {e}")
         
         # 发送失败状态
-        await send_task_status("failed", "失败", f"任务执行失败: {str(e)}")
+        await send_task_status(task_id, "failed", "失败", f"任务执行失败: {str(e)}")
         
         # 发送错误消息
-        await manager.broadcast_message(json.dumps({
+        await manager.publish(task_id, EncodedMessage({
+            "type": "error",
+            "task_id": task_id,
+            "message": str(e)
+        }))
+
+async def execute_batch_task(batch_id: str, tasks: List[Dict[str, Any]]):
+    """执行批量比价任务"""
+    start_time = time.time()
+    
+    try:
+        for task_data in tasks:
+            await send_task_status(task_data["task_id"], "initializing", "初始化中", "正在准备批量比价任务...")
+        
+        result = await get_coordinator().execute_batch(batch_id, tasks)
+        
+        results = {item.get("task_id"): item for item in result.get("results", [])}
+        for task_data in tasks:
+            task_id = task_data["task_id"]
+            task_result = results.get(task_id) or {
+                "success": False,
+                "cancelled": result.get("cancelled", False),
+                "error": result.get("error", "批量任务执行失败")
+            }
+            await publish_task_result(task_id, task_data, task_result, start_time)
+        
+        summary = {
+            "batch_id": batch_id,
+            "success": result.get("success", False),
+            "searched_keywords": result.get("searched_keywords", 0),
+            "execution_time": format_duration(time.time() - start_time),
+            "tasks": [
+                {
+                    "task_id": item.get("task_id"),
+                    "success": item.get("success", False),
+                    "best_deal": item.get("best_deal")
+                }
+                for item in result.get("results", [])
+            ]
+        }
+        batch_results[batch_id] = summary
+        while len(batch_results) > settings.BATCH_MAX_RESULTS:
+            batch_results.popitem(last=False)
+        await manager.publish(batch_id, EncodedMessage({"type": "batch_completed", "data": summary}))
+        
+    except asyncio.CancelledError:
+        logger.info(f"批量比价任务 {batch_id} 已取消")
+        for task_data in tasks:
+            await send_task_status(task_data["task_id"], "cancelled", "已取消", "比价任务已取消")
+        raise
+        
+    except Exception as e:
+        logger.error(f"执行批量比价任务失败: {e}")
+        await manager.publish(batch_id, EncodedMessage({
             "type": "error",
+            "task_id": batch_id,
             "message": str(e)
         }))
 
-async def send_task_status(status: str, title: str, description: str, metrics: Dict[str, Any] = None):
+async def publish_task_result(task_id: str, task_data: Dict[str, Any], result: Dict[str, Any], start_time: float):
+    """向任务订阅者推送最终状态、进度和结果"""
+    if result.get("success", False):
+        best_deal = result.get("best_deal") or {}
+        best_price = best_deal.get("price", 0)
+        
+        # 发送完成状态
+        await send_task_status(task_id, "completed", "已完成", "比价任务已成功完成", {
+            "searchedCount": len(result.get("products", [])),
+            "negotiatedCount": len([n for n in result.get("negotiations", []) if n.get("success", False)]),
+            "lowestPrice": best_price,
+            "savedAmount": task_data.get("max_price", 0) - best_price if best_deal else 0
+        })
+        
+        # 发送最终进度，各阶段耗时取自追踪记录
+        end_time = time.time()
+        duration = format_duration(end_time - start_time)
+        negotiated = len([n for n in result.get('negotiations', []) if n.get('success', False)])
+        
+        final_steps = build_stage_steps(task_id, task_data, start_time, [
+            ("任务初始化", None, "比价任务准备完成"),
+            ("商品搜索", "stage.search", f"找到 {len(result.get('products', []))} 个符合条件的商品"),
+            ("价格谈判", "stage.negotiate", f"成功谈判 {negotiated} 个商品"),
+            ("结果分析", "stage.compare", "比价分析完成，找到最佳选择")
+        ])
+        
+        await send_progress_update(task_id, final_steps, 100)
+        
+        # 发送任务完成消息
+        # 最终结果只序列化一次，过大时分块发送
+        for frame in chunk_message({
+            "type": "task_completed",
+            "data": {
+                **result,
+                "execution_time": duration,
+                "task_id": task_id
+            }
+        }):
+            await manager.publish(task_id, frame)
+        
+    elif result.get("cancelled", False):
+        await send_task_status(task_id, "cancelled", "已取消", result.get("error", "比价任务已取消"))
+        
+    else:
+        # 发送失败状态
+        await send_task_status(task_id, "failed", "失败", f"任务执行失败: {result.get('error', '未知错误')}")
+        
+        await manager.publish(task_id, EncodedMessage({
+            "type": "error",
+            "task_id": task_id,
+            "message": result.get("error", "任务执行失败")
+        }))
+
+def format_duration(seconds: float) -> str:
+    """格式化耗时"""
+    if seconds < 60:
+        return f"{seconds:.1f}秒"
+    return f"{int(seconds // 60)}分{int(seconds % 60)}秒"
+
+def build_stage_steps(task_id: str, task_data: Dict[str, Any], start_time: float, stages: list) -> list:
+    """
+    根据追踪记录生成各阶段的进度步骤
+    
+    Args:
+        task_id: 任务ID
+        task_data: 任务数据，批量任务的共享阶段记录在batch_id下
+        start_time: 任务提交时间
+        stages: (标题, Span名称, 描述) 列表，Span名称为None表示从提交到第一个阶段开始的初始化阶段
+        
+    Returns:
+        带真实开始时间和耗时的步骤列表
+    """
+    spans = {}
+    for _, name, _ in stages:
+        if name:
+            span = tracer.get_stage(task_id, name)
+            if span is None and task_data.get("batch_id"):
+                span = tracer.get_stage(task_data["batch_id"], name)
+            if span is not None:
+                spans[name] = span
+    
+    first_start = min((span.started_at.timestamp() for span in spans.values()), default=time.time())
+    
+    steps = []
+    for title, name, description in stages:
+        step = {"title": title, "status": "completed", "description": description}
+        if name is None:
+            step["timestamp"] = datetime.fromtimestamp(start_time).isoformat()
+            step["duration"] = format_duration(max(first_start - start_time, 0))
+        elif name in spans:
+            step["timestamp"] = spans[name].started_at.isoformat()
+            step["duration"] = format_duration(spans[name].duration)
+        else:
+            step["timestamp"] = datetime.now().isoformat()
+        steps.append(step)
+    return steps
+
+async def send_task_status(task_id: str, status: str, title: str, description: str, metrics: Dict[str, Any] = None):
     """发送任务状态更新"""
     message = {
         "type": "task_status",
         "data": {
+            "task_id": task_id,
             "status": status,
             "title": title,
             "description": description,
@@ -209,38 +511,167 @@ async def send_task_status(status: str, title: str, description: str, metrics: D
     if metrics:
         message["data"]["metrics"] = metrics
     
-    await manager.broadcast_message(json.dumps(message))
+    await manager.publish(task_id, EncodedMessage(message))
 
-async def send_progress_update(steps: list, percentage: float):
-    """发送进度更新"""
-    message = {
-        "type": "progress",
-        "data": {
-            "steps": steps,
-            "percentage": percentage,
-            "timestamp": datetime.now().isoformat()
-        }
-    }
+async def send_progress_update(task_id: str, steps: list, percentage: float):
+    """发送进度更新，只发送相对上一版本变化的步骤"""
+    stream = progress_streams.setdefault(task_id, ProgressStream(task_id))
+    message = stream.update(steps, percentage)
     
-    await manager.broadcast_message(json.dumps(message))
+    await manager.publish(task_id, EncodedMessage(message))
+
+async def send_progress_snapshot(task_id: str, client_id: str):
+    """向单个客户端发送完整进度，用于新订阅或版本不一致时重新同步"""
+    stream = progress_streams.get(task_id)
+    if stream and stream.version:
+        await manager.send_personal_message(EncodedMessage(stream.snapshot()), client_id)
 
 @router.get("/api/task_progress/{task_id}")
-async def get_task_progress(task_id: str):
-    """获取任务进度"""
+async def get_task_progress(task_id: str, request: Request):
+    """获取任务进度，支持ETag条件请求"""
     try:
-        progress = coordinator.get_task_progress(task_id)
-        if progress:
-            return {"success": True, "progress": progress}
-        else:
+        version = get_coordinator().get_progress_version(task_id)
+        if version is None:
             return {"success": False, "error": "任务不存在"}
+        
+        # 进度未变化时直接返回304，不做任何序列化
+        etag = f'"{task_id}-{version}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        version, progress_json = get_coordinator().get_task_progress_json(task_id)
+        return Response(
+            content=f'{{"success": true, "progress": {progress_json}}}',
+            media_type="application/json",
+            headers={"ETag": f'"{task_id}-{version}"', "Cache-Control": "no-cache"}
+        )
     except Exception as e:
         logger.error(f"获取任务进度失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/api/task_progress/{task_id}/stream")
+async def stream_task_progress(task_id: str, request: Request):
+    """以Server-Sent Events推送任务进度"""
+    if get_coordinator().get_progress_version(task_id) is None:
+        return {"success": False, "error": "任务不存在"}
+    
+    last_event_id = request.headers.get("last-event-id", "")
+    
+    async def event_stream():
+        sent_version = int(last_event_id) if last_event_id.isdigit() else None
+        while not await request.is_disconnected():
+            current = get_coordinator().get_task_progress_json(task_id)
+            if current is None:
+                break
+            
+            version, progress_json = current
+            if version != sent_version:
+                sent_version = version
+                yield f"id: {version}\nevent: progress\ndata: {progress_json}\n\n"
+            
+            if get_coordinator().is_task_finished(task_id):
+                break
+            
+            if not await get_coordinator().wait_for_progress(task_id, version, settings.SSE_HEARTBEAT_INTERVAL):
+                # 保持连接的注释行
+                yield ": keepalive\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/healthz")
+async def healthz():
+    """存活检查"""
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    """就绪检查：启动预热完成后才接收流量，关闭过程中不再接收"""
+    status = warmup.get_status()
+    status["accepting"] = lifecycle.accepting
+    return Response(
+        content=json.dumps(status, ensure_ascii=False, default=str),
+        media_type="application/json",
+        status_code=200 if status["ready"] and lifecycle.accepting else 503
+    )
+
+@router.get("/api/metrics")
+async def get_metrics():
+    """获取运行指标"""
+    return {
+        "success": True,
+        "search_cache": search_cache.stats(),
+        "websocket": manager.get_stats(),
+        "tracing": tracer.stats(),
+        "lifecycle": lifecycle.get_stats(),
+        "price_stats": price_index.get_stats(),
+        "listing_store": listing_store.get_stats(),
+        "seller_profiles": seller_profiles.get_stats(),
+        "images": image_pipeline.get_stats(),
+        "details": detail_enricher.get_stats()
+    }
+
+@router.get("/api/market_price")
+async def get_market_price(query: str, max_price: float = 0):
+    """获取查询的市场价格统计和谈判目标价"""
+    stats = price_index.get(query)
+    if stats is None:
+        return {"success": False, "error": "还没有该查询的价格统计"}
+    return {
+        "success": True,
+        "query": query,
+        "stats": stats.summary(),
+        "target_price": price_index.target_price([query], max_price)
+    }
+
+@router.get("/api/listings")
+async def search_listings(query: str, max_price: float = float("inf"), max_age: Optional[float] = None,
+                          limit: int = 50):
+    """查询商品库中某个关键词下保存过的商品，不重新抓取"""
+    products = await listing_store.search(query, max_price, max_age, min(limit, 500))
+    return {"success": True, "query": query, "products": [product.to_dict() for product in products]}
+
+@router.get("/api/listings/{item_id}")
+async def get_listing(item_id: str):
+    """查询商品库中的商品及其价格历史"""
+    listing = await listing_store.get_listing(item_id)
+    if listing is None:
+        return {"success": False, "error": "商品库中没有该商品"}
+    return {"success": True, **listing}
+
+@router.get("/api/sellers/{seller_id}")
+async def get_seller_profile(seller_id: str):
+    """获取卖家画像"""
+    profile = seller_profiles.get(seller_id)
+    if profile is None:
+        return {"success": False, "error": "没有该卖家的画像"}
+    return {"success": True, "profile": profile.to_dict()}
+
+@router.get("/api/images/{digest}")
+async def get_image(digest: str, thumbnail: bool = False):
+    """获取缓存中的商品图片或缩略图"""
+    path = image_pipeline.file_path(digest, thumbnail)
+    if path is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return FileResponse(path, media_type=content_type(path))
+
+@router.get("/api/tasks/{task_id}/trace")
+async def get_task_trace(task_id: str):
+    """获取任务的追踪记录"""
+    spans = tracer.get_task_spans(task_id)
+    if not spans:
+        return {"success": False, "error": "没有该任务的追踪记录"}
+    return {"success": True, "task_id": task_id, "spans": spans}
+
 @router.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     """WebSocket端点"""
-    await manager.connect(websocket, client_id)
+    # 客户端可通过 ?encoding=msgpack 选择二进制编码
+    binary = websocket.query_params.get("encoding") == "msgpack" and binary_supported()
+    await manager.connect(websocket, client_id, binary)
     try:
         while True:
             # 接收客户端消息
@@ -250,19 +681,25 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             if message.get("type") == "ping":
                 # 心跳检测
                 await manager.send_personal_message(
-                    json.dumps({"type": "pong"}), 
+                    EncodedMessage({"type": "pong"}),
+                    client_id
+                )
+            elif message.get("type") == "start_comparison" and not lifecycle.accepting:
+                await manager.send_personal_message(
+                    EncodedMessage({"type": "error", "message": "服务正在关闭，暂不接收新任务"}),
                     client_id
                 )
             elif message.get("type") == "start_comparison":
                 # 开始比价
                 search_data = message.get("data", {})
-                task_id = f"task_{int(time.time() * 1000)}"
+                task_id = new_task_id()
                 search_data["task_id"] = task_id
                 
-                asyncio.create_task(execute_comparison_task(search_data))
+                manager.subscribe(client_id, task_id)
+                start_task(search_data)
                 
                 await manager.send_personal_message(
-                    json.dumps({
+                    EncodedMessage({
                         "type": "task_started",
                         "data": {
                             "message": "比价任务已启动",
@@ -271,6 +708,22 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                     }),
                     client_id
                 )
+            elif message.get("type") in ("subscribe", "resync"):
+                # 订阅任务进度，并补发当前完整进度
+                task_id = message.get("data", {}).get("task_id", "")
+                manager.subscribe(client_id, task_id)
+                await send_progress_snapshot(task_id, client_id)
+            elif message.get("type") == "unsubscribe":
+                task_id = message.get("data", {}).get("task_id", "")
+                manager.unsubscribe(client_id, task_id)
+            elif message.get("type") == "cancel_comparison":
+                # 取消比价
+                task_id = message.get("data", {}).get("task_id", "")
+                result = await cancel_comparison(task_id)
+                await manager.send_personal_message(
+                    EncodedMessage({"type": "task_cancel_result", "data": result}),
+                    client_id
+                )
                 
     except WebSocketDisconnect:
         manager.disconnect(client_id)
@@ -289,4 +742,4 @@ async def send_progress_update_legacy(client_id: str, status: str, message: str,
             "progress": progress
         }
     }
-    await manager.send_personal_message(json.dumps(update_message), client_id) 
+    await manager.send_personal_message(EncodedMessage(update_message), client_id) 
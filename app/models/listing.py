@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+from typing import Dict, Any, List, Optional
+
+class Listing:
+    """商品（内部表示）
+    
+    抓取、去重、排序、谈判之间按引用传递的轻量记录，使用 __slots__ 不带实例字典，
+    构造时不做Pydantic校验。只有在API边界才通过 to_dict 转换为普通字典。
+    字段与 ProductInfo 一致；商品ID和卖家ID会被驻留，作为各处缓存的键时比较很快。
+    """
+    
+    __slots__ = ("id", "title", "price", "seller_name", "seller_id", "location", "description", "images", "url",
+                 "condition")
+    
+    def __init__(self, id: str, title: str, price: float, seller_name: str, seller_id: str, location: str,
+                 description: str, url: str, images: Optional[List[str]] = None, condition: str = ""):
+        self.id = sys.intern(id)
+        self.title = title
+        self.price = float(price)
+        self.seller_name = seller_name
+        self.seller_id = sys.intern(seller_id)
+        self.location = location
+        self.description = description
+        self.images = images if images is not None else []
+        self.url = url
+        self.condition = condition
+        
+    def replace(self, **changes) -> "Listing":
+        """返回修改了部分字段的副本，原记录可能被缓存共享，不应直接修改"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return Listing(**values)
+        
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为与 ProductInfo.dict() 相同结构的字典"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "price": self.price,
+            "seller_name": self.seller_name,
+            "seller_id": self.seller_id,
+            "location": self.location,
+            "description": self.description,
+            "images": list(self.images),
+            "url": self.url,
+            "condition": self.condition
+        }
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Listing":
+        return cls(
+            id=data["id"], title=data["title"], price=data["price"], seller_name=data["seller_name"],
+            seller_id=data["seller_id"], location=data["location"], description=data["description"],
+            url=data["url"], images=list(data.get("images") or []), condition=data.get("condition") or ""
+        )
+        
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Listing):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+        
+    __hash__ = None
+    
+    def __repr__(self) -> str:
+        return f"Listing(id={self.id!r}, title={self.title!r}, price={self.price!r}, seller_id={self.seller_id!r})"
@@ -16,6 +16,7 @@ class TaskStatus(str, Enum):
     COMPARING = "comparing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class UserCredentials(BaseModel):
     """用户凭证"""
@@ -27,6 +28,20 @@ class SearchRequest(BaseModel):
     query: str = Field(..., description="商品需求描述")
     max_price: float = Field(..., description="最高价格")
     credentials: UserCredentials = Field(..., description="用户凭证")
+    client_id: Optional[str] = Field(None, description="订阅任务进度的WebSocket客户端ID")
+
+class BatchSearchRequest(BaseModel):
+    """批量搜索请求"""
+    requests: List[SearchRequest] = Field(..., description="比价请求列表")
+    client_id: Optional[str] = Field(None, description="订阅批次进度的WebSocket客户端ID")
+
+class WatchRequest(BaseModel):
+    """监控查询请求"""
+    query: str = Field(..., description="商品需求描述")
+    max_price: float = Field(..., description="最高价格")
+    credentials: UserCredentials = Field(..., description="用户凭证，不会持久化")
+    interval: Optional[float] = Field(None, description="检查间隔(秒)")
+    client_id: Optional[str] = Field(None, description="接收监控通知的WebSocket客户端ID")
 
 class ProductInfo(BaseModel):
     """商品信息"""
@@ -39,6 +54,7 @@ class ProductInfo(BaseModel):
     description: str = Field(..., description="商品描述")
     images: List[str] = Field(default=[], description="商品图片")
     url: str = Field(..., description="商品链接")
+    condition: str = Field(default="", description="成色")
 
 class CommunicationRecord(BaseModel):
     """沟通记录"""
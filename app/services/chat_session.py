@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+from loguru import logger
+from app.services.goofish_service import GoofishService
+from app.services.seller_inbox import SellerInbox
+from config.settings import settings
+
+class Conversation:
+    """与单个卖家的会话状态"""
+    
+    def __init__(self, seller_id: str):
+        self.seller_id = seller_id
+        self.opened_at = time.time()
+        self.last_activity = self.opened_at
+        self.sent_count = 0
+        self.received_count = 0
+        self.awaiting_reply = False  # 最近一条消息还没有收到回复
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seller_id": self.seller_id,
+            "opened_at": self.opened_at,
+            "last_activity": self.last_activity,
+            "sent_count": self.sent_count,
+            "received_count": self.received_count,
+            "awaiting_reply": self.awaiting_reply
+        }
+
+class ChatMultiplexer:
+    """聊天多路复用器 - 多个谈判Agent共享同一个已登录的浏览器会话
+    
+    浏览器一次只能执行一个操作，所有命令经由队列串行执行；
+    卖家回复由一个收件箱统一扫描后按卖家分发，因此同一卖家同时只能有一个谈判（见 negotiate_exclusively）。
+    对外提供与GoofishService相同的消息接口，可直接作为NegotiationAgent的goofish_service。
+    """
+    
+    def __init__(self, goofish_service: GoofishService):
+        self.service = goofish_service
+        self.conversations: Dict[str, Conversation] = {}
+        self.inbox = SellerInbox(self._fetch_new_messages)
+        self._commands: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closed = False
+        self._claims: Dict[str, Tuple[str, asyncio.Future]] = {}  # 卖家ID -> (正在谈判的商品ID, 谈判结果)
+        self._results: Dict[Tuple[str, str], Dict[str, Any]] = {}  # (卖家ID, 商品ID) -> 已结束的谈判结果
+    
+    @property
+    def is_logged_in(self) -> bool:
+        return self.service.is_logged_in
+    
+    async def submit(self, command: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        提交一个浏览器命令，按提交顺序串行执行
+        
+        Args:
+            command: 要执行的协程函数
+            *args: 命令参数
+            
+        Returns:
+            命令的执行结果
+        """
+        if self._closed:
+            raise RuntimeError("聊天会话已关闭")
+        
+        if self._commands is None:
+            self._commands = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run_commands())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._commands.put((command, args, future))
+        return await future
+    
+    async def _run_commands(self):
+        """命令执行循环：同一时刻只有一个命令操作浏览器"""
+        while True:
+            command, args, future = await self._commands.get()
+            if future.cancelled():
+                # 调用方已放弃等待，跳过该命令
+                continue
+            try:
+                result = await command(*args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+    
+    async def negotiate_exclusively(self, seller_id: str, item_id: str,
+                                    negotiate: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        在会话上与卖家谈判，同一卖家同时只进行一个谈判
+        
+        批量任务中多个查询共用一个会话，可能选中同一卖家。卖家回复只按卖家ID分发，
+        并行谈判会互相收到对方的回复，所以：同一商品复用先开始的谈判结果，
+        同一卖家的其他商品等前一个谈判结束后再开始；前一个谈判被取消时卖家的回复可能还在路上，
+        先等这条回复到达或超时，新谈判的消息不与它交错。
+        
+        Args:
+            seller_id: 卖家ID
+            item_id: 商品ID
+            negotiate: 执行谈判的协程函数
+            
+        Returns:
+            谈判结果
+        """
+        while True:
+            done = self._results.get((seller_id, item_id))
+            if done is not None:
+                logger.info(f"复用与卖家 {seller_id} 对商品 {item_id} 的谈判结果")
+                return dict(done)
+            claim = self._claims.get(seller_id)
+            if claim is None:
+                break
+            # 等待前一个谈判结束；它被取消或失败时重新检查
+            await asyncio.wait({claim[1]})
+            
+        future = asyncio.get_running_loop().create_future()
+        self._claims[seller_id] = (item_id, future)
+        try:
+            conversation = self.open_conversation(seller_id)
+            if conversation.awaiting_reply:
+                remaining = conversation.last_activity + settings.SELLER_REPLY_TIMEOUT - time.time()
+                if remaining > 0:
+                    await self.inbox.wait_for_reply(seller_id, remaining)
+                conversation.awaiting_reply = False
+            # 前一个谈判迟到的回复不属于这次谈判
+            self.inbox.discard(seller_id)
+            result = await negotiate()
+            if not result.get("cancelled", False):
+                self._results[(seller_id, item_id)] = result
+            return result
+        finally:
+            del self._claims[seller_id]
+            future.set_result(None)
+    
+    def open_conversation(self, seller_id: str) -> Conversation:
+        """获取或打开与卖家的会话"""
+        if seller_id not in self.conversations:
+            self.conversations[seller_id] = Conversation(seller_id)
+            logger.info(f"打开与卖家 {seller_id} 的会话，当前会话数: {len(self.conversations)}")
+        return self.conversations[seller_id]
+    
+    async def send_message_to_seller(self, seller_id: str, message: str) -> bool:
+        """
+        向卖家发送消息
+        
+        Args:
+            seller_id: 卖家ID
+            message: 消息内容
+            
+        Returns:
+            发送是否成功
+        """
+        conversation = self.open_conversation(seller_id)
+        success = await self.submit(self.service.send_message_to_seller, seller_id, message)
+        if success:
+            conversation.sent_count += 1
+            conversation.awaiting_reply = True
+            conversation.last_activity = time.time()
+        return success
+    
+    async def get_seller_response(self, seller_id: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        获取卖家回复
+        
+        Args:
+            seller_id: 卖家ID
+            timeout: 最长等待时间(秒)，默认使用 SELLER_REPLY_TIMEOUT
+            
+        Returns:
+            卖家回复内容，超时返回None
+        """
+        conversation = self.open_conversation(seller_id)
+        response = await self.inbox.wait_for_reply(seller_id, timeout)
+        if response:
+            conversation.received_count += 1
+            conversation.awaiting_reply = False
+            conversation.last_activity = time.time()
+        return response
+    
+    async def _fetch_new_messages(self):
+        # 收件箱的扫描同样经由命令队列，避免与发送操作争用浏览器
+        return await self.submit(self.service.fetch_new_messages)
+    
+    def get_info(self) -> Dict[str, Any]:
+        """获取会话信息"""
+        return {
+            "logged_in": self.is_logged_in,
+            "pending_commands": self._commands.qsize() if self._commands else 0,
+            "conversations": [c.to_dict() for c in self.conversations.values()]
+        }
+    
+    def close(self):
+        """关闭多路复用器，浏览器由会话的所有者负责关闭"""
+        self._closed = True
+        self.inbox.close()
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+        self._worker = None
+        
+        if self._commands:
+            while not self._commands.empty():
+                _, _, future = self._commands.get_nowait()
+                if not future.done():
+                    future.cancel()
+        self.conversations.clear()
+        self._results.clear()
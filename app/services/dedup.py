@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import hashlib
+import re
+import unicodedata
+from typing import Callable, Dict, List, Optional, Tuple
+from app.models.listing import Listing
+from config.settings import settings
+
+# 标点、符号和空白，归一化时去掉
+_NOISE = re.compile(r"[\W_]+", re.UNICODE)
+# 连续的字母数字作为一个词，其余字符(中文)按字切分
+_TOKEN = re.compile(r"[a-z0-9]+|[^a-z0-9]")
+
+# 常见的重新上架修饰词，不参与相似度计算
+_FILLER_WORDS = ("急出", "急售", "秒出", "捡漏", "包邮", "自用", "转让", "出售", "闲置", "便宜卖", "低价")
+_FILLER = re.compile("|".join(_FILLER_WORDS))
+
+_HASH_BITS = 64
+_hash_cache: Dict[str, int] = {}
+
+def _hash(shingle: str) -> int:
+    # 稳定的64位哈希，跨进程一致
+    value = _hash_cache.get(shingle)
+    if value is None:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        if len(_hash_cache) < 200000:
+            _hash_cache[shingle] = value
+    return value
+
+@functools.lru_cache(maxsize=20000)
+def normalize_title(title: str) -> str:
+    """标题归一化：全角转半角、小写、去掉标点和修饰词；去重和排序会对同一标题重复调用，结果缓存"""
+    text = _FILLER.sub(" ", unicodedata.normalize("NFKC", title).lower())
+    return _NOISE.sub(" ", text).strip()
+
+def shingles(title: str, size: Optional[int] = None) -> List[str]:
+    """
+    把标题切分为词片段
+    
+    英文和数字按整词，中文按字，再取相邻size个组成片段。
+    
+    Args:
+        title: 商品标题
+        size: 片段长度
+        
+    Returns:
+        去重后的片段列表
+    """
+    size = size or settings.DEDUP_SHINGLE_SIZE
+    tokens = [t for t in _TOKEN.findall(normalize_title(title)) if not t.isspace()]
+    # 单个词片段不受词序影响，长片段保留局部顺序，两者一起使用
+    grams = list(tokens)
+    for n in range(2, size + 1):
+        grams.extend("".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return list(dict.fromkeys(grams))
+
+def simhash(title: str) -> int:
+    """
+    计算标题的64位SimHash
+    
+    Args:
+        title: 商品标题
+        
+    Returns:
+        指纹，相似标题的指纹汉明距离小
+    """
+    hashes = [_hash(s) for s in shingles(title)]
+    if not hashes:
+        return 0
+    # 按位统计1的个数：把每个哈希格式化为二进制串后逐列计数
+    columns = zip(*(format(h, "064b") for h in hashes))
+    half = len(hashes) / 2
+    fingerprint = 0
+    for column in columns:
+        fingerprint = (fingerprint << 1) | (column.count("1") > half)
+    return fingerprint
+
+def _band_masks(bands: int) -> List[Tuple[int, int]]:
+    """把64位切成bands段，返回 (位移, 掩码)"""
+    widths = [_HASH_BITS // bands + (1 if i < _HASH_BITS % bands else 0) for i in range(bands)]
+    masks = []
+    shift = 0
+    for width in widths:
+        masks.append((shift, (1 << width) - 1))
+        shift += width
+    return masks
+
+class NearDuplicateIndex:
+    """商品近似重复索引
+    
+    标题取SimHash指纹，按鸽巢原理分段建桶：汉明距离不超过k的两个指纹，
+    切成k+1段后至少有一段完全相同，所以只需比较同桶的候选，不必两两比较。
+    同一商品ID、或同一卖家价格相近且标题指纹足够接近的商品视为同一件。
+    提供图片哈希时，价格相近且有一张照片的dHash足够接近的商品也视为同一件，图片哈希同样分段建桶。
+    """
+    
+    def __init__(self, threshold: Optional[int] = None, price_tolerance: Optional[float] = None,
+                 same_seller: Optional[bool] = None,
+                 image_hashes: Optional[Callable[[Listing], List[int]]] = None):
+        self.threshold = threshold if threshold is not None else settings.DEDUP_HAMMING_THRESHOLD
+        self.price_tolerance = price_tolerance if price_tolerance is not None else settings.DEDUP_PRICE_TOLERANCE
+        self.same_seller = same_seller if same_seller is not None else settings.DEDUP_SAME_SELLER
+        self._masks = _band_masks(self.threshold + 1)
+        self._buckets: Dict[Tuple, List[int]] = {}
+        self.image_hashes = image_hashes
+        self.image_threshold = settings.IMAGE_HASH_THRESHOLD
+        self._image_masks = _band_masks(self.image_threshold + 1)
+        self._image_buckets: Dict[Tuple, List[Tuple[int, int]]] = {}
+        self._ids: Dict[str, int] = {}
+        self._fingerprints: List[int] = []
+        self._products: List[Listing] = []
+        self.comparisons = 0
+        
+    def __len__(self) -> int:
+        return len(self._products)
+        
+    def _price_close(self, a: float, b: float) -> bool:
+        return abs(a - b) <= max(a, b) * self.price_tolerance
+        
+    def _find_by_images(self, product: Listing, seller: Optional[str], hashes: List[int]) -> Optional[int]:
+        for image_hash in hashes:
+            for band, (shift, mask) in enumerate(self._image_masks):
+                for index, other in self._image_buckets.get((seller, band, (image_hash >> shift) & mask), ()):
+                    self.comparisons += 1
+                    if (bin(image_hash ^ other).count("1") <= self.image_threshold
+                            and self._price_close(product.price, self._products[index].price)):
+                        return index
+        return None
+        
+    def find(self, product: Listing, fingerprint: Optional[int] = None,
+             hashes: Optional[List[int]] = None) -> Optional[int]:
+        """
+        查找与商品重复的已收录商品
+        
+        Args:
+            product: 商品
+            fingerprint: 预先计算的标题指纹
+            hashes: 预先取得的图片哈希
+            
+        Returns:
+            重复商品在索引中的序号，没有重复时返回None
+        """
+        if product.id in self._ids:
+            return self._ids[product.id]
+            
+        seller = product.seller_id if self.same_seller else None
+        if hashes is None and self.image_hashes is not None:
+            hashes = self.image_hashes(product)
+        if hashes:
+            duplicate = self._find_by_images(product, seller, hashes)
+            if duplicate is not None:
+                return duplicate
+                
+        fingerprint = simhash(product.title) if fingerprint is None else fingerprint
+        checked = set()
+        for band, (shift, mask) in enumerate(self._masks):
+            for index in self._buckets.get((seller, band, (fingerprint >> shift) & mask), ()):
+                if index in checked:
+                    continue
+                checked.add(index)
+                self.comparisons += 1
+                if (bin(fingerprint ^ self._fingerprints[index]).count("1") <= self.threshold
+                        and self._price_close(product.price, self._products[index].price)):
+                    return index
+        return None
+        
+    def add(self, product: Listing) -> Tuple[int, bool]:
+        """
+        收录商品
+        
+        Args:
+            product: 商品
+            
+        Returns:
+            (商品所属的序号, 是否为新商品)；重复时返回已收录商品的序号
+        """
+        fingerprint = simhash(product.title)
+        hashes = self.image_hashes(product) if self.image_hashes is not None else []
+        duplicate = self.find(product, fingerprint, hashes)
+        if duplicate is not None:
+            return duplicate, False
+            
+        index = len(self._products)
+        self._products.append(product)
+        self._fingerprints.append(fingerprint)
+        self._ids[product.id] = index
+        seller = product.seller_id if self.same_seller else None
+        for band, (shift, mask) in enumerate(self._masks):
+            self._buckets.setdefault((seller, band, (fingerprint >> shift) & mask), []).append(index)
+        for image_hash in hashes:
+            for band, (shift, mask) in enumerate(self._image_masks):
+                key = (seller, band, (image_hash >> shift) & mask)
+                self._image_buckets.setdefault(key, []).append((index, image_hash))
+        return index, True
+
+def deduplicate_products(products: List[Listing],
+                         image_hashes: Optional[Callable[[Listing], List[int]]] = None) -> List[Listing]:
+    """
+    合并近似重复的商品
+    
+    Args:
+        products: 商品列表
+        image_hashes: 取商品图片哈希的函数，不提供时只按链接和标题合并
+        
+    Returns:
+        去重后的商品，保持首次出现的顺序；重复商品中保留价格最低的一件
+    """
+    index = NearDuplicateIndex(image_hashes=image_hashes)
+    kept: Dict[int, Listing] = {}
+    for product in products:
+        position, is_new = index.add(product)
+        if is_new or product.price < kept[position].price:
+            kept[position] = product
+    return list(kept.values())
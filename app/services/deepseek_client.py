@@ -1,35 +1,57 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import openai
 import asyncio
 from typing import List, Dict, Any, Optional
 from config.settings import settings
+from app.services.tracing import traced
 from loguru import logger
 
 class DeepSeekClient:
     """DeepSeek API客户端"""
     
     def __init__(self):
-        # 检查API密钥配置
+        self._client = None
+        # 检查API密钥配置；openai客户端在首次使用或预热时才创建
         if not settings.DEEPSEEK_API_KEY or settings.DEEPSEEK_API_KEY == "your_deepseek_api_key_here":
             logger.warning("DeepSeek API密钥未配置，将使用模拟模式")
-            self.client = None
             self.mock_mode = True
         else:
+            self.mock_mode = False
+    
+    @property
+    def client(self):
+        """延迟导入openai并创建客户端"""
+        if self._client is None and not self.mock_mode:
             try:
-                self.client = openai.OpenAI(
+                import openai
+                self._client = openai.OpenAI(
                     api_key=settings.DEEPSEEK_API_KEY,
                     base_url=settings.DEEPSEEK_BASE_URL,
                     timeout=30.0  # 设置30秒超时
                 )
-                self.mock_mode = False
                 logger.info("DeepSeek API客户端初始化成功")
             except Exception as e:
                 logger.error(f"DeepSeek API客户端初始化失败: {e}")
-                self.client = None
                 self.mock_mode = True
+        return self._client
+    
+    async def warmup(self) -> bool:
+        """
+        预热：创建客户端并建立到API的连接
+        
+        Returns:
+            连接是否已建立，模拟模式下返回False
+        """
+        client = await asyncio.to_thread(lambda: self.client)
+        if client is None:
+            return False
+        
+        # 请求模型列表以完成DNS解析和TLS握手，连接留在连接池中供后续调用复用
+        await asyncio.wait_for(asyncio.to_thread(client.models.list), timeout=settings.WARMUP_TIMEOUT)
+        return True
     
+    @traced("llm.chat_completion")
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -52,9 +74,11 @@ class DeepSeekClient:
             生成的回复文本
         """
         # 如果是模拟模式，返回模拟响应
-        if self.mock_mode:
+        if self.mock_mode or self.client is None:
             return await self._mock_response(messages)
         
+        import openai
+        
         for attempt in range(max_retries):
             try:
                 # 使用asyncio.to_thread来异步调用同步API
@@ -173,6 +197,67 @@ class DeepSeekClient:
             "quality_requirements": "标准"
         }
     
+    async def analyze_product_requirements(self, user_queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        一次调用分析多个商品需求
+        
+        Args:
+            user_queries: 用户输入的需求描述列表
+            
+        Returns:
+            与输入顺序一致的分析结果列表
+        """
+        unique_queries = list(dict.fromkeys(user_queries))
+        if len(unique_queries) == 1:
+            analysis = await self.analyze_product_requirement(unique_queries[0])
+            return [analysis for _ in user_queries]
+        
+        numbered = "\n".join(f"{i + 1}. {query}" for i, query in enumerate(unique_queries))
+        messages = [
+            {
+                "role": "system",
+                "content": """你是一个专业的商品需求分析助手。请逐条分析用户的商品需求，提取关键信息。
+                
+                请返回JSON数组，按输入顺序每条需求对应一个对象，包含：
+                - keywords: 搜索关键词列表
+                - category: 商品类别
+                - features: 重要特征列表
+                - price_sensitivity: 价格敏感度(high/medium/low)
+                - quality_requirements: 质量要求
+                """
+            },
+            {
+                "role": "user",
+                "content": f"请分析这些商品需求：\n{numbered}"
+            }
+        ]
+        
+        analyses = None
+        response = await self.chat_completion(messages)
+        if response:
+            try:
+                import json
+                response = response.strip()
+                if response.startswith('```json'):
+                    response = response[7:]
+                if response.endswith('```'):
+                    response = response[:-3]
+                parsed = json.loads(response.strip())
+                if isinstance(parsed, list) and len(parsed) == len(unique_queries):
+                    analyses = parsed
+                else:
+                    logger.warning("DeepSeek批量分析结果数量不匹配，改为逐条分析")
+            except Exception as e:
+                logger.warning(f"无法解析DeepSeek返回的批量JSON: {e}，改为逐条分析")
+        
+        if analyses is None:
+            analyses = await asyncio.gather(*[
+                self.analyze_product_requirement(query) for query in unique_queries
+            ])
+        
+        by_query = dict(zip(unique_queries, analyses))
+        return [by_query[query] for query in user_queries]
+    
     async def generate_negotiation_message(
         self,
         product_info: Dict[str, Any],
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set
+from loguru import logger
+from app.models.listing import Listing
+from app.services.listing_parser import ListingDetail, parse_detail
+from app.services.page_recorder import page_recorder
+from config.settings import settings
+
+class DetailEnricher:
+    """商品详情补全
+    
+    搜索结果卡片上只有标题和价格。去重后立即为候选商品并发抓取详情页，排序完成后取消没入选的请求。
+    搜索不等待详情：入选商品先带着已缓存的详情进入谈判，其余详情在谈判期间到达，生成结果时再补上。
+    所有请求共用一个aiohttp连接池，按总并发和单域名并发限流，详情按商品ID缓存。
+    """
+    
+    def __init__(self):
+        self._session = None  # aiohttp.ClientSession，首次抓取时创建
+        self._cache: "OrderedDict[str, ListingDetail]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._receiving: Set[str] = set()
+        self.fetched = 0
+        self.applied = 0
+        self.failed = 0
+        self.cancelled = 0
+        
+    def _get_session(self):
+        """首次抓取时创建连接池，aiohttp导入较慢，不在启动时导入"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=settings.DETAIL_CONCURRENCY, limit_per_host=settings.DETAIL_PER_HOST_LIMIT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=settings.DETAIL_FETCH_TIMEOUT),
+                headers={"User-Agent": settings.DETAIL_USER_AGENT}
+            )
+        return self._session
+        
+    def cached(self, item_id: str) -> Optional[ListingDetail]:
+        """未过期的缓存详情"""
+        detail = self._cache.get(item_id)
+        if detail is None:
+            return None
+        if time.time() - detail.fetched_at >= settings.DETAIL_CACHE_TTL:
+            del self._cache[item_id]
+            return None
+        self._cache.move_to_end(item_id)
+        return detail
+        
+    def _store(self, item_id: str, detail: ListingDetail):
+        self._cache[item_id] = detail
+        self._cache.move_to_end(item_id)
+        while len(self._cache) > settings.DETAIL_CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+            
+    def _enrichable(self, product: Listing) -> bool:
+        # 模拟商品和没有链接的商品没有详情页
+        return bool(product.url) and not product.id.startswith("mock_")
+        
+    def prefetch(self, products: List[Listing], cookies: Optional[Dict[str, str]] = None) -> List[str]:
+        """
+        开始为候选商品抓取详情，立即返回
+        
+        Args:
+            products: 去重后的候选商品，按抓取顺序最多取 DETAIL_PREFETCH 个
+            cookies: 登录会话的Cookie
+            
+        Returns:
+            新发起请求的商品ID
+        """
+        started = []
+        if not settings.DETAIL_ENRICH_ENABLED:
+            return started
+        for product in products[:settings.DETAIL_PREFETCH]:
+            if not self._enrichable(product) or product.id in self._inflight or self.cached(product.id):
+                continue
+            task = asyncio.create_task(self._fetch(product.id, product.url, cookies))
+            self._inflight[product.id] = task
+            task.add_done_callback(lambda _, item_id=product.id: self._inflight.pop(item_id, None))
+            started.append(product.id)
+        return started
+        
+    async def _fetch(self, item_id: str, url: str, cookies: Optional[Dict[str, str]]) -> Optional[ListingDetail]:
+        try:
+            async with self._get_session().get(url, cookies=cookies) as response:
+                self._receiving.add(item_id)
+                if response.status != 200:
+                    self.failed += 1
+                    return None
+                html = await response.text(errors="replace")
+            await page_recorder.record_async("detail", html, url=url, item_id=item_id)
+            # 解析HTML较慢，放到线程中执行
+            detail = await asyncio.to_thread(parse_detail, html)
+            self.fetched += 1
+            self._store(item_id, detail)
+            return detail
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"抓取商品详情失败 {url}: {e}")
+            return None
+        finally:
+            self._receiving.discard(item_id)
+            
+    def select(self, products: List[Listing], cookies: Optional[Dict[str, str]] = None,
+               prefetched: Optional[List[str]] = None):
+        """
+        排序完成后登记入选的商品，立即返回
+        
+        Args:
+            products: 入选的商品
+            cookies: 登录会话的Cookie
+            prefetched: 本次预取发起请求的商品ID，其中没有入选、还在等待连接的请求会被取消
+        """
+        if not settings.DETAIL_ENRICH_ENABLED or not products:
+            return
+        
+        # 连接池按先来先服务排队，没入选的预取请求让出位置；已经在接收的请求继续完成并写入缓存
+        selected = {product.id for product in products}
+        for item_id in prefetched or ():
+            task = self._inflight.get(item_id)
+            if task is not None and item_id not in selected and item_id not in self._receiving:
+                task.cancel()
+                self.cancelled += 1
+                
+        # 入选但没有预取的商品现在补发请求
+        self.prefetch([p for p in products if p.id not in self._inflight], cookies)
+        
+    async def wait(self, products: List[Listing], timeout: float) -> int:
+        """
+        等待商品的详情请求完成
+        
+        Args:
+            products: 商品
+            timeout: 最多等待的时间(秒)
+            
+        Returns:
+            超时仍未完成的请求数
+        """
+        waiting = {self._inflight[p.id] for p in products if p.id in self._inflight}
+        if not waiting:
+            return 0
+        _, pending = await asyncio.wait(waiting, timeout=timeout)
+        return len(pending)
+        
+    def apply(self, products: List[Listing]) -> List[Listing]:
+        """
+        用已经拿到的详情补全商品，不等待还在进行的请求
+        
+        Args:
+            products: 商品
+            
+        Returns:
+            补全后的商品，顺序不变；没有详情的商品保持原样
+        """
+        if not settings.DETAIL_ENRICH_ENABLED:
+            return products
+        enriched = []
+        for product in products:
+            detail = self.cached(product.id)
+            if detail is not None:
+                updated = detail.apply(product)
+                # 同一商品可能补全多次，只统计实际变化的
+                if updated != product:
+                    self.applied += 1
+                product = updated
+            enriched.append(product)
+        return enriched
+        
+    async def close(self):
+        """取消未完成的请求并关闭连接池"""
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.DETAIL_ENRICH_ENABLED,
+            "cached": len(self._cache),
+            "inflight": len(self._inflight),
+            "fetched": self.fetched,
+            "applied": self.applied,
+            "failed": self.failed,
+            "cancelled": self.cancelled
+        }
+
+# 全局详情补全实例
+detail_enricher = DetailEnricher()
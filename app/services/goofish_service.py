@@ -2,21 +2,117 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
-import aiohttp
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-from typing import List, Dict, Any, Optional
+import os
+from typing import List, Dict, Any, Optional, Tuple
 from loguru import logger
-from app.models.schema import ProductInfo, UserCredentials
+from app.models.schema import UserCredentials
+from app.models.listing import Listing
+from app.services.seller_inbox import SellerInbox
+from app.services.seller_profiles import seller_profiles
+from app.services.identity import item_identity, seller_identity
+from app.services.listing_parser import parse_search_page
+from app.services.page_recorder import page_recorder
+from app.services.tracing import traced
+from app.services.lifecycle import lifecycle, CHROME_OWNER_FLAG
+from config.settings import settings
 import time
 import random
-from selenium.webdriver.common.keys import Keys
 import urllib.parse
 
+# Selenium导入较慢，在首次启动浏览器时才导入
+
+def launch_driver():
+    """启动一个新的无头Chrome"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # 无头模式
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    # 标记所属进程，服务崩溃后遗留的Chrome可被识别回收
+    chrome_options.add_argument(f'{CHROME_OWNER_FLAG}={os.getpid()}')
+    
+    driver = webdriver.Chrome(options=chrome_options)
+    lifecycle.register_driver(driver)
+    return driver
+
+class DriverPool:
+    """预先启动的Chrome池
+    
+    Chrome冷启动需要数秒，池中保留少量已启动但未登录的浏览器，
+    登录时直接取用，取走后在后台补充。
+    """
+    
+    def __init__(self, size: Optional[int] = None):
+        if size is None:
+            # 模拟市场不需要浏览器
+            size = settings.PREWARM_BROWSERS if settings.MARKETPLACE_BACKEND != "simulated" else 0
+        self.size = size
+        self._drivers: List[Any] = []
+        self._filling: Optional[asyncio.Task] = None
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def acquire(self):
+        """取出一个预热的浏览器，池为空时返回None"""
+        if self._drivers:
+            self.hits += 1
+            driver = self._drivers.pop()
+        else:
+            self.misses += 1
+            driver = None
+        self.refill()
+        return driver
+    
+    async def fill(self) -> int:
+        """
+        补充浏览器到目标数量
+        
+        Returns:
+            池中可用的浏览器数量
+        """
+        while len(self._drivers) < self.size:
+            driver = await asyncio.to_thread(launch_driver)
+            self.launched += 1
+            self._drivers.append(driver)
+        return len(self._drivers)
+    
+    def refill(self):
+        """在后台补充浏览器"""
+        if self.size <= 0 or (self._filling and not self._filling.done()):
+            return
+        try:
+            self._filling = asyncio.get_running_loop().create_task(self._refill())
+        except RuntimeError:
+            pass
+    
+    async def _refill(self):
+        try:
+            await self.fill()
+        except Exception as e:
+            logger.warning(f"预热浏览器失败: {e}")
+    
+    def close(self):
+        if self._filling:
+            self._filling.cancel()
+            self._filling = None
+        while self._drivers:
+            lifecycle.quit_driver(self._drivers.pop())
+    
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "available": len(self._drivers),
+            "launched": self.launched,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
 class GoofishService:
     """咸鱼服务类"""
     
@@ -24,20 +120,15 @@ class GoofishService:
         self.driver = None
         self.session = None
         self.is_logged_in = False
+        self.inbox = SellerInbox(self.fetch_new_messages)
+        self._pending_replies: Dict[str, float] = {}  # 模拟模式下卖家预计回复的时间
         
     def _setup_driver(self):
-        """设置Chrome驱动"""
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # 无头模式
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        self.driver = webdriver.Chrome(options=chrome_options)
+        """设置Chrome驱动，优先使用预热的浏览器"""
+        self.driver = driver_pool.acquire() or launch_driver()
         return self.driver
     
+    @traced("goofish.login")
     async def login(self, credentials: UserCredentials) -> bool:
         """
         登录咸鱼账号
@@ -49,6 +140,11 @@ class GoofishService:
             登录是否成功
         """
         try:
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.common.keys import Keys
+            from selenium.webdriver.support import expected_conditions as EC
+            from selenium.webdriver.support.ui import WebDriverWait
+            
             if not self.driver:
                 self._setup_driver()
             
@@ -221,16 +317,18 @@ class GoofishService:
             logger.error(f"登录失败: {e}")
             return False
     
-    async def search_products(self, query: str, max_price: float) -> List[ProductInfo]:
+    @traced("goofish.search_products")
+    async def search_products(self, query: str, max_price: float, first_page_only: bool = False) -> List[Listing]:
         """
         搜索商品
         
         Args:
             query: 搜索关键词
-            max_price: 最高价格
+            max_price: 最高价格，只用于生成模拟数据
+            first_page_only: 只解析首屏结果，不滚动加载更多（用于缓存的增量刷新）
             
         Returns:
-            商品信息列表
+            页面上所有有价格的商品，价格上限由调用方过滤
         """
         try:
             if not self.driver:
@@ -247,127 +345,25 @@ class GoofishService:
             await asyncio.sleep(5)  # 等待页面加载
             
             # 滚动页面以加载更多内容
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            await asyncio.sleep(2)
+            if not first_page_only:
+                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                await asyncio.sleep(2)
             
             # 解析搜索结果
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            products = []
-            
-            # 尝试多种商品列表选择器
-            product_selectors = [
-                '.item-card',
-                '.product-item',
-                '.goods-item',
-                '[data-testid="item-card"]',
-                '.list-item',
-                '.search-item',
-                '.searchFeedList',
-                '.search-list-container',
-                '.feeds-list-container'
-            ]
-            
-            logger.info(self.driver.page_source)
-            product_items = []
-            for selector in product_selectors:
-                product_items = soup.select(selector)
-                if product_items:
-                    logger.info(f"使用选择器找到商品: {selector}, 数量: {len(product_items)}")
-                    break
+            html = self.driver.page_source
+            await page_recorder.record_async("search", html, url=search_url, query=query, max_price=max_price)
+            page = await asyncio.to_thread(parse_search_page, html)
             
-            if not product_items:
+            if page.selector is None:
                 logger.warning("未找到商品列表，尝试模拟数据")
                 return self._generate_mock_products(query, max_price)
+            logger.info(f"使用选择器找到商品: {page.selector}")
             
-            for i, item in enumerate(product_items[:10]):  # 限制前10个结果
-                try:
-                    # 尝试多种标题选择器
-                    title_selectors = [
-                        '.item-title',
-                        '.product-title', 
-                        '.goods-title',
-                        'h3',
-                        '.title',
-                        'a[title]'
-                    ]
-                    
-                    title = ""
-                    title_elem = None
-                    for selector in title_selectors:
-                        title_elem = item.select_one(selector)
-                        if title_elem:
-                            title = title_elem.get_text(strip=True) or title_elem.get('title', '')
-                            if title:
-                                break
-                    
-                    # 尝试多种价格选择器
-                    price_selectors = [
-                        '.item-price',
-                        '.product-price',
-                        '.goods-price',
-                        '.price',
-                        '[data-testid="price"]'
-                    ]
-                    
-                    price = 0.0
-                    for selector in price_selectors:
-                        price_elem = item.select_one(selector)
-                        if price_elem:
-                            price_text = price_elem.get_text(strip=True)
-                            # 提取价格数字
-                            import re
-                            price_match = re.search(r'[\d.]+', price_text)
-                            if price_match:
-                                price = float(price_match.group())
-                                break
-                    
-                    # 尝试多种卖家选择器
-                    seller_selectors = [
-                        '.seller-name',
-                        '.user-name',
-                        '.shop-name',
-                        '[data-testid="seller"]'
-                    ]
-                    
-                    seller_name = "未知卖家"
-                    for selector in seller_selectors:
-                        seller_elem = item.select_one(selector)
-                        if seller_elem:
-                            seller_name = seller_elem.get_text(strip=True)
-                            if seller_name:
-                                break
-                    
-                    # 获取商品链接
-                    url = ""
-                    if title_elem and title_elem.name == 'a':
-                        url = title_elem.get('href', '')
-                    else:
-                        link_elem = item.select_one('a')
-                        if link_elem:
-                            url = link_elem.get('href', '')
-                    
-                    # 确保URL是完整的
-                    if url and not url.startswith('http'):
-                        url = 'https://www.goofish.com' + url
-                    
-                    # 只添加有效的商品信息
-                    if title and price > 0 and price <= max_price:
-                        product = ProductInfo(
-                            id=f"product_{i}",
-                            title=title,
-                            price=price,
-                            seller_name=seller_name,
-                            seller_id=f"seller_{i}",
-                            location="未知",
-                            description=title,
-                            url=url
-                        )
-                        products.append(product)
-                        logger.info(f"找到商品: {title} - ¥{price}")
-                        
-                except Exception as e:
-                    logger.warning(f"解析商品信息失败: {e}")
-                    continue
+            products = page.products
+            for product in products:
+                logger.info(f"找到商品: {product.title} - ¥{product.price}")
+            for seller_id, credit in page.credits.items():
+                seller_profiles.observe_credit(seller_id, credit)
             
             if not products:
                 logger.warning("未解析到有效商品，生成模拟数据")
@@ -380,7 +376,7 @@ class GoofishService:
             logger.error(f"搜索商品失败: {e}")
             return self._generate_mock_products(query, max_price)
     
-    def _generate_mock_products(self, query: str, max_price: float) -> List[ProductInfo]:
+    def _generate_mock_products(self, query: str, max_price: float) -> List[Listing]:
         """生成模拟商品数据"""
         mock_products = []
         
@@ -402,19 +398,22 @@ class GoofishService:
                 f"{query} 学生价"
             ]
         
-        for i, title in enumerate(base_titles):
+        for title in base_titles:
             # 生成合理的价格
             base_price = max_price * 0.6  # 基础价格为最高价格的60%
             price_variation = max_price * 0.3  # 价格变动范围30%
             price = base_price + random.uniform(-price_variation, price_variation)
             price = max(100, min(price, max_price))  # 确保价格在合理范围内
             
-            product = ProductInfo(
-                id=f"mock_product_{i}",
+            # 模拟商品的ID同样由内容决定，同一查询的同一条模拟商品ID不变
+            item_id = "mock_" + item_identity("", title, query)
+            seller_name = f"用户{random.randint(1000, 9999)}"
+            product = Listing(
+                id=item_id,
                 title=title,
                 price=round(price, 2),
-                seller_name=f"用户{random.randint(1000, 9999)}",
-                seller_id=f"mock_seller_{i}",
+                seller_name=seller_name,
+                seller_id="mock_" + seller_identity([], seller_name, item_id),
                 location=random.choice(["北京", "上海", "广州", "深圳", "杭州"]),
                 description=title,
                 url=f"https://www.goofish.com/item/{random.randint(100000, 999999)}"
@@ -424,6 +423,16 @@ class GoofishService:
         logger.info(f"生成了 {len(mock_products)} 个模拟商品")
         return mock_products
     
+    def get_cookies(self) -> Dict[str, str]:
+        """登录会话的Cookie，供直接请求详情页使用"""
+        if not self.driver:
+            return {}
+        try:
+            return {cookie["name"]: cookie["value"] for cookie in self.driver.get_cookies()}
+        except Exception as e:
+            logger.warning(f"读取Cookie失败: {e}")
+            return {}
+    
     async def send_message_to_seller(self, seller_id: str, message: str) -> bool:
         """
         向卖家发送消息
@@ -447,6 +456,7 @@ class GoofishService:
             await asyncio.sleep(random.uniform(1, 3))  # 模拟网络延迟
             
             # 这里是模拟实现，实际需要根据咸鱼的页面结构来实现
+            self._pending_replies[seller_id] = time.time() + random.uniform(2, 5)
             logger.info("消息发送成功（模拟）")
             return True
             
@@ -454,19 +464,23 @@ class GoofishService:
             logger.error(f"发送消息失败: {e}")
             return False
     
-    async def get_seller_response(self, seller_id: str) -> Optional[str]:
+    async def fetch_new_messages(self) -> List[Tuple[str, str]]:
         """
-        获取卖家回复
+        扫描一次登录会话中的新消息
+        
+        由收件箱的监听任务统一调用，所有卖家共用一次扫描。
         
-        Args:
-            seller_id: 卖家ID
-            
         Returns:
-            卖家回复内容
+            新到达的 (卖家ID, 消息内容) 列表
         """
-        try:
-            # 模拟获取卖家回复
-            await asyncio.sleep(random.uniform(2, 5))  # 模拟等待回复时间
+        # 模拟实现：到达预计回复时间的卖家产生一条回复
+        # 实际实现中，这里需要读取消息列表中的未读会话
+        now = time.time()
+        due_sellers = [seller_id for seller_id, due in self._pending_replies.items() if due <= now]
+        
+        messages = []
+        for seller_id in due_sellers:
+            del self._pending_replies[seller_id]
             
             # 模拟回复内容
             responses = [
@@ -479,7 +493,24 @@ class GoofishService:
             
             response = random.choice(responses)
             logger.info(f"收到卖家 {seller_id} 回复: {response}")
-            return response
+            messages.append((seller_id, response))
+        
+        return messages
+    
+    async def get_seller_response(self, seller_id: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        获取卖家回复
+        
+        Args:
+            seller_id: 卖家ID
+            timeout: 最长等待时间(秒)，默认使用 SELLER_REPLY_TIMEOUT
+            
+        Returns:
+            卖家回复内容，超时返回None
+        """
+        try:
+            # 回复到达时立即唤醒，不再固定等待
+            return await self.inbox.wait_for_reply(seller_id, timeout)
             
         except Exception as e:
             logger.error(f"获取卖家回复失败: {e}")
@@ -487,7 +518,18 @@ class GoofishService:
     
     def close(self):
         """关闭浏览器"""
+        self.inbox.close()
         if self.driver:
-            self.driver.quit()
+            lifecycle.quit_driver(self.driver)
             self.driver = None
-        self.is_logged_in = False 
\ No newline at end of file
+        self.is_logged_in = False 
+
+def create_goofish_service() -> GoofishService:
+    """按 MARKETPLACE_BACKEND 创建咸鱼服务"""
+    if settings.MARKETPLACE_BACKEND == "simulated":
+        from app.services.simulated_marketplace import SimulatedGoofishService
+        return SimulatedGoofishService()
+    return GoofishService()
+
+# 全局预热浏览器池
+driver_pool = DriverPool()
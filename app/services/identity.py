@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import re
+import sys
+import urllib.parse
+from typing import Dict, Any, Iterable, Optional
+from app.models.listing import Listing
+from app.services.dedup import normalize_title
+
+# 商品链接中的商品ID：?id=123 / ?itemId=123 / /item/123
+_ITEM_QUERY_KEYS = ("id", "itemId", "item_id")
+_ITEM_PATH = re.compile(r"/item/(\d{6,})")
+
+# 卖家主页链接中的卖家ID：?userId=123 / /personal?userId=123 / /user/123
+_SELLER_QUERY_KEYS = ("userId", "user_id", "sellerId", "seller_id", "uid")
+_SELLER_PATH = re.compile(r"/(?:user|seller|shop)/(\d{4,})")
+
+# 商品卡片上可能携带ID的属性
+_ITEM_ATTRS = ("data-item-id", "data-itemid", "data-id")
+_SELLER_ATTRS = ("data-seller-id", "data-user-id", "data-userid")
+
+# 没有真实ID时的前缀，与纯数字的真实ID区分
+HASH_ITEM_PREFIX = "hash_"
+NAME_SELLER_PREFIX = "name_"
+ANON_SELLER_PREFIX = "anon_"
+
+UNKNOWN_SELLER = "未知卖家"
+
+def _digest(*parts: str) -> str:
+    data = "\x1f".join(parts).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+def _query_value(url: str, keys: Iterable[str]) -> Optional[str]:
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+    for key in keys:
+        values = query.get(key)
+        if values and values[0].isdigit():
+            return values[0]
+    return None
+
+def item_id_from_url(url: str) -> Optional[str]:
+    """
+    从商品链接中提取商品ID
+    
+    Args:
+        url: 商品链接
+        
+    Returns:
+        商品ID，链接中没有时返回None
+    """
+    if not url:
+        return None
+    value = _query_value(url, _ITEM_QUERY_KEYS)
+    if value:
+        return sys.intern(value)
+    match = _ITEM_PATH.search(url)
+    return sys.intern(match.group(1)) if match else None
+
+def seller_id_from_url(url: str) -> Optional[str]:
+    """从卖家主页链接中提取卖家ID"""
+    if not url:
+        return None
+    value = _query_value(url, _SELLER_QUERY_KEYS)
+    if value:
+        return sys.intern(value)
+    match = _SELLER_PATH.search(url)
+    return sys.intern(match.group(1)) if match else None
+
+def item_identity(url: str, title: str, seller_name: str, attrs: Optional[Dict[str, Any]] = None) -> str:
+    """
+    商品的稳定ID
+    
+    优先使用链接或卡片属性中的真实商品ID；都没有时使用归一化标题和卖家名称的内容哈希，
+    同一商品降价后ID不变。
+    
+    Args:
+        url: 商品链接
+        title: 商品标题
+        seller_name: 卖家名称
+        attrs: 商品卡片的HTML属性
+        
+    Returns:
+        驻留(interned)的商品ID
+    """
+    item_id = item_id_from_url(url)
+    if item_id:
+        return item_id
+    for name in _ITEM_ATTRS:
+        value = str((attrs or {}).get(name) or "")
+        if value.isdigit():
+            return sys.intern(value)
+    return sys.intern(HASH_ITEM_PREFIX + _digest(normalize_title(title), seller_name))
+
+def seller_identity(links: Iterable[str], seller_name: str, item_id: str,
+                    attrs: Optional[Dict[str, Any]] = None) -> str:
+    """
+    卖家的稳定ID
+    
+    依次尝试卡片属性、卖家主页链接；都没有时使用卖家名称的哈希，
+    名称也未知时每个商品视为不同的匿名卖家，避免把无关商品归到同一卖家。
+    
+    Args:
+        links: 商品卡片中的所有链接
+        seller_name: 卖家名称
+        item_id: 商品ID
+        attrs: 商品卡片和卖家元素的HTML属性
+        
+    Returns:
+        驻留(interned)的卖家ID
+    """
+    for name in _SELLER_ATTRS:
+        value = str((attrs or {}).get(name) or "")
+        if value.isdigit():
+            return sys.intern(value)
+    for link in links:
+        seller_id = seller_id_from_url(link)
+        if seller_id:
+            return seller_id
+    if seller_name and seller_name != UNKNOWN_SELLER:
+        return sys.intern(NAME_SELLER_PREFIX + _digest(seller_name))
+    return sys.intern(ANON_SELLER_PREFIX + item_id)
+
+def listing_key(product: Listing) -> str:
+    """商品在缓存、去重、统计和商品库中的键"""
+    return product.id
+
+def migrate_key(key: str) -> str:
+    """把旧版本以商品链接为键的记录转换为商品ID"""
+    if key.startswith("http"):
+        return item_id_from_url(key) or key
+    return sys.intern(key)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set
+from loguru import logger
+from app.models.listing import Listing
+from config.settings import settings
+
+# 可选依赖：缩略图和感知哈希需要Pillow，没有时只做下载和内容缓存
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+# 文件头到内容类型
+_SIGNATURES = ((b"\xff\xd8\xff", "image/jpeg"), (b"\x89PNG", "image/png"), (b"GIF8", "image/gif"), (b"RIFF", "image/webp"))
+
+def content_type(path: str) -> str:
+    """按文件头判断图片类型"""
+    with open(path, "rb") as f:
+        header = f.read(8)
+    for signature, media_type in _SIGNATURES:
+        if header.startswith(signature):
+            return media_type
+    return "application/octet-stream"
+
+def dhash(image) -> int:
+    """
+    计算图片的64位差值哈希(dHash)
+    
+    缩放为9x8灰度图后逐行比较相邻像素，压缩、缩放和轻微裁剪后的同一张照片哈希接近。
+    
+    Args:
+        image: Pillow图片
+        
+    Returns:
+        64位哈希
+    """
+    pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+class ImageRecord:
+    """一张已缓存的图片"""
+    
+    __slots__ = ("digest", "dhash", "width", "height")
+    
+    def __init__(self, digest: str, dhash: Optional[int] = None, width: int = 0, height: int = 0):
+        self.digest = digest
+        self.dhash = dhash
+        self.width = width
+        self.height = height
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "digest": self.digest,
+            "dhash": format(self.dhash, "016x") if self.dhash is not None else None,
+            "width": self.width,
+            "height": self.height
+        }
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ImageRecord":
+        value = data.get("dhash")
+        return cls(data["digest"], int(value, 16) if value else None, data.get("width", 0), data.get("height", 0))
+
+class ImagePipeline:
+    """商品图片后台处理管线
+    
+    抓取到的商品图片链接进入有界队列，由固定数量的worker共用一个aiohttp会话下载，
+    按总并发和单域名并发限流。图片按内容SHA-256存放在磁盘缓存中，同一张图片只存一份；
+    链接到内容的映射也写在磁盘上，重启后命中的链接不再下载。安装了Pillow时生成缩略图
+    并计算dHash，供去重时合并使用相同照片的商品。解码和缩放在线程中执行，整个过程不阻塞任务。
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or settings.IMAGE_CACHE_DIR
+        self._records: "OrderedDict[str, ImageRecord]" = OrderedDict()
+        self._queued: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._session = None
+        self.fetched = 0
+        self.cache_hits = 0
+        self.failed = 0
+        self.dropped = 0
+        self.bytes_downloaded = 0
+        
+    def _content_path(self, digest: str, suffix: str = "") -> str:
+        return os.path.join(self.cache_dir, digest[:2], digest + suffix)
+        
+    def _url_path(self, url: str) -> str:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "urls", key[:2], key)
+        
+    def start(self):
+        """启动下载worker"""
+        if not settings.IMAGE_PIPELINE_ENABLED or self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.IMAGE_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(settings.IMAGE_CONCURRENCY)]
+        
+    async def stop(self):
+        """停止worker并关闭HTTP会话，队列中未处理的图片直接丢弃"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queued.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            
+    def submit(self, products: List[Listing]) -> int:
+        """
+        登记商品图片，立即返回，下载在后台进行
+        
+        Args:
+            products: 抓取到的商品
+            
+        Returns:
+            新进入队列的图片数量
+        """
+        if self._queue is None:
+            return 0
+        added = 0
+        for product in products:
+            for url in product.images[:settings.IMAGE_MAX_PER_LISTING]:
+                if url in self._records or url in self._queued:
+                    continue
+                try:
+                    self._queue.put_nowait(url)
+                except asyncio.QueueFull:
+                    # 下载跟不上时丢弃，下次抓取到同一商品时再处理
+                    self.dropped += 1
+                    continue
+                self._queued.add(url)
+                added += 1
+        return added
+        
+    def _get_session(self):
+        """首次下载时创建HTTP会话，aiohttp导入较慢，不在启动时导入"""
+        if self._session is None:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=settings.IMAGE_CONCURRENCY, limit_per_host=settings.IMAGE_PER_HOST_LIMIT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=settings.IMAGE_FETCH_TIMEOUT)
+            )
+        return self._session
+        
+    async def _worker(self):
+        while True:
+            url = await self._queue.get()
+            try:
+                record = await self._process(url)
+                if record is not None:
+                    self._remember(url, record)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.debug(f"处理图片失败 {url}: {e}")
+            finally:
+                self._queued.discard(url)
+                self._queue.task_done()
+                
+    async def _process(self, url: str) -> Optional[ImageRecord]:
+        # 链接已经下载过：直接读取磁盘上的记录
+        record = await asyncio.to_thread(self._load_url, url)
+        if record is not None:
+            self.cache_hits += 1
+            return record
+            
+        data = await self._download(url)
+        if data is None:
+            self.failed += 1
+            return None
+        self.fetched += 1
+        self.bytes_downloaded += len(data)
+        return await asyncio.to_thread(self._store, url, data)
+        
+    async def _download(self, url: str) -> Optional[bytes]:
+        session = self._get_session()
+        async with session.get(url) as response:
+            if response.status != 200:
+                return None
+            chunks = []
+            size = 0
+            async for chunk in response.content.iter_chunked(65536):
+                size += len(chunk)
+                if size > settings.IMAGE_MAX_BYTES:
+                    return None
+                chunks.append(chunk)
+            return b"".join(chunks)
+            
+    def _load_url(self, url: str) -> Optional[ImageRecord]:
+        try:
+            with open(self._url_path(url), "r", encoding="utf-8") as f:
+                digest = f.read().strip()
+            with open(self._content_path(digest, ".json"), "r", encoding="utf-8") as f:
+                return ImageRecord.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+            
+    def _write(self, path: str, data: bytes):
+        """原子写入，并发的worker写同一内容时不会留下半个文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{id(data)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+    def _store(self, url: str, data: bytes) -> ImageRecord:
+        """保存图片内容、缩略图和元数据（在线程中执行）"""
+        digest = hashlib.sha256(data).hexdigest()
+        record = ImageRecord(digest)
+        # 元数据最后写入，存在即表示这张图片已经完整保存
+        meta_path = self._content_path(digest, ".json")
+        if not os.path.exists(meta_path):
+            if Image is not None:
+                self._analyze(record, data)
+            self._write(self._content_path(digest), data)
+            self._write(meta_path, json.dumps(record.to_dict()).encode("utf-8"))
+        else:
+            # 其他链接已经保存过同一张图片
+            record = self._load_digest(digest) or record
+        self._write(self._url_path(url), digest.encode("utf-8"))
+        return record
+        
+    def _load_digest(self, digest: str) -> Optional[ImageRecord]:
+        try:
+            with open(self._content_path(digest, ".json"), "r", encoding="utf-8") as f:
+                return ImageRecord.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+            
+    def _analyze(self, record: ImageRecord, data: bytes):
+        """生成缩略图并计算dHash，图片无法解码时跳过"""
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+                record.width, record.height = image.size
+                record.dhash = dhash(image)
+                thumbnail = image.convert("RGB")
+                size = settings.IMAGE_THUMBNAIL_SIZE
+                thumbnail.thumbnail((size, size))
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, "JPEG", quality=80)
+            self._write(self._content_path(record.digest, "_thumb.jpg"), buffer.getvalue())
+        except Exception as e:
+            logger.debug(f"无法解码图片 {record.digest}: {e}")
+            
+    def _remember(self, url: str, record: ImageRecord):
+        self._records[url] = record
+        self._records.move_to_end(url)
+        while len(self._records) > settings.IMAGE_INDEX_MAX_ENTRIES:
+            self._records.popitem(last=False)
+            
+    def image_hashes(self, product: Listing) -> List[int]:
+        """
+        商品已处理完的图片的哈希，尚未下载的图片不包含在内
+        
+        有dHash时使用dHash；没有Pillow时取内容摘要的前64位，只有完全相同的图片文件才会匹配。
+        """
+        hashes = []
+        for url in product.images:
+            record = self._records.get(url)
+            if record is not None:
+                hashes.append(record.dhash if record.dhash is not None else int(record.digest[:16], 16))
+        return hashes
+        
+    def get_record(self, url: str) -> Optional[ImageRecord]:
+        return self._records.get(url)
+        
+    def file_path(self, digest: str, thumbnail: bool = False) -> Optional[str]:
+        """
+        缓存中图片文件的路径
+        
+        Args:
+            digest: 图片内容的SHA-256
+            thumbnail: 是否返回缩略图
+            
+        Returns:
+            文件路径，不存在或摘要格式不对时返回None
+        """
+        if not _DIGEST.match(digest):
+            return None
+        path = self._content_path(digest, "_thumb.jpg" if thumbnail else "")
+        return path if os.path.exists(path) else None
+        
+    async def join(self):
+        """等待队列中的图片全部处理完"""
+        if self._queue is not None:
+            await self._queue.join()
+            
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.IMAGE_PIPELINE_ENABLED,
+            "thumbnails": Image is not None,
+            "queued": len(self._queued),
+            "indexed": len(self._records),
+            "fetched": self.fetched,
+            "cache_hits": self.cache_hits,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "bytes_downloaded": self.bytes_downloaded
+        }
+
+# 全局图片管线实例
+image_pipeline = ImagePipeline()
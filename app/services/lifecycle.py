@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import signal
+from typing import Dict, Any, List, Optional, Set, Callable
+from loguru import logger
+from config.settings import settings
+
+# 启动Chrome时附加的标记参数，值为所属服务进程的PID，用于识别孤儿进程
+CHROME_OWNER_FLAG = "--goofish-owner"
+
+# 本进程启动不足该时间的浏览器不视为孤儿
+ORPHAN_GRACE_SECONDS = 60
+
+class ResourceScope:
+    """资源作用域
+    
+    登记浏览器、会话等需要释放的资源，关闭时按登记的逆序释放，
+    无论正常结束、异常还是取消都只释放一次。
+    """
+    
+    def __init__(self, name: str, manager: "LifecycleManager"):
+        self.name = name
+        self._manager = manager
+        self._closers: List[Callable[[], Any]] = []
+        self.closed = False
+        
+    def add(self, closer: Callable[..., Any], *args) -> "ResourceScope":
+        """登记一个释放函数"""
+        if self.closed:
+            # 作用域已关闭，立即释放
+            self._run(lambda: closer(*args))
+        else:
+            self._closers.append(lambda: closer(*args))
+        return self
+        
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        while self._closers:
+            self._run(self._closers.pop())
+        self._manager._scopes.discard(self)
+        
+    def _run(self, closer: Callable[[], Any]):
+        try:
+            closer()
+        except Exception as e:
+            logger.warning(f"释放资源失败 ({self.name}): {e}")
+            
+    def __enter__(self) -> "ResourceScope":
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class LifecycleManager:
+    """服务生命周期管理器
+    
+    负责资源作用域、运行中任务的准入和排空、浏览器的可靠关闭以及孤儿Chrome回收。
+    """
+    
+    def __init__(self):
+        self.accepting = True
+        self._scopes: Set[ResourceScope] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._drivers: Dict[int, Any] = {}  # chromedriver进程PID -> WebDriver
+        self._reaper: Optional[asyncio.Task] = None
+        self.reaped = 0
+        
+    def scope(self, name: str) -> ResourceScope:
+        """创建一个资源作用域，关闭服务时仍未释放的作用域会被强制释放"""
+        scope = ResourceScope(name, self)
+        self._scopes.add(scope)
+        return scope
+        
+    def track(self, task: asyncio.Task) -> asyncio.Task:
+        """登记运行中的任务，关闭服务时等待其结束"""
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+        
+    def register_driver(self, driver):
+        """登记已启动的浏览器"""
+        pid = _driver_pid(driver)
+        if pid:
+            self._drivers[pid] = driver
+            
+    def quit_driver(self, driver):
+        """关闭浏览器，正常退出失败时直接结束进程"""
+        pid = _driver_pid(driver)
+        self._drivers.pop(pid, None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"浏览器正常退出失败，强制结束: {e}")
+            if pid:
+                _kill_tree(pid)
+                
+    async def drain(self, timeout: Optional[float] = None):
+        """
+        停止接收新任务，等待运行中的任务在截止时间内结束，超时的任务被取消
+        
+        Args:
+            timeout: 等待时间(秒)
+        """
+        self.accepting = False
+        timeout = timeout if timeout is not None else settings.SHUTDOWN_DRAIN_TIMEOUT
+        tasks = [task for task in self._tasks if not task.done()]
+        if not tasks:
+            return
+            
+        logger.info(f"等待 {len(tasks)} 个运行中的任务结束，最长 {timeout} 秒")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning(f"{len(pending)} 个任务未在截止时间内结束，取消")
+            for task in pending:
+                task.cancel()
+            await asyncio.wait(pending, timeout=5)
+            
+    def release_all(self):
+        """强制释放所有未关闭的作用域和浏览器"""
+        for scope in list(self._scopes):
+            scope.close()
+        for driver in list(self._drivers.values()):
+            self.quit_driver(driver)
+            
+    def reap_orphans(self) -> int:
+        """
+        回收孤儿Chrome进程
+        
+        带有所属标记的Chrome，如果所属服务进程已不存在，或属于本进程但其chromedriver
+        不在登记中（驱动对象丢失），则结束该Chrome及其chromedriver。
+        
+        Returns:
+            结束的进程数
+        """
+        if not os.path.isdir("/proc"):
+            return 0
+            
+        my_pid = os.getpid()
+        reaped = 0
+        for pid in _list_pids():
+            if pid == my_pid:
+                continue
+            owner = _owner_pid(pid)
+            if owner is None:
+                continue
+            
+            # 刚启动的浏览器可能还没来得及登记
+            if owner == my_pid and _age(pid) < ORPHAN_GRACE_SECONDS:
+                continue
+                
+            parent = _parent_pid(pid)
+            if owner == my_pid:
+                orphaned = parent not in self._drivers and parent != my_pid
+            else:
+                orphaned = not _is_alive_since(owner, pid)
+                
+            if orphaned:
+                logger.warning(f"结束孤儿Chrome进程 {pid}（所属进程 {owner}）")
+                if parent and parent != 1 and "chromedriver" in _cmdline(parent):
+                    _kill(parent)
+                _kill(pid)
+                reaped += 1
+                
+        self.reaped += reaped
+        return reaped
+        
+    def start(self):
+        """开始接收任务，并启动定期回收孤儿进程的后台任务"""
+        self.accepting = True
+        if settings.ORPHAN_REAP_INTERVAL > 0 and (self._reaper is None or self._reaper.done()):
+            self._reaper = asyncio.create_task(self._reap_loop())
+            
+    async def _reap_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.reap_orphans)
+            except Exception as e:
+                logger.warning(f"回收孤儿进程失败: {e}")
+            await asyncio.sleep(settings.ORPHAN_REAP_INTERVAL)
+            
+    def stop_reaper(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+            
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "accepting": self.accepting,
+            "running_tasks": len(self._tasks),
+            "open_scopes": len(self._scopes),
+            "browsers": len(self._drivers),
+            "reaped": self.reaped
+        }
+
+def _driver_pid(driver) -> Optional[int]:
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+def _read(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", "replace")
+    except OSError:
+        return ""
+
+def _list_pids() -> List[int]:
+    return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+
+def _cmdline(pid: int) -> str:
+    return _read(f"/proc/{pid}/cmdline").replace("\0", " ")
+
+def _stat_fields(pid: int) -> List[str]:
+    # 进程名可能包含空格，从最后一个右括号之后开始解析
+    stat = _read(f"/proc/{pid}/stat")
+    return stat[stat.rfind(")") + 2:].split() if stat else []
+
+def _parent_pid(pid: int) -> Optional[int]:
+    fields = _stat_fields(pid)
+    return int(fields[1]) if fields else None
+
+def _start_time(pid: int) -> Optional[int]:
+    fields = _stat_fields(pid)
+    return int(fields[19]) if len(fields) > 19 else None
+
+def _age(pid: int) -> float:
+    start = _start_time(pid)
+    uptime = _read("/proc/uptime").split()
+    if start is None or not uptime:
+        return 0.0
+    return float(uptime[0]) - start / os.sysconf("SC_CLK_TCK")
+
+def _owner_pid(pid: int) -> Optional[int]:
+    args = _read(f"/proc/{pid}/cmdline").split("\0")
+    # 只看浏览器主进程，渲染等子进程带有 --type 参数，随主进程一起退出
+    if any(arg.startswith("--type=") for arg in args):
+        return None
+    for arg in args:
+        if arg.startswith(CHROME_OWNER_FLAG + "="):
+            value = arg.split("=", 1)[1]
+            return int(value) if value.isdigit() else None
+    return None
+
+def _is_alive_since(owner: int, pid: int) -> bool:
+    """所属进程是否存活，且早于该Chrome启动（排除PID被复用的情况）"""
+    owner_start = _start_time(owner)
+    chrome_start = _start_time(pid)
+    if owner_start is None:
+        return False
+    return chrome_start is None or owner_start <= chrome_start
+
+def _kill(pid: int):
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _kill_tree(pid: int):
+    """结束进程及其直接子进程（chromedriver及其启动的Chrome）"""
+    if os.path.isdir("/proc"):
+        for child in _list_pids():
+            if _parent_pid(child) == pid:
+                _kill(child)
+    _kill(pid)
+
+# 全局生命周期管理器实例
+lifecycle = LifecycleManager()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from loguru import logger
+from app.models.listing import Listing
+from app.services.price_parser import parse_price
+from app.services.seller_profiles import parse_credit
+from app.services.identity import item_identity, seller_identity, UNKNOWN_SELLER
+
+# 搜索结果页和详情页的解析，不依赖浏览器，抓取和离线回放共用同一份代码
+
+# 商品列表选择器，按顺序尝试，第一个有结果的作为商品卡片
+SEARCH_CARD_SELECTORS = (
+    '.item-card',
+    '.product-item',
+    '.goods-item',
+    '[data-testid="item-card"]',
+    '.list-item',
+    '.search-item',
+    '.searchFeedList',
+    '.search-list-container',
+    '.feeds-list-container'
+)
+_TITLE_SELECTORS = ('.item-title', '.product-title', '.goods-title', 'h3', '.title', 'a[title]')
+_PRICE_SELECTORS = ('.item-price', '.product-price', '.goods-price', '.price', '[data-testid="price"]')
+_SELLER_SELECTORS = ('.seller-name', '.user-name', '.shop-name', '[data-testid="seller"]')
+_CREDIT_SELECTORS = ('.seller-credit', '.credit-level', '[data-testid="seller-credit"]')
+# 卡片上的商品图，卖家头像和角标不算，按顺序尝试
+_CARD_IMAGE_SELECTORS = (
+    '.item-img img', '[class*="main-pic"] img', '[class*="feeds-image"] img', '[data-testid="item-image"] img',
+    'a[href*="item"] img', ':scope > img'
+)
+
+# 每页解析的商品卡片数
+SEARCH_CARD_LIMIT = 10
+
+# 详情页中的描述、位置和图片，按顺序尝试
+_DESCRIPTION_SELECTORS = ('[class*="desc--"]', '.item-desc', '.desc', '[data-testid="item-desc"]')
+_LOCATION_SELECTORS = ('[class*="location"]', '.item-location', '.area', '[data-testid="item-location"]')
+_IMAGE_SELECTORS = ('[class*="item-main"] img', '[class*="carousel"] img', '.item-images img')
+
+# 成色说法，较具体的写法在前
+_CONDITION = re.compile(
+    r"(全新未拆|全新|几乎全新|准新|99新|98新|95新|9成新|九成新|8成新|八成新|7成新|七成新|有划痕|轻微使用痕迹|明显使用痕迹)"
+)
+_CONDITION_LABEL = re.compile(r"成色[:：]?\s*([^\s，,。；;]{1,8})")
+
+class ParseStats:
+    """选择器探测计数，回放和基准测试时传入，线上解析不统计"""
+    
+    def __init__(self):
+        self.cards = 0
+        self.probes = 0
+        self.misses = 0
+        self.hits: Counter = Counter()
+        
+    def count(self, selector: str, hit: bool):
+        self.probes += 1
+        if hit:
+            self.hits[selector] += 1
+        else:
+            self.misses += 1
+            
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "cards": self.cards,
+            "probes": self.probes,
+            "misses": self.misses,
+            "hits": dict(self.hits.most_common())
+        }
+
+class SearchPage:
+    """一页搜索结果的解析结果"""
+    
+    __slots__ = ("selector", "products", "credits", "failed")
+    
+    def __init__(self, selector: Optional[str] = None):
+        self.selector = selector  # 命中的商品列表选择器，None表示页面上没有商品列表
+        self.products: List[Listing] = []
+        self.credits: Dict[str, float] = {}  # 卖家ID到信用分数，页面上有信用时才有
+        self.failed = 0
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "selector": self.selector,
+            "products": [product.to_dict() for product in self.products],
+            "credits": dict(self.credits),
+            "failed": self.failed
+        }
+
+class ListingDetail:
+    """商品详情页补全的字段"""
+    
+    __slots__ = ("description", "location", "condition", "images", "fetched_at")
+    
+    def __init__(self, description: str = "", location: str = "", condition: str = "",
+                 images: Optional[List[str]] = None):
+        self.description = description
+        self.location = location
+        self.condition = condition
+        self.images = images or []
+        self.fetched_at = time.time()
+        
+    def apply(self, product: Listing) -> Listing:
+        """返回补全了详情的商品副本，详情页缺少的字段保留原值"""
+        changes = {}
+        if self.description:
+            changes["description"] = self.description
+        if self.location:
+            changes["location"] = self.location
+        if self.condition:
+            changes["condition"] = self.condition
+        if self.images:
+            changes["images"] = list(dict.fromkeys(product.images + self.images))
+        return product.replace(**changes) if changes else product
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "description": self.description,
+            "location": self.location,
+            "condition": self.condition,
+            "images": list(self.images)
+        }
+
+def _probe(elem, selectors: Tuple[str, ...], stats: Optional[ParseStats]) -> Iterator[Any]:
+    """依次尝试选择器，逐个产出匹配到的元素"""
+    for selector in selectors:
+        found = elem.select_one(selector)
+        if stats is not None:
+            stats.count(selector, found is not None)
+        if found is not None:
+            yield found
+
+def _absolute_url(url: str) -> str:
+    if url.startswith('//'):
+        return 'https:' + url
+    if url and not url.startswith('http'):
+        return 'https://www.goofish.com' + url
+    return url
+
+def _image_urls(imgs) -> List[str]:
+    """图片地址，懒加载的图片地址在 data-src 中"""
+    images = []
+    for img in imgs:
+        src = img.get('data-src') or img.get('src') or ''
+        if src.startswith('//'):
+            src = 'https:' + src
+        if src.startswith('http') and src not in images:
+            images.append(src)
+    return images
+
+def make_soup(html: str, features: str = "html.parser"):
+    """构建BeautifulSoup文档，BeautifulSoup导入较慢，首次解析时才导入"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, features)
+
+def parse_card(item, stats: Optional[ParseStats] = None) -> Tuple[Listing, Optional[float]]:
+    """
+    解析一张商品卡片
+    
+    Args:
+        item: 商品卡片元素
+        stats: 选择器探测计数
+        
+    Returns:
+        (商品, 卖家信用)，标题为空或价格为0的商品也会返回，由调用方过滤
+    """
+    title = ""
+    title_elem = None
+    for title_elem in _probe(item, _TITLE_SELECTORS, stats):
+        title = title_elem.get_text(strip=True) or title_elem.get('title', '')
+        if title:
+            break
+            
+    price = 0.0
+    for price_elem in _probe(item, _PRICE_SELECTORS, stats):
+        price = parse_price(price_elem.get_text(strip=True)) or 0.0
+        if price:
+            break
+            
+    seller_name = UNKNOWN_SELLER
+    seller_attrs = dict(item.attrs)
+    for seller_elem in _probe(item, _SELLER_SELECTORS, stats):
+        seller_attrs.update(seller_elem.attrs)
+        seller_name = seller_elem.get_text(strip=True)
+        if seller_name:
+            break
+            
+    images = []
+    for selector in _CARD_IMAGE_SELECTORS:
+        images = _image_urls(item.select(selector))
+        if stats is not None:
+            stats.count(selector, bool(images))
+        if images:
+            break
+    
+    # 卖家信用（页面上不一定有）
+    credit = None
+    for credit_elem in _probe(item, _CREDIT_SELECTORS, stats):
+        credit = parse_credit(credit_elem.get_text(strip=True))
+        if credit is not None:
+            break
+            
+    # 商品链接：卡片本身、标题或卡片中的第一个链接
+    url = ""
+    if item.name == 'a':
+        url = item.get('href', '')
+    elif title_elem is not None and title_elem.name == 'a':
+        url = title_elem.get('href', '')
+    else:
+        link_elem = item.select_one('a')
+        if link_elem:
+            url = link_elem.get('href', '')
+    url = _absolute_url(url)
+    
+    # 从链接和卡片中取真实的商品ID和卖家ID，取不到时用内容哈希
+    item_id = item_identity(url, title, seller_name, item.attrs)
+    links = [a.get('href', '') for a in item.select('a[href]')]
+    seller_id = seller_identity(links, seller_name, item_id, seller_attrs)
+    
+    if stats is not None:
+        stats.cards += 1
+    product = Listing(
+        id=item_id,
+        title=title,
+        price=price,
+        seller_name=seller_name,
+        seller_id=seller_id,
+        location="未知",
+        description=title,
+        url=url,
+        images=images
+    )
+    return product, credit
+
+def parse_search_soup(soup, limit: int = SEARCH_CARD_LIMIT, stats: Optional[ParseStats] = None) -> SearchPage:
+    """
+    从已构建的文档中解析搜索结果
+    
+    返回页面上所有有价格的商品，价格上限由调用方过滤，价格统计需要完整的价格分布。
+    
+    Args:
+        soup: 搜索结果页文档
+        limit: 最多解析的商品卡片数
+        stats: 选择器探测计数
+        
+    Returns:
+        解析结果，页面上没有商品列表时 selector 为None
+    """
+    items = []
+    selector = None
+    for candidate in SEARCH_CARD_SELECTORS:
+        items = soup.select(candidate)
+        if stats is not None:
+            stats.count(candidate, bool(items))
+        if items:
+            selector = candidate
+            break
+            
+    page = SearchPage(selector)
+    for item in items[:limit]:
+        try:
+            product, credit = parse_card(item, stats)
+        except Exception as e:
+            page.failed += 1
+            logger.warning(f"解析商品信息失败: {e}")
+            continue
+        # 只添加有效的商品信息
+        if product.title and product.price > 0:
+            page.products.append(product)
+            if credit is not None:
+                page.credits[product.seller_id] = credit
+    return page
+
+def parse_search_page(html: str, limit: int = SEARCH_CARD_LIMIT,
+                      features: str = "html.parser", stats: Optional[ParseStats] = None) -> SearchPage:
+    """
+    解析搜索结果页
+    
+    Args:
+        html: 页面HTML
+        limit: 最多解析的商品卡片数
+        features: BeautifulSoup使用的HTML解析器
+        stats: 选择器探测计数
+        
+    Returns:
+        解析结果
+    """
+    return parse_search_soup(make_soup(html, features), limit, stats)
+
+def parse_condition(text: str) -> str:
+    """从文本中找出成色说法，优先使用 "成色：xx" 标注"""
+    label = _CONDITION_LABEL.search(text)
+    if label:
+        match = _CONDITION.search(label.group(1))
+        if match:
+            return match.group(1)
+    match = _CONDITION.search(text)
+    return match.group(1) if match else ""
+
+def parse_detail(html: str, features: str = "html.parser", stats: Optional[ParseStats] = None) -> ListingDetail:
+    """
+    解析商品详情页
+    
+    Args:
+        html: 详情页HTML
+        features: BeautifulSoup使用的HTML解析器
+        stats: 选择器探测计数
+        
+    Returns:
+        详情，找不到的字段为空
+    """
+    soup = make_soup(html, features)
+    
+    description = ""
+    for elem in _probe(soup, _DESCRIPTION_SELECTORS, stats):
+        description = elem.get_text(" ", strip=True)
+        if description:
+            break
+    if not description:
+        meta = soup.select_one('meta[name="description"]')
+        description = (meta.get("content") or "").strip() if meta else ""
+        
+    location = ""
+    for elem in _probe(soup, _LOCATION_SELECTORS, stats):
+        location = elem.get_text(strip=True)
+        if location:
+            break
+            
+    images = []
+    for selector in _IMAGE_SELECTORS:
+        images = _image_urls(soup.select(selector))
+        if stats is not None:
+            stats.count(selector, bool(images))
+        if images:
+            break
+            
+    return ListingDetail(description[:2000], location[:50], parse_condition(description), images)
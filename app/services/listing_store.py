@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from loguru import logger
+from app.models.listing import Listing
+from app.services.dedup import normalize_title
+from config.settings import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    item_key TEXT PRIMARY KEY,
+    item_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    price REAL NOT NULL,
+    seller_id TEXT NOT NULL,
+    seller_name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    description TEXT NOT NULL,
+    images TEXT NOT NULL,
+    url TEXT NOT NULL,
+    condition TEXT NOT NULL DEFAULT '',
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    times_seen INTEGER NOT NULL DEFAULT 1
+);
+-- item_key 就是商品ID，主键已能按ID查询
+DROP INDEX IF EXISTS idx_listings_item_id;
+CREATE INDEX IF NOT EXISTS idx_listings_seller ON listings(seller_id, last_seen);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings(price);
+
+CREATE TABLE IF NOT EXISTS listing_queries (
+    query TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (query, item_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_listing_queries_recent ON listing_queries(query, last_seen);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    item_key TEXT NOT NULL,
+    price REAL NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_item ON price_history(item_key, seen_at);
+
+-- 新商品和价格变化时记录价格历史
+CREATE TRIGGER IF NOT EXISTS trg_listing_insert AFTER INSERT ON listings BEGIN
+    INSERT INTO price_history(item_key, price, seen_at) VALUES (new.item_key, new.price, new.last_seen);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_listing_price AFTER UPDATE OF price ON listings
+WHEN old.price != new.price BEGIN
+    INSERT INTO price_history(item_key, price, seen_at) VALUES (new.item_key, new.price, new.last_seen);
+END;
+"""
+
+_UPSERT_LISTING = """
+INSERT INTO listings(item_key, item_id, title, price, seller_id, seller_name, location, description,
+                     images, url, condition, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(item_key) DO UPDATE SET
+    item_id = excluded.item_id, title = excluded.title, price = excluded.price,
+    seller_id = excluded.seller_id, seller_name = excluded.seller_name, location = excluded.location,
+    description = excluded.description, images = excluded.images, url = excluded.url,
+    condition = CASE WHEN excluded.condition != '' THEN excluded.condition ELSE condition END,
+    last_seen = MAX(last_seen, excluded.last_seen), times_seen = times_seen + 1
+"""
+
+_UPSERT_QUERY = """
+INSERT INTO listing_queries(query, item_key, last_seen) VALUES (?, ?, ?)
+ON CONFLICT(query, item_key) DO UPDATE SET last_seen = MAX(last_seen, excluded.last_seen)
+"""
+
+_COLUMNS = "item_id, title, price, seller_id, seller_name, location, description, images, url, condition"
+
+def _row_to_product(row: Tuple) -> Listing:
+    item_id, title, price, seller_id, seller_name, location, description, images, url, condition = row[:10]
+    return Listing(
+        id=item_id, title=title, price=price, seller_id=seller_id, seller_name=seller_name,
+        location=location, description=description, images=json.loads(images), url=url, condition=condition
+    )
+
+class ListingStore:
+    """本地商品库
+    
+    用SQLite保存抓取到的每个商品及首次/最近出现时间和价格历史。
+    抓取结果先放进内存缓冲，由后台任务按批在线程中写入，不阻塞事件循环；
+    查询同样在线程中执行。
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.LISTING_STORE_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._pending: List[Tuple[str, Listing, float]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            # 旧版本的数据库没有成色列
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(listings)")}
+            if "condition" not in columns:
+                conn.execute("ALTER TABLE listings ADD COLUMN condition TEXT NOT NULL DEFAULT ''")
+            self._conn = conn
+        return self._conn
+        
+    def record(self, query: str, products: List[Listing]):
+        """
+        登记一批抓取到的商品，稍后批量写入
+        
+        Args:
+            query: 搜索关键词
+            products: 抓取到的商品
+        """
+        if not settings.LISTING_STORE_ENABLED or not products:
+            return
+        now = time.time()
+        key = normalize_title(query)
+        self._pending.extend((key, product, now) for product in products)
+        
+        # 写入跟不上时丢弃最旧的记录，不让缓冲无限增长
+        overflow = len(self._pending) - settings.LISTING_STORE_MAX_PENDING
+        if overflow > 0:
+            del self._pending[:overflow]
+            self.dropped += overflow
+        if self._wakeup and len(self._pending) >= settings.LISTING_STORE_BATCH_SIZE:
+            self._wakeup.set()
+            
+    def _write(self, batch: List[Tuple[str, Listing, float]]):
+        """在一个事务中批量写入商品、查询关系和价格历史"""
+        listings = []
+        queries = []
+        for query, product, seen_at in batch:
+            item_key = product.id
+            listings.append((
+                item_key, product.id, product.title, product.price, product.seller_id, product.seller_name,
+                product.location, product.description, json.dumps(product.images, ensure_ascii=False),
+                product.url, product.condition, seen_at, seen_at
+            ))
+            if query:
+                queries.append((query, item_key, seen_at))
+                
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(_UPSERT_LISTING, listings)
+                conn.executemany(_UPSERT_QUERY, queries)
+        self.written += len(batch)
+        
+    async def flush(self):
+        """把缓冲中的商品全部写入"""
+        while self._pending:
+            batch = self._pending[:settings.LISTING_STORE_BATCH_SIZE]
+            del self._pending[:len(batch)]
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.error(f"写入商品库失败，丢弃 {len(batch)} 条记录: {e}")
+                self.dropped += len(batch)
+                
+    def start(self):
+        """启动后台批量写入"""
+        if not settings.LISTING_STORE_ENABLED or (self._task and not self._task.done()):
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.LISTING_STORE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            
+    async def stop(self):
+        """停止后台写入，写完剩余的缓冲后关闭数据库"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+            
+    async def search(self, query: str, max_price: float, max_age: Optional[float] = None,
+                     limit: int = 200) -> List[Listing]:
+        """
+        查询某个关键词下保存过的商品
+        
+        Args:
+            query: 搜索关键词
+            max_price: 最高价格
+            max_age: 只返回该时间(秒)内出现过的商品
+            limit: 最多返回数量
+            
+        Returns:
+            商品列表，最近出现的在前
+        """
+        if not settings.LISTING_STORE_ENABLED:
+            return []
+        since = time.time() - max_age if max_age else 0
+        rows = await asyncio.to_thread(self._query, f"""
+            SELECT {_COLUMNS} FROM listing_queries q JOIN listings l ON l.item_key = q.item_key
+            WHERE q.query = ? AND q.last_seen >= ? AND l.price <= ?
+            ORDER BY q.last_seen DESC LIMIT ?
+        """, (normalize_title(query), since, max_price, limit))
+        return [_row_to_product(row) for row in rows]
+        
+    async def seller_listings(self, seller_id: str, limit: int = 100) -> List[Listing]:
+        """卖家的全部已知商品，最近出现的在前"""
+        rows = await asyncio.to_thread(self._query, f"""
+            SELECT {_COLUMNS} FROM listings WHERE seller_id = ? ORDER BY last_seen DESC LIMIT ?
+        """, (seller_id, limit))
+        return [_row_to_product(row) for row in rows]
+        
+    async def get_listing(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """
+        按商品ID查询商品及其价格历史
+        
+        Args:
+            item_id: 商品ID
+            
+        Returns:
+            商品信息、首次/最近出现时间和价格历史，不存在时返回None
+        """
+        def load():
+            with self._db_lock:
+                conn = self._connect()
+                row = conn.execute(f"""
+                    SELECT {_COLUMNS}, item_key, first_seen, last_seen, times_seen
+                    FROM listings WHERE item_key = ?
+                """, (item_id,)).fetchone()
+                if row is None:
+                    return None
+                history = conn.execute(
+                    "SELECT price, seen_at FROM price_history WHERE item_key = ? ORDER BY seen_at", (row[10],)
+                ).fetchall()
+                return row, history
+                
+        found = await asyncio.to_thread(load)
+        if found is None:
+            return None
+        row, history = found
+        return {
+            "product": _row_to_product(row).to_dict(),
+            "first_seen": row[11],
+            "last_seen": row[12],
+            "times_seen": row[13],
+            "price_history": [{"price": price, "seen_at": seen_at} for price, seen_at in history]
+        }
+        
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.LISTING_STORE_ENABLED,
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped
+        }
+
+# 全局商品库实例
+listing_store = ListingStore()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, Any, List, Optional
+from loguru import logger
+from config.settings import settings
+
+# 夹具种类：搜索结果页和商品详情页
+PAGE_KINDS = ("search", "detail")
+
+_UNSAFE = re.compile(r"[^\w\-]+")
+
+class PageFixture:
+    """一个录制的页面"""
+    
+    __slots__ = ("name", "kind", "path", "meta")
+    
+    def __init__(self, name: str, kind: str, path: str, meta: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.path = path  # HTML文件，.html 或 .html.gz
+        self.meta = meta
+        
+    def read(self) -> str:
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", encoding="utf-8") as f:
+            return f.read()
+            
+    @property
+    def expected_path(self) -> str:
+        """回放时对比的解析结果"""
+        return os.path.join(os.path.dirname(self.path), self.name + ".expected.json")
+
+class PageRecorder:
+    """抓取页面录制
+    
+    设置 PAGE_RECORD_DIR 后，搜索结果页和详情页的原始HTML按种类保存到该目录，
+    连同查询、链接等元数据，作为离线回放和解析器基准的夹具。不设置时不做任何事情。
+    """
+    
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory if directory is not None else settings.PAGE_RECORD_DIR
+        self.recorded = 0
+        
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.recorded < settings.PAGE_RECORD_MAX_PAGES
+        
+    def record(self, kind: str, html: str, **meta: Any) -> Optional[str]:
+        """
+        保存一个页面（同步写文件）
+        
+        Args:
+            kind: 页面种类，search 或 detail
+            html: 页面HTML
+            **meta: 回放时需要的参数，如 query、max_price、url、item_id
+            
+        Returns:
+            夹具名称，未开启录制时返回None
+        """
+        if not self.enabled:
+            return None
+        digest = hashlib.sha1(html.encode("utf-8")).hexdigest()[:10]
+        label = _UNSAFE.sub("_", str(meta.get("query") or meta.get("item_id") or ""))[:40]
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{label}_{digest}"
+        directory = os.path.join(self.directory, kind)
+        os.makedirs(directory, exist_ok=True)
+        with gzip.open(os.path.join(directory, name + ".html.gz"), "wt", encoding="utf-8") as f:
+            f.write(html)
+        # 元数据最后写入，存在即表示夹具完整
+        meta = dict(meta, kind=kind, recorded_at=time.time(), size=len(html))
+        with open(os.path.join(directory, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self.recorded += 1
+        return name
+        
+    async def record_async(self, kind: str, html: str, **meta: Any) -> Optional[str]:
+        """在线程中保存页面，录制失败不影响抓取"""
+        if not self.enabled:
+            return None
+        try:
+            return await asyncio.to_thread(self.record, kind, html, **meta)
+        except OSError as e:
+            logger.warning(f"录制页面失败: {e}")
+            return None
+
+def load_fixtures(directory: str, kind: Optional[str] = None) -> List[PageFixture]:
+    """
+    读取目录中录制的页面
+    
+    Args:
+        directory: 夹具目录，下面按种类分子目录
+        kind: 只读取某一种页面，默认全部
+        
+    Returns:
+        按种类和名称排序的夹具，缺少元数据的页面跳过
+    """
+    fixtures = []
+    for page_kind in PAGE_KINDS:
+        if kind is not None and page_kind != kind:
+            continue
+        sub_dir = os.path.join(directory, page_kind)
+        if not os.path.isdir(sub_dir):
+            continue
+        for filename in sorted(os.listdir(sub_dir)):
+            if filename.endswith(".html.gz"):
+                name = filename[:-len(".html.gz")]
+            elif filename.endswith(".html"):
+                name = filename[:-len(".html")]
+            else:
+                continue
+            meta_path = os.path.join(sub_dir, name + ".json")
+            if not os.path.exists(meta_path):
+                continue
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            fixtures.append(PageFixture(name, page_kind, os.path.join(sub_dir, filename), meta))
+    return fixtures
+
+# 全局页面录制实例
+page_recorder = PageRecorder()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+from typing import List, Optional, NamedTuple
+
+# 阿拉伯数字金额，可带千分位、小数和 万/千/k 后缀，如 1,299 / 2.5k / 1万2
+_ARABIC = r"\d+(?:,\d{3})*(?:\.\d+)?(?:\s*(?:万|千|[kKwW])\d?)?"
+# 中文数字金额，如 八百五 / 两千三 / 一万二
+_CHINESE = r"[零〇一二两三四五六七八九十][零〇一二两三四五六七八九十百千万]*"
+_AMOUNT = rf"(?:{_ARABIC}|{_CHINESE})"
+
+_PRICE = re.compile(
+    rf"(?P<currency>[¥￥]|rmb|RMB)?\s*(?P<low>{_AMOUNT})"
+    rf"(?:\s*(?:-|~|～|到|至)\s*(?P<high>{_AMOUNT}))?"
+    rf"\s*(?P<unit>元|块钱|块|rmb|RMB)?"
+)
+
+# 紧跟在数字后面时表示容量、型号、时长等而不是价格
+_NOT_PRICE_SUFFIX = re.compile(
+    r"\s*(?:[gG][bB]?|[tT][bB]?|[mM][bB]|寸|英寸|mm|cm|mAh|mah|Hz|hz|%|年|个月|月|天|日|号|次|岁|代|核|"
+    r"[pP](?:ro|lus)?|公斤|kg|斤|km|公里|人|台|件|个|张|轮|小时|分钟|点|成新|新|折|手|楼|米|周|期)"
+)
+
+# 价格前常见的说法，有这些词时数字更可能是报价
+_PRICE_CONTEXT = re.compile(r"(?:价|出|卖|最低|最少|给你|包邮|到手|一口价|收|要|就|算|现在|只要|可以)\s*$")
+
+# 原价、入手价等历史价格，不是当前报价
+_FORMER_CONTEXT = re.compile(r"(?:原价|原来|入手|买的时候|官网|官方|新机|之前)\S{0,2}$")
+
+# 折扣：9折 / 95折 / 8.5折 / 九五折
+_DISCOUNT = re.compile(r"(?P<rate>\d{1,2}(?:\.\d)?|[一二三四五六七八九]{1,2})\s*折")
+
+# 相对降价：便宜100 / 少50块 / 减两百 / 优惠一百
+_REDUCTION = re.compile(rf"(?:便宜|(?<![最至])少|减|优惠|让)了?\s*(?P<amount>{_AMOUNT})\s*(?:元|块钱|块)?")
+
+_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_UNITS = {"十": 10, "百": 100, "千": 1000}
+_SUFFIX_MULTIPLIERS = {"万": 10000, "w": 10000, "W": 10000, "千": 1000, "k": 1000, "K": 1000}
+
+class PriceMatch(NamedTuple):
+    """文本中的一处价格"""
+    low: float
+    high: float
+    confidence: int  # 3: 带货币符号或单位，2: 带报价用语，1: 裸数字，0: 原价等历史价格
+    start: int
+
+def chinese_to_number(text: str) -> Optional[float]:
+    """
+    中文数字转数值，支持口语省略末位单位的写法（八百五=850，两千三=2300，一万二=12000）
+    
+    Args:
+        text: 中文数字
+        
+    Returns:
+        数值，无法解析时返回None
+    """
+    total = 0
+    section = 0
+    number = None
+    last_unit = 1
+    for char in text:
+        if char in _DIGITS:
+            number = _DIGITS[char]
+        elif char in _UNITS:
+            unit = _UNITS[char]
+            section += (number if number is not None else 1) * unit
+            number = None
+            last_unit = unit
+        elif char == "万":
+            total += (section + (number or 0)) * 10000
+            section = 0
+            number = None
+            last_unit = 10000
+        else:
+            return None
+    if number is not None:
+        # 末位数字紧跟在单位后面时，表示下一级单位
+        section += number * (last_unit // 10 if last_unit >= 100 else 1)
+    value = total + section
+    return float(value) if value > 0 else None
+
+def parse_amount(text: str) -> Optional[float]:
+    """解析一个金额（阿拉伯或中文数字，可带 万/千/k 后缀）"""
+    text = text.strip()
+    if not text:
+        return None
+    if not text[0].isdigit():
+        return chinese_to_number(text)
+        
+    number = ""
+    index = 0
+    while index < len(text) and (text[index].isdigit() or text[index] in ".,"):
+        number += text[index]
+        index += 1
+    try:
+        value = float(number.replace(",", ""))
+    except ValueError:
+        return None
+        
+    rest = text[index:].strip()
+    if rest and rest[0] in _SUFFIX_MULTIPLIERS:
+        multiplier = _SUFFIX_MULTIPLIERS[rest[0]]
+        value *= multiplier
+        # 1万2 = 12000，2k5 = 2500
+        if rest[1:].isdigit():
+            value += int(rest[1:]) * multiplier // 10
+    return value
+
+def _discount_rate(text: str) -> Optional[float]:
+    if text[0].isdigit():
+        value = float(text)
+        return value / 10 if value < 10 else value / 100
+    digits = [_DIGITS[c] for c in text]
+    return digits[0] / 10 if len(digits) == 1 else (digits[0] * 10 + digits[1]) / 100
+
+def extract_prices(text: str) -> List[PriceMatch]:
+    """
+    找出文本中所有可能的价格
+    
+    容量、型号、时长等数字（128G、A7M4、3年）会被排除。
+    
+    Args:
+        text: 商品价格文本或卖家回复
+        
+    Returns:
+        价格列表，按出现顺序
+    """
+    matches = []
+    for match in _PRICE.finditer(text):
+        low = parse_amount(match.group("low"))
+        if low is None or low <= 0:
+            continue
+        high = parse_amount(match.group("high")) if match.group("high") else low
+        
+        start = match.start("low")
+        end = match.end()
+        has_marker = bool(match.group("currency") or match.group("unit"))
+        if not has_marker:
+            # 单个中文数字（一、两）多半不是金额
+            if not match.group("low")[0].isdigit() and not any(u in match.group("low") for u in "十百千万"):
+                continue
+            # 与字母相连的数字是型号（A7M4、Mate60、RTX3060）
+            if start > 0 and text[start - 1].isascii() and text[start - 1].isalpha():
+                continue
+            if _NOT_PRICE_SUFFIX.match(text, end):
+                continue
+                
+        if _FORMER_CONTEXT.search(text, max(0, start - 6), start):
+            confidence = 0
+        elif has_marker:
+            confidence = 3
+        elif _PRICE_CONTEXT.search(text, max(0, start - 6), start):
+            confidence = 2
+        else:
+            confidence = 1
+        matches.append(PriceMatch(low, max(low, high or low), confidence, match.start()))
+    return matches
+
+def parse_price(text: str) -> Optional[float]:
+    """
+    解析商品价格文本，如 "¥1,299"、"1.2万"、"800-1000元"
+    
+    Args:
+        text: 价格文本
+        
+    Returns:
+        价格，区间取下限；没有价格时返回None
+    """
+    matches = extract_prices(text)
+    if not matches:
+        return None
+    return max(matches, key=lambda m: (m.confidence, -m.start)).low
+
+def extract_offer(response: str, current_price: float) -> Optional[float]:
+    """
+    从卖家回复中提取报价
+    
+    依次尝试：明确的价格（区间取上限，偏保守）、折扣（9折）、相对降价（便宜100）。
+    与当前价格相差过大的裸数字不视为报价。
+    
+    Args:
+        response: 卖家回复
+        current_price: 当前价格
+        
+    Returns:
+        卖家给出的价格，回复中没有价格信息时返回None
+    """
+    # "便宜100块"里的数字是降价幅度而不是报价
+    reductions = [m.span() for m in _REDUCTION.finditer(response)]
+    
+    candidates = []
+    for match in extract_prices(response):
+        if match.confidence == 0 or any(start <= match.start < end for start, end in reductions):
+            continue
+        # 裸数字只在当前价格附近才可能是报价
+        lower_bound = current_price * (0.05 if match.confidence > 1 else 0.3)
+        if lower_bound <= match.high < current_price * 2:
+            candidates.append(match)
+    if candidates:
+        # 可信度最高的，相同时取最后提到的
+        return max(candidates, key=lambda m: (m.confidence, m.start)).high
+        
+    discount = _DISCOUNT.search(response)
+    if discount:
+        rate = _discount_rate(discount.group("rate"))
+        if 0 < rate < 1:
+            return round(current_price * rate, 2)
+            
+    reduction = _REDUCTION.search(response)
+    if reduction:
+        amount = parse_amount(reduction.group("amount"))
+        if amount and amount < current_price:
+            return current_price - amount
+            
+    return None
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from loguru import logger
+from app.models.listing import Listing
+from app.services.dedup import normalize_title
+from config.settings import settings
+
+# 目标价不低于中位数的该比例，避免配件等低价商品把目标拉得过低
+TARGET_FLOOR_RATIO = 0.6
+
+# 商品本身已低于市场目标价时，仍争取的最小降幅
+MIN_DISCOUNT = 0.05
+
+# 每个统计项记住最近见过的商品，重复抓取的同一商品只计一次
+SEEN_LISTINGS = 500
+
+class P2Quantile:
+    """P²流式分位数估计（Jain & Chlamtac）
+    
+    只保存5个标记点的高度和位置，每次更新O(1)，不保存样本。
+    """
+    
+    def __init__(self, p: float):
+        self.p = p
+        self.heights: List[float] = []
+        self.positions = [0.0, 1.0, 2.0, 3.0, 4.0]
+        self.desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+        
+    def add(self, x: float):
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+            
+        # 找到x所在的区间，必要时更新两端的极值
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+                
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+            
+        # 中间三个标记偏离期望位置时，按抛物线（失败时按线性）调整高度
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+                
+    def value(self) -> Optional[float]:
+        q = self.heights
+        if not q:
+            return None
+        if len(q) < 5:
+            return q[min(int(self.p * len(q)), len(q) - 1)]
+        return q[2]
+        
+    def to_dict(self) -> Dict[str, Any]:
+        # 复制一份，保存在线程中进行时事件循环还会继续更新标记点
+        return {"p": self.p, "heights": list(self.heights), "positions": list(self.positions),
+                "desired": list(self.desired)}
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "P2Quantile":
+        estimator = cls(data["p"])
+        estimator.heights = list(data["heights"])
+        estimator.positions = list(data["positions"])
+        estimator.desired = list(data["desired"])
+        return estimator
+
+class PriceStats:
+    """一个查询的价格统计：数量、均值、极值和四分位数"""
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.quartiles = [P2Quantile(0.25), P2Quantile(0.5), P2Quantile(0.75)]
+        self.updated_at = time.time()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        
+    def add(self, price: float, key: Optional[str] = None) -> bool:
+        """
+        加入一个价格
+        
+        Args:
+            price: 商品价格
+            key: 商品去重键，最近见过的商品不重复计入
+            
+        Returns:
+            是否计入统计
+        """
+        if price <= 0:
+            return False
+        if key is not None:
+            if key in self._seen:
+                return False
+            self._seen[key] = None
+            if len(self._seen) > SEEN_LISTINGS:
+                self._seen.popitem(last=False)
+                
+        self.count += 1
+        self.mean += (price - self.mean) / self.count
+        self.min = price if self.min is None else min(self.min, price)
+        self.max = price if self.max is None else max(self.max, price)
+        for estimator in self.quartiles:
+            estimator.add(price)
+        self.updated_at = time.time()
+        return True
+        
+    @property
+    def q1(self) -> Optional[float]:
+        return self.quartiles[0].value()
+        
+    @property
+    def median(self) -> Optional[float]:
+        return self.quartiles[1].value()
+        
+    @property
+    def q3(self) -> Optional[float]:
+        return self.quartiles[2].value()
+        
+    def summary(self) -> Dict[str, Any]:
+        q1, median, q3 = self.q1, self.median, self.q3
+        return {
+            "count": self.count,
+            "mean": round(self.mean, 2),
+            "min": self.min,
+            "max": self.max,
+            "q1": round(q1, 2) if q1 is not None else None,
+            "median": round(median, 2) if median is not None else None,
+            "q3": round(q3, 2) if q3 is not None else None,
+            "iqr": round(q3 - q1, 2) if q1 is not None and q3 is not None else None,
+            "updated_at": self.updated_at
+        }
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "quartiles": [estimator.to_dict() for estimator in self.quartiles],
+            "updated_at": self.updated_at,
+            "seen": list(self._seen)
+        }
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PriceStats":
+        stats = cls()
+        stats.count = data.get("count", 0)
+        stats.mean = data.get("mean", 0.0)
+        stats.min = data.get("min")
+        stats.max = data.get("max")
+        stats.quartiles = [P2Quantile.from_dict(q) for q in data["quartiles"]]
+        stats.updated_at = data.get("updated_at", stats.updated_at)
+        stats._seen = OrderedDict.fromkeys(data.get("seen", [])[-SEEN_LISTINGS:])
+        return stats
+
+def market_key(query: str) -> str:
+    """统计项的键：归一化后的查询词"""
+    return normalize_title(query)
+
+class PriceIndex:
+    """市场价格统计索引
+    
+    每个归一化查询维护一份流式四分位数统计，每抓取到一批商品就增量更新，
+    查询目标价只读取已有的估计值，不需要保存或排序样本。统计连同最近见过的商品定期保存到文件，
+    重启后继续累积，重复抓取的商品也不会重复计入。
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.PRICE_STATS_FILE
+        self._stats: "OrderedDict[str, PriceStats]" = OrderedDict()
+        self._dirty = False
+        self._saved_at = time.time()
+        self._saving: Optional[asyncio.Task] = None
+        
+    def load(self):
+        """从文件加载统计（启动时调用）"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for key, data in json.load(f).items():
+                    self._stats[key] = PriceStats.from_dict(data)
+            logger.info(f"已加载 {len(self._stats)} 个查询的价格统计")
+        except Exception as e:
+            logger.error(f"加载价格统计失败: {e}")
+            
+    def _write(self, snapshot: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        
+    async def save(self):
+        """把有变化的统计写入文件，序列化和写文件在线程中进行"""
+        if not self._dirty:
+            return
+        # 在事件循环上取快照，之后的更新留给下一次保存
+        snapshot = {key: stats.to_dict() for key, stats in self._stats.items()}
+        self._dirty = False
+        self._saved_at = time.time()
+        try:
+            await asyncio.to_thread(self._write, snapshot)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"保存价格统计失败: {e}")
+            
+    async def stop(self):
+        """等待进行中的保存结束，再保存剩余的变化（关闭时调用）"""
+        if self._saving:
+            await self._saving
+            self._saving = None
+        await self.save()
+        
+    def observe(self, query: str, products: List[Listing]) -> int:
+        """
+        用抓取到的商品更新查询的价格统计
+        
+        Args:
+            query: 搜索关键词
+            products: 抓取到的商品
+            
+        Returns:
+            新计入的商品数量
+        """
+        key = market_key(query)
+        if not key or not products:
+            return 0
+            
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = PriceStats()
+            while len(self._stats) > settings.PRICE_STATS_MAX_KEYS:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(key)
+            
+        added = sum(stats.add(product.price, product.id) for product in products)
+        if added:
+            self._dirty = True
+            saving = self._saving is not None and not self._saving.done()
+            if not saving and time.time() - self._saved_at >= settings.PRICE_STATS_SAVE_INTERVAL:
+                self._saving = asyncio.create_task(self.save())
+        return added
+        
+    def get(self, query: str) -> Optional[PriceStats]:
+        return self._stats.get(market_key(query))
+        
+    def market_stats(self, queries: List[str]) -> Optional[PriceStats]:
+        """在多个查询词中取样本最多且足够的统计"""
+        candidates = [stats for stats in (self.get(q) for q in queries if q) if stats is not None]
+        candidates = [stats for stats in candidates if stats.count >= settings.PRICE_STATS_MIN_SAMPLES]
+        return max(candidates, key=lambda s: s.count) if candidates else None
+        
+    def target_price(self, queries: List[str], max_price: float) -> Optional[float]:
+        """
+        市场目标价：下四分位数，不低于中位数的一定比例，不高于用户的最高价
+        
+        Args:
+            queries: 任务的搜索关键词
+            max_price: 用户的最高价格
+            
+        Returns:
+            目标价格，样本不足时返回None
+        """
+        stats = self.market_stats(queries)
+        if stats is None:
+            return None
+        target = max(stats.q1, stats.median * TARGET_FLOOR_RATIO)
+        return round(min(target, max_price), 2) if max_price > 0 else round(target, 2)
+        
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queries": len(self._stats),
+            "samples": sum(stats.count for stats in self._stats.values())
+        }
+
+def listing_target(market_target: float, listing_price: float) -> float:
+    """单个商品的谈判目标：市场目标价，商品已低于目标时仍争取少量降价"""
+    return round(min(market_target, listing_price * (1 - MIN_DISCOUNT)), 2)
+
+# 全局价格统计实例
+price_index = PriceIndex()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from app.models.listing import Listing
+from app.services.dedup import normalize_title
+from config.settings import settings
+
+# 成色词及对应的成色分，按归一化后的写法匹配，同时命中多个时取最高分
+CONDITION_GRADES = {
+    "全新": 1.0, "未拆": 1.0, "未使用": 0.98, "准新": 0.95, "99新": 0.95, "98新": 0.93,
+    "95新": 0.9, "9成新": 0.8, "九成新": 0.8, "无拆无修": 0.8, "成色很好": 0.8, "功能完好": 0.7,
+    "8成新": 0.6, "八成新": 0.6, "7成新": 0.4, "七成新": 0.4, "有划痕": 0.4, "磕碰": 0.35
+}
+
+# 偏离需求的商品（求购、回收、故障机、配件等），命中时扣分；查询本身包含的词不扣
+OFF_TARGET_TERMS = {
+    "求购": 1.0, "收购": 1.0, "回收": 1.0, "出租": 0.8, "租赁": 0.8, "换机": 0.5,
+    "坏了": 0.8, "已坏": 0.8, "故障": 0.8, "不开机": 1.0, "碎屏": 0.7, "维修": 0.6, "拆机": 0.6, "配件机": 0.9,
+    "空盒": 1.0, "包装盒": 0.9, "模型机": 1.0, "手机壳": 0.9, "保护壳": 0.6,
+    "钢化膜": 0.9, "贴膜": 0.8, "充电器": 0.4, "数据线": 0.6
+}
+
+# 未标注成色的商品按中等成色计
+UNKNOWN_CONDITION = 0.5
+
+# 价格敏感度对应的价格权重
+PRICE_WEIGHTS = {"high": 0.45, "medium": 0.3, "low": 0.15}
+
+# 相关性、特征、成色的基础权重，价格权重另按敏感度取
+KEYWORD_WEIGHT = 0.4
+FEATURE_WEIGHT = 0.2
+CONDITION_WEIGHT = 0.2
+OFF_TARGET_PENALTY = 0.6
+
+# 低于相关商品价格中位数该比例的商品可能是配件或虚假低价
+SUSPICIOUS_PRICE_RATIO = 0.3
+
+def _terms(text: str) -> List[str]:
+    """归一化后按空白切分的匹配词"""
+    return [term for term in normalize_title(text).split() if term]
+
+def _as_list(value: Any) -> List[str]:
+    """需求分析的字段可能是字符串也可能是列表"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(item) for item in value if item]
+
+def _product_text(product: Listing) -> str:
+    """参与匹配的商品文本：标题、描述和成色分别归一化，描述常与标题相同"""
+    text = normalize_title(product.title)
+    if product.description and product.description != product.title:
+        text = f"{text} {normalize_title(product.description)}"
+    if product.condition:
+        text = f"{text} {normalize_title(product.condition)}"
+    return text
+
+def normalize_terms(weights: Dict[str, float]) -> Dict[str, float]:
+    """把词归一化为与标题相同的写法，同一写法保留最高权重"""
+    normalized: Dict[str, float] = {}
+    for term, weight in weights.items():
+        key = normalize_title(term)
+        if key:
+            normalized[key] = max(weight, normalized.get(key, 0.0))
+    return normalized
+
+class RankingQuery:
+    """由需求分析编译出的打分条件
+    
+    所有匹配词合并为一张词表，每组条件对应词表上的一个权重矩阵，
+    商品打分时只需计算一次 商品×词 的命中矩阵再做矩阵乘法。
+    """
+    
+    def __init__(self, analysis: Dict[str, Any]):
+        self.analysis = analysis
+        self.vocabulary: List[str] = []
+        self._positions: Dict[str, int] = {}
+        
+        self.keyword_groups = [terms for terms in (_terms(k) for k in _as_list(analysis.get("keywords"))) if terms]
+        self.feature_groups = [terms for terms in (_terms(f) for f in _as_list(analysis.get("features"))) if terms]
+        
+        # 查询本身包含的扣分词（例如就是要买手机壳）不扣分
+        query_text = " ".join(term for group in self.keyword_groups + self.feature_groups for term in group)
+        conditions = normalize_terms(CONDITION_GRADES)
+        off_target = {t: w for t, w in normalize_terms(OFF_TARGET_TERMS).items() if t not in query_text}
+        
+        # 质量要求中提到的成色作为最低可接受成色
+        quality_text = normalize_title(" ".join(_as_list(analysis.get("quality_requirements"))))
+        grades = [grade for term, grade in conditions.items() if term in quality_text]
+        self.min_condition = min(grades) if grades else 0.0
+        
+        sensitivity = str(analysis.get("price_sensitivity", "medium")).lower()
+        self.price_weight = PRICE_WEIGHTS.get(sensitivity, PRICE_WEIGHTS["medium"])
+        
+        keyword_entries = self._group_entries(self.keyword_groups)
+        feature_entries = self._group_entries(self.feature_groups)
+        condition_entries = [(self._position(t), w, 0) for t, w in conditions.items()]
+        off_target_entries = [(self._position(t), w, 0) for t, w in off_target.items()]
+        
+        # 词表确定后再展开为 词表×组 的矩阵
+        self.keyword_matrix = self._dense(keyword_entries, len(self.keyword_groups))
+        self.feature_matrix = self._dense(feature_entries, len(self.feature_groups))
+        self.condition_vector = self._dense(condition_entries, 1)[:, 0]
+        self.off_target_vector = self._dense(off_target_entries, 1)[:, 0]
+        
+    def _position(self, term: str) -> int:
+        if term not in self._positions:
+            self._positions[term] = len(self.vocabulary)
+            self.vocabulary.append(term)
+        return self._positions[term]
+        
+    def _group_entries(self, groups: List[List[str]]) -> List[Tuple[int, float, int]]:
+        # 组内每个词的权重为 1/词数，组得分即命中比例
+        return [(self._position(term), 1.0 / len(group), g) for g, group in enumerate(groups) for term in group]
+        
+    def _dense(self, entries: List[Tuple[int, float, int]], columns: int) -> np.ndarray:
+        matrix = np.zeros((len(self.vocabulary), columns), dtype=np.float32)
+        for position, weight, column in entries:
+            matrix[position, column] += weight
+        return matrix
+
+class RankingEngine:
+    """商品相关性排序引擎
+    
+    按需求分析中的关键词、特征、质量要求和价格敏感度，一次向量化计算整批候选的得分，
+    再用部分排序选出前k个，供谈判挑选对象。
+    """
+    
+    def __init__(self, top_k: Optional[int] = None):
+        self.top_k = top_k or settings.RANKING_TOP_K
+        self._queries: Dict[int, RankingQuery] = {}
+        
+    def compile(self, analysis: Dict[str, Any]) -> RankingQuery:
+        """编译需求分析，同一分析对象只编译一次"""
+        key = id(analysis)
+        query = self._queries.get(key)
+        if query is None or query.analysis is not analysis:
+            query = RankingQuery(analysis)
+            if len(self._queries) >= 256:
+                self._queries.clear()
+            self._queries[key] = query
+        return query
+        
+    def score(self, products: List[Listing], analysis: Dict[str, Any]) -> np.ndarray:
+        """
+        计算商品得分
+        
+        Args:
+            products: 候选商品
+            analysis: 需求分析结果
+            
+        Returns:
+            与商品顺序一致的得分数组，越高越符合需求
+        """
+        if not products:
+            return np.zeros(0, dtype=np.float32)
+            
+        query = self.compile(analysis)
+        texts = np.array([_product_text(p) for p in products])
+        prices = np.array([p.price for p in products], dtype=np.float64)
+        
+        # 商品×词 命中矩阵
+        hits = np.zeros((len(products), len(query.vocabulary)), dtype=np.float32)
+        for position, term in enumerate(query.vocabulary):
+            hits[:, position] = np.char.find(texts, term) >= 0
+            
+        # 关键词：任一搜索关键词的命中比例取最高
+        if query.keyword_groups:
+            keyword_score = (hits @ query.keyword_matrix).max(axis=1)
+        else:
+            keyword_score = np.ones(len(products), dtype=np.float32)
+            
+        # 特征：各特征命中比例的平均
+        if query.feature_groups:
+            feature_score = (hits @ query.feature_matrix).mean(axis=1)
+        else:
+            feature_score = np.zeros(len(products), dtype=np.float32)
+            
+        # 成色：命中成色词中的最高分，未标注按中等计；低于质量要求的扣分
+        condition = (hits * query.condition_vector).max(axis=1)
+        condition = np.where(condition > 0, condition, UNKNOWN_CONDITION)
+        condition_score = np.where(condition >= query.min_condition, condition, condition - 0.5)
+        
+        # 偏离需求：命中的扣分词中取最高
+        off_target = (hits * query.off_target_vector).max(axis=1)
+        
+        # 价格：在相关商品的价格区间内越低越好，明显低于中位数的视为可疑
+        relevant = prices[keyword_score >= 0.5]
+        reference = relevant if len(relevant) else prices
+        low, high = reference.min(), reference.max()
+        price_score = np.clip((high - prices) / (high - low), 0.0, 1.0) if high > low else np.ones_like(prices)
+        suspicious = prices < np.median(reference) * SUSPICIOUS_PRICE_RATIO
+        price_score = np.where(suspicious, 0.0, price_score)
+        
+        return (KEYWORD_WEIGHT * keyword_score
+                + FEATURE_WEIGHT * feature_score
+                + CONDITION_WEIGHT * condition_score
+                + query.price_weight * price_score
+                - OFF_TARGET_PENALTY * off_target).astype(np.float32)
+                
+    def rank(self, products: List[Listing], analysis: Dict[str, Any],
+             top_k: Optional[int] = None) -> List[Listing]:
+        """
+        按得分选出前k个商品
+        
+        Args:
+            products: 候选商品
+            analysis: 需求分析结果
+            top_k: 返回数量，缺省使用配置
+            
+        Returns:
+            得分从高到低的商品，同分时价格低的在前
+        """
+        top_k = top_k or self.top_k
+        if not products:
+            return []
+            
+        scores = self.score(products, analysis)
+        candidates = np.arange(len(products))
+        if len(products) > top_k:
+            # 部分排序只保证前k个是最高分，O(n)
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+            
+        prices = np.array([products[i].price for i in candidates])
+        order = candidates[np.lexsort((prices, -scores[candidates]))]
+        return [products[i] for i in order]
+
+# 全局排序引擎实例
+ranking_engine = RankingEngine()
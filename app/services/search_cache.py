@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple, Optional
+from loguru import logger
+from app.models.listing import Listing
+from app.services.price_stats import price_index
+from app.services.listing_store import listing_store
+from app.services.seller_profiles import seller_profiles
+from app.services.image_pipeline import image_pipeline
+from app.services.identity import listing_key
+from config.settings import settings
+
+class SearchCacheEntry:
+    """一个 (关键词, 价格档位) 的缓存结果"""
+    
+    def __init__(self, products: List[Listing]):
+        self.listings: "OrderedDict[str, Listing]" = OrderedDict()
+        self.fetched_at = time.time()
+        self.merge(products)
+    
+    def merge(self, products: List[Listing]) -> int:
+        """
+        合并新抓取的商品，新商品排在前面，已有商品更新为最新信息
+        
+        Returns:
+            新增的商品数量
+        """
+        fresh: "OrderedDict[str, Listing]" = OrderedDict()
+        added = 0
+        for product in products:
+            key = listing_key(product)
+            if key not in self.listings:
+                added += 1
+            fresh[key] = product
+        
+        for key, product in self.listings.items():
+            if key not in fresh:
+                fresh[key] = product
+        
+        # 只保留最近的商品，避免条目无限增长
+        while len(fresh) > settings.SEARCH_CACHE_MAX_LISTINGS:
+            fresh.popitem(last=True)
+        
+        self.listings = fresh
+        self.fetched_at = time.time()
+        return added
+    
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+class SearchResultCache:
+    """跨任务的搜索结果缓存
+    
+    以 (归一化关键词, 价格上限档位) 为键，过期后只抓取首屏并按商品合并，
+    不再重新完整抓取。
+    """
+    
+    def __init__(self, ttl: Optional[float] = None, price_bucket: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else settings.SEARCH_CACHE_TTL
+        self.price_bucket = price_bucket if price_bucket is not None else settings.SEARCH_CACHE_PRICE_BUCKET
+        self.max_entries = max_entries if max_entries is not None else settings.SEARCH_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[Tuple[str, float], SearchCacheEntry]" = OrderedDict()
+        self._locks: Dict[Tuple[str, float], asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+    
+    def _bucket(self, max_price: float) -> float:
+        """把价格上限向上取整到档位，同一档位内的查询共用缓存"""
+        if self.price_bucket <= 0:
+            return max_price
+        return math.ceil(max_price / self.price_bucket) * self.price_bucket
+    
+    def _key(self, keyword: str, max_price: float) -> Tuple[str, float]:
+        return (" ".join(keyword.lower().split()), self._bucket(max_price))
+    
+    async def search(self, goofish_service, keyword: str, max_price: float) -> List[Listing]:
+        """
+        带缓存的商品搜索
+        
+        Args:
+            goofish_service: 用于实际抓取的咸鱼服务
+            keyword: 搜索关键词
+            max_price: 最高价格
+            
+        Returns:
+            价格不超过max_price的商品列表
+        """
+        key = self._key(keyword, max_price)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        
+        # 同一个键同时只抓取一次，并发的相同查询等待并复用结果
+        async with lock:
+            entry = self._entries.get(key)
+            
+            if entry and entry.is_fresh(self.ttl):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                logger.info(f"搜索缓存命中: {keyword} (≤{key[1]})")
+            
+            elif entry:
+                self.refreshes += 1
+                products = await goofish_service.search_products(keyword, key[1], first_page_only=True)
+                if self._is_cacheable(products):
+                    price_index.observe(keyword, products)
+                    listing_store.record(keyword, products)
+                    seller_profiles.observe(products)
+                    image_pipeline.submit(products)
+                    added = entry.merge(products)
+                    logger.info(f"搜索缓存增量刷新: {keyword}，新增 {added} 个商品")
+                else:
+                    # 刷新失败时沿用旧结果，下次再试
+                    logger.warning(f"搜索缓存刷新失败，沿用旧结果: {keyword}")
+                self._entries.move_to_end(key)
+            
+            else:
+                self.misses += 1
+                products = await goofish_service.search_products(keyword, key[1])
+                if not self._is_cacheable(products):
+                    # 抓取失败时优先使用商品库中近期保存的真实商品
+                    stored = await listing_store.search(keyword, max_price, settings.LISTING_STORE_FALLBACK_AGE)
+                    if stored:
+                        logger.warning(f"抓取失败，使用商品库中保存的 {len(stored)} 个商品: {keyword}")
+                        return stored
+                    return [p for p in products if p.price <= max_price]
+                
+                price_index.observe(keyword, products)
+                listing_store.record(keyword, products)
+                seller_profiles.observe(products)
+                image_pipeline.submit(products)
+                entry = SearchCacheEntry(products)
+                self._entries[key] = entry
+                self._evict()
+        
+        return [p for p in entry.listings.values() if p.price <= max_price]
+    
+    def _is_cacheable(self, products: List[Listing]) -> bool:
+        # 抓取失败时服务会返回模拟数据，模拟数据不进入缓存
+        return bool(products) and not all(p.id.startswith("mock_") for p in products)
+    
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            self._locks.pop(key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中率指标"""
+        lookups = self.hits + self.misses + self.refreshes
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "ttl": self.ttl
+        }
+    
+    def clear(self):
+        self._entries.clear()
+        self._locks.clear()
+
+# 全局搜索缓存实例
+search_cache = SearchResultCache()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+from typing import Dict, List, Tuple, Optional, Callable, Awaitable
+from loguru import logger
+from config.settings import settings
+
+class SellerInbox:
+    """卖家收件箱 - 每个卖家一个异步队列，由单个监听任务统一分发新消息"""
+    
+    def __init__(self, fetch_messages: Callable[[], Awaitable[List[Tuple[str, str]]]],
+                 poll_interval: Optional[float] = None):
+        """
+        Args:
+            fetch_messages: 扫描一次登录会话，返回新到达的 (卖家ID, 消息) 列表
+            poll_interval: 监听任务扫描会话的间隔(秒)
+        """
+        self.fetch_messages = fetch_messages
+        self.poll_interval = poll_interval if poll_interval is not None else settings.INBOX_POLL_INTERVAL
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._waiting = 0
+        self._watcher: Optional[asyncio.Task] = None
+    
+    def _queue(self, seller_id: str) -> asyncio.Queue:
+        if seller_id not in self._queues:
+            self._queues[seller_id] = asyncio.Queue()
+        return self._queues[seller_id]
+    
+    def deliver(self, seller_id: str, message: str):
+        """把一条新消息投递到卖家队列，唤醒正在等待的Agent"""
+        self._queue(seller_id).put_nowait(message)
+    
+    def discard(self, seller_id: str):
+        """丢弃卖家队列中尚未读取的消息"""
+        queue = self._queues.get(seller_id)
+        while queue is not None and not queue.empty():
+            queue.get_nowait()
+    
+    async def wait_for_reply(self, seller_id: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        等待卖家回复
+        
+        Args:
+            seller_id: 卖家ID
+            timeout: 最长等待时间(秒)，默认使用 SELLER_REPLY_TIMEOUT
+            
+        Returns:
+            卖家回复内容，超时返回None
+        """
+        timeout = timeout if timeout is not None else settings.SELLER_REPLY_TIMEOUT
+        queue = self._queue(seller_id)
+        
+        if not queue.empty():
+            return queue.get_nowait()
+        
+        self._waiting += 1
+        self._ensure_watcher()
+        try:
+            return await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.info(f"卖家 {seller_id} 在 {timeout} 秒内未回复")
+            return None
+        finally:
+            self._waiting -= 1
+    
+    def _ensure_watcher(self):
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+    
+    async def _watch(self):
+        """监听任务：只要还有Agent在等待回复，就持续扫描会话并分发新消息"""
+        while self._waiting > 0:
+            try:
+                for seller_id, message in await self.fetch_messages():
+                    self.deliver(seller_id, message)
+            except Exception as e:
+                logger.warning(f"扫描卖家消息失败: {e}")
+            
+            await asyncio.sleep(self.poll_interval)
+    
+    def close(self):
+        """停止监听任务"""
+        if self._watcher and not self._watcher.done():
+            self._watcher.cancel()
+        self._watcher = None
+        self._queues.clear()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from app.models.listing import Listing
+from config.settings import settings
+
+# 回复延迟的指数移动平均系数
+LATENCY_ALPHA = 0.3
+
+# 没有历史记录时的先验：回复率按 1/2 平滑，延迟取回复超时的一半
+PRIOR_REPLIES = 1
+PRIOR_CONTACTS = 2
+
+# 信用未知时的默认值（0~1）
+DEFAULT_CREDIT = 0.5
+
+# 页面上的信用等级文字
+_CREDIT_LEVELS = {"极好": 1.0, "优秀": 0.9, "很好": 0.8, "良好": 0.7, "中等": 0.5, "一般": 0.5, "较差": 0.3, "差": 0.2}
+_CREDIT_SCORE = re.compile(r"\d{3}")
+
+def parse_credit(text: str) -> Optional[float]:
+    """
+    把页面上的卖家信用转换为0~1的分数
+    
+    Args:
+        text: 信用文字，如 "信用极好"、"芝麻信用750"
+        
+    Returns:
+        信用分数，无法识别时返回None
+    """
+    for level, score in _CREDIT_LEVELS.items():
+        if level in text:
+            return score
+    match = _CREDIT_SCORE.search(text)
+    if match:
+        # 芝麻信用分范围 350~950
+        return min(max((int(match.group()) - 350) / 600, 0.0), 1.0)
+    return None
+
+class SellerProfile:
+    """卖家画像：信用、历史回复情况和已知的最低报价"""
+    
+    def __init__(self, seller_id: str):
+        self.seller_id = seller_id
+        self.seller_name = ""
+        self.credit: Optional[float] = None
+        self.listings_seen = 0
+        self.contacts = 0
+        self.replies = 0
+        self.latency: Optional[float] = None
+        self.floors: Dict[str, float] = {}  # 商品ID -> 卖家对该商品给出的最低报价
+        self.seen_at = time.time()
+        self.outcome_at: Optional[float] = None
+        
+    def expire_outcomes(self, now: float, ttl: float):
+        """谈判记录过期后清空，卖家的回复习惯可能已经改变"""
+        if self.outcome_at is not None and now - self.outcome_at >= ttl:
+            self.contacts = 0
+            self.replies = 0
+            self.latency = None
+            self.floors = {}
+            self.outcome_at = None
+            
+    @property
+    def reply_rate(self) -> float:
+        return (self.replies + PRIOR_REPLIES) / (self.contacts + PRIOR_CONTACTS)
+        
+    def expected_wait(self, reply_timeout: float) -> float:
+        """
+        联系该卖家后预计等待的时间(秒)
+        
+        按回复率在平均回复延迟和回复超时之间加权，信用越低等待越长。
+        """
+        latency = self.latency if self.latency is not None else reply_timeout / 2
+        rate = self.reply_rate
+        wait = rate * latency + (1 - rate) * reply_timeout
+        credit = self.credit if self.credit is not None else DEFAULT_CREDIT
+        return wait * (1.5 - 0.5 * credit)
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seller_id": self.seller_id,
+            "seller_name": self.seller_name,
+            "credit": self.credit,
+            "listings_seen": self.listings_seen,
+            "contacts": self.contacts,
+            "replies": self.replies,
+            "reply_rate": round(self.reply_rate, 3),
+            "latency": round(self.latency, 2) if self.latency is not None else None,
+            "floors": dict(self.floors),
+            "seen_at": self.seen_at,
+            "outcome_at": self.outcome_at
+        }
+
+class SellerProfileCache:
+    """卖家画像缓存
+    
+    以卖家ID为键，由抓取到的商品（名称、信用）和本服务的谈判结果（回复率、回复延迟、最低报价）填充。
+    画像在TTL内没有任何更新就失效，谈判记录单独按TTL过期。谈判调度在匹配度相近的候选商品中
+    按预计等待时间排序，把有限的并发谈判名额优先分给可能很快回复的卖家。模拟数据的卖家不记录谈判结果。
+    """
+    
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else settings.SELLER_PROFILE_TTL
+        self.max_entries = max_entries if max_entries is not None else settings.SELLER_PROFILE_MAX_ENTRIES
+        self._profiles: "OrderedDict[str, SellerProfile]" = OrderedDict()
+        self.expired = 0
+        
+    def get(self, seller_id: str) -> Optional[SellerProfile]:
+        """获取未过期的卖家画像"""
+        profile = self._profiles.get(seller_id)
+        if profile is None:
+            return None
+        now = time.time()
+        last_update = max(profile.seen_at, profile.outcome_at or 0)
+        if now - last_update >= self.ttl:
+            del self._profiles[seller_id]
+            self.expired += 1
+            return None
+        profile.expire_outcomes(now, self.ttl)
+        return profile
+        
+    def _touch(self, seller_id: str) -> SellerProfile:
+        profile = self.get(seller_id)
+        if profile is None:
+            profile = self._profiles[seller_id] = SellerProfile(seller_id)
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+        else:
+            self._profiles.move_to_end(seller_id)
+        return profile
+        
+    def observe(self, products: List[Listing]):
+        """用抓取到的商品刷新卖家画像"""
+        now = time.time()
+        for product in products:
+            if not product.seller_id:
+                continue
+            profile = self._touch(product.seller_id)
+            profile.seller_name = product.seller_name or profile.seller_name
+            profile.listings_seen += 1
+            profile.seen_at = now
+            
+    def observe_credit(self, seller_id: str, credit: float):
+        """记录页面上的卖家信用"""
+        profile = self._touch(seller_id)
+        profile.credit = credit
+        profile.seen_at = time.time()
+        
+    def record_reply(self, seller_id: str, latency: Optional[float]):
+        """
+        记录一次联系卖家的结果
+        
+        Args:
+            seller_id: 卖家ID
+            latency: 回复延迟(秒)，超时未回复时为None
+        """
+        if seller_id.startswith("mock_"):
+            return
+        profile = self._touch(seller_id)
+        profile.contacts += 1
+        if latency is not None:
+            profile.replies += 1
+            if profile.latency is None:
+                profile.latency = latency
+            else:
+                profile.latency += LATENCY_ALPHA * (latency - profile.latency)
+        profile.outcome_at = time.time()
+        
+    def record_offer(self, seller_id: str, item_id: str, price: float):
+        """记录卖家对某个商品给出的报价，每个商品保留最低的一个"""
+        if seller_id.startswith("mock_"):
+            return
+        profile = self._touch(seller_id)
+        floor = profile.floors.get(item_id)
+        if floor is None or price < floor:
+            profile.floors[item_id] = price
+        profile.outcome_at = time.time()
+        
+    def floor_for(self, product: Listing) -> Optional[float]:
+        """卖家此前对同一商品给出的最低报价"""
+        profile = self.get(product.seller_id)
+        if profile is None:
+            return None
+        return profile.floors.get(product.id)
+        
+    def prioritize(self, products: List[Listing]) -> List[Listing]:
+        """
+        在匹配度档位内按卖家预计等待时间排序候选商品
+        
+        匹配度排名是主键：每 SELLER_PRIORITY_BAND 个商品为一档，档与档之间保持原有顺序，
+        只在档内把预计等待短的卖家提前。没有画像的卖家使用先验估计，等待时间相同时保持原有的排序。
+        
+        Args:
+            products: 已按需求匹配度排序的商品
+            
+        Returns:
+            排序后的新列表
+        """
+        reply_timeout = settings.SELLER_REPLY_TIMEOUT
+        default_wait = SellerProfile("").expected_wait(reply_timeout)
+        waits = {}
+        for product in products:
+            if product.seller_id not in waits:
+                profile = self.get(product.seller_id)
+                waits[product.seller_id] = profile.expected_wait(reply_timeout) if profile else default_wait
+        band = max(settings.SELLER_PRIORITY_BAND, 1)
+        ranked = sorted(enumerate(products), key=lambda item: (item[0] // band, waits[item[1].seller_id]))
+        return [product for _, product in ranked]
+        
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "sellers": len(self._profiles),
+            "with_outcomes": sum(1 for profile in self._profiles.values() if profile.contacts),
+            "expired": self.expired,
+            "ttl": self.ttl
+        }
+
+# 全局卖家画像实例
+seller_profiles = SellerProfileCache()
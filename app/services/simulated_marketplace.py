@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from app.models.schema import UserCredentials
+from app.models.listing import Listing
+from app.services.goofish_service import GoofishService
+from app.services.listing_parser import parse_search_page
+from app.services.page_recorder import page_recorder
+from app.services.seller_profiles import seller_profiles
+from app.services.tracing import traced
+from config.settings import settings
+
+# 所有模拟会话共用的HTTP连接池（aiohttp.ClientSession），首次请求时创建
+_session = None
+
+def _get_session():
+    global _session
+    if _session is None or _session.closed:
+        import aiohttp
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.MARKETPLACE_SIM_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=settings.MARKETPLACE_SIM_TIMEOUT)
+        )
+    return _session
+
+async def close_session():
+    """关闭模拟市场的连接池"""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+class SimulatedGoofishService(GoofishService):
+    """连接模拟市场的咸鱼服务（压测用）
+    
+    登录、搜索和聊天改为请求 MARKETPLACE_SIM_URL 上的模拟市场HTTP接口，不启动浏览器。
+    搜索结果页仍由 listing_parser 解析，之后的详情补全、去重、排序和谈判与线上走同一条路径。
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.base_url = settings.MARKETPLACE_SIM_URL.rstrip("/")
+        self.token: Optional[str] = None
+        
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        
+    @traced("goofish.login")
+    async def login(self, credentials: UserCredentials) -> bool:
+        """登录模拟市场，成功后保存会话令牌"""
+        try:
+            async with _get_session().post(f"{self.base_url}/login", json={
+                "username": credentials.username,
+                "password": credentials.password
+            }) as response:
+                if response.status != 200:
+                    logger.error(f"模拟市场登录失败: HTTP {response.status}")
+                    return False
+                self.token = (await response.json())["token"]
+            self.is_logged_in = True
+            return True
+        except Exception as e:
+            logger.error(f"模拟市场登录失败: {e!r}")
+            return False
+            
+    @traced("goofish.search_products")
+    async def search_products(self, query: str, max_price: float, first_page_only: bool = False) -> List[Listing]:
+        """
+        搜索模拟市场的商品
+        
+        Args:
+            query: 搜索关键词
+            max_price: 最高价格，只用于录制页面
+            first_page_only: 只取首屏结果
+            
+        Returns:
+            页面上所有有价格的商品（价格上限由调用方过滤），请求失败时为空（不生成模拟数据，压测时失败需要如实反映）
+        """
+        url = f"{self.base_url}/search"
+        try:
+            async with _get_session().get(url, headers=self._headers(), params={
+                "q": query, "scroll": "0" if first_page_only else "1"
+            }) as response:
+                if response.status != 200:
+                    logger.error(f"模拟市场搜索失败: HTTP {response.status}")
+                    return []
+                html = await response.text()
+        except Exception as e:
+            logger.error(f"模拟市场搜索失败: {e!r}")
+            return []
+            
+        await page_recorder.record_async("search", html, url=url, query=query, max_price=max_price)
+        page = await asyncio.to_thread(parse_search_page, html)
+        for seller_id, credit in page.credits.items():
+            seller_profiles.observe_credit(seller_id, credit)
+        return page.products
+        
+    def get_cookies(self) -> Dict[str, str]:
+        return {"sim_token": self.token} if self.token else {}
+        
+    async def send_message_to_seller(self, seller_id: str, message: str) -> bool:
+        """向模拟卖家发送消息，回复由模拟市场按配置的延迟产生"""
+        if not self.is_logged_in:
+            logger.error("未登录，无法发送消息")
+            return False
+        try:
+            async with _get_session().post(f"{self.base_url}/chat/send", headers=self._headers(), json={
+                "seller_id": seller_id,
+                "message": message
+            }) as response:
+                return response.status == 200
+        except Exception as e:
+            logger.error(f"发送消息失败: {e!r}")
+            return False
+            
+    async def fetch_new_messages(self) -> List[Tuple[str, str]]:
+        """拉取模拟卖家的新回复"""
+        if not self.token:
+            return []
+        try:
+            async with _get_session().get(f"{self.base_url}/chat/messages", headers=self._headers()) as response:
+                if response.status != 200:
+                    return []
+                data = await response.json()
+        except Exception as e:
+            logger.warning(f"拉取模拟市场消息失败: {e!r}")
+            return []
+        return [(item["seller_id"], item["message"]) for item in data.get("messages", [])]
+        
+    def close(self):
+        """结束会话，连接池由所有会话共用，不在这里关闭"""
+        self.inbox.close()
+        self.token = None
+        self.is_logged_in = False
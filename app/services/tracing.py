@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Deque
+from config.settings import settings
+
+class Span:
+    """一段计时区间"""
+    
+    def __init__(self, name: str, task_id: Optional[str], parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.task_id = task_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.started_at = datetime.now()
+        self.status = "ok"
+        self.duration: Optional[float] = None
+        self._start = time.perf_counter()
+    
+    def set(self, **attributes):
+        """补充属性"""
+        self.attributes.update(attributes)
+    
+    def finish(self, status: str = "ok"):
+        self.duration = time.perf_counter() - self._start
+        self.status = status
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "task_id": self.task_id,
+            "started_at": self.started_at.isoformat(),
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+class SpanStats:
+    """同名Span的汇总统计"""
+    
+    def __init__(self, window: int):
+        self.count = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+    
+    def add(self, span: Span):
+        self.count += 1
+        if span.status == "cancelled":
+            self.cancelled += 1
+        elif span.status != "ok":
+            self.errors += 1
+        self.total += span.duration
+        self.max = max(self.max, span.duration)
+        self.recent.append(span.duration)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+        
+        def percentile(q: float) -> float:
+            return round(recent[min(int(q * len(recent)), len(recent) - 1)], 4) if recent else 0.0
+        
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "max": round(self.max, 4),
+            "p50": percentile(0.5),
+            "p95": percentile(0.95)
+        }
+
+# 当前正在执行的Span，随asyncio任务的上下文自动传递给子任务
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    """轻量的进程内追踪器
+    
+    Span按任务ID归组，子协程和asyncio子任务自动继承父Span和任务ID。
+    """
+    
+    def __init__(self, max_tasks: Optional[int] = None, max_spans: Optional[int] = None):
+        self.max_tasks = max_tasks or settings.TRACE_MAX_TASKS
+        self.max_spans = max_spans or settings.TRACE_MAX_SPANS_PER_TASK
+        self._tasks: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._stats: Dict[str, SpanStats] = {}
+    
+    @contextmanager
+    def span(self, name: str, task_id: Optional[str] = None, **attributes):
+        """
+        记录一个Span
+        
+        Args:
+            name: Span名称，如 "stage.search"
+            task_id: 任务ID，缺省时继承父Span
+            **attributes: 附加属性
+        """
+        parent = _current_span.get()
+        if task_id is None and parent is not None:
+            task_id = parent.task_id
+        
+        span = Span(name, task_id, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        status = "ok"
+        try:
+            yield span
+        except BaseException as e:
+            # 取消不算错误，单独标记
+            status = "cancelled" if type(e).__name__.endswith("CancelledError") else type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish(status)
+            self._record(span)
+    
+    def _record(self, span: Span):
+        self._stats.setdefault(span.name, SpanStats(settings.TRACE_STATS_WINDOW)).add(span)
+        
+        if span.task_id is None:
+            return
+        spans = self._tasks.get(span.task_id)
+        if spans is None:
+            spans = self._tasks[span.task_id] = []
+            while len(self._tasks) > self.max_tasks:
+                self._tasks.popitem(last=False)
+        if len(spans) < self.max_spans:
+            spans.append(span)
+    
+    def get_task_spans(self, task_id: str) -> List[Dict[str, Any]]:
+        """获取任务的全部Span，按开始时间排序"""
+        spans = sorted(self._tasks.get(task_id, []), key=lambda s: s.started_at)
+        return [span.to_dict() for span in spans]
+    
+    def get_stage(self, task_id: str, name: str) -> Optional[Span]:
+        """获取任务中某个阶段最近一次完成的Span"""
+        for span in reversed(self._tasks.get(task_id, [])):
+            if span.name == name:
+                return span
+        return None
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各Span名称的耗时统计(秒)"""
+        return {name: stats.to_dict() for name, stats in sorted(self._stats.items())}
+
+def traced(name: str):
+    """为异步函数记录Span的装饰器"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# 全局追踪器实例
+tracer = Tracer()
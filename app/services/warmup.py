@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from typing import Dict, Any, Optional, Awaitable
+from loguru import logger
+from app.services.deepseek_client import deepseek_client
+from app.services.goofish_service import driver_pool
+from config.settings import settings
+
+class WarmupManager:
+    """启动预热管理器
+    
+    服务启动后在后台预热浏览器池和HTTP连接池，不阻塞启动；
+    全部预热结束(成功或失败)后服务才报告就绪。
+    """
+    
+    def __init__(self):
+        self.ready = False
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """在后台开始预热"""
+        self.started_at = time.time()
+        self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        await asyncio.gather(
+            self._warm("llm", deepseek_client.warmup()),
+            self._warm("browser", driver_pool.fill())
+        )
+        self.ready = True
+        logger.info(f"预热完成，耗时 {time.time() - self.started_at:.1f} 秒")
+    
+    async def _warm(self, name: str, awaitable: Awaitable[Any]):
+        start = time.time()
+        self.components[name] = {"status": "warming"}
+        try:
+            result = await asyncio.wait_for(awaitable, timeout=settings.WARMUP_TIMEOUT)
+            self.components[name] = {"status": "ready", "result": result}
+        except Exception as e:
+            # 预热失败不影响服务，首个请求时再按需创建
+            logger.warning(f"预热 {name} 失败: {e!r}")
+            self.components[name] = {"status": "failed", "error": repr(e)}
+        self.components[name]["duration"] = round(time.time() - start, 3)
+    
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        driver_pool.close()
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "components": self.components,
+            "browser_pool": driver_pool.get_stats()
+        }
+
+# 全局预热管理器实例
+warmup = WarmupManager()
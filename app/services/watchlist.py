@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from loguru import logger
+from app.models.schema import UserCredentials
+from app.models.listing import Listing
+from app.services.goofish_service import GoofishService, create_goofish_service
+from app.services.identity import listing_key, migrate_key
+from app.services.price_stats import price_index
+from app.services.listing_store import listing_store
+from app.services.seller_profiles import seller_profiles
+from app.services.image_pipeline import image_pipeline
+from app.services.lifecycle import lifecycle
+from config.settings import settings
+
+class Watch:
+    """一个保存的监控查询"""
+    
+    def __init__(self, watch_id: str, query: str, max_price: float, username: str,
+                 keywords: List[str], interval: float, analysis: Optional[Dict[str, Any]] = None):
+        self.watch_id = watch_id
+        self.query = query
+        self.max_price = max_price
+        self.username = username
+        self.keywords = keywords
+        self.interval = interval
+        self.analysis = analysis or {}
+        self.seen: "OrderedDict[str, float]" = OrderedDict()  # 商品键 -> 最近一次看到的价格
+        self.primed = False  # 首次完整扫描后才开始报告新商品
+        self.last_run: Optional[float] = None
+        self.next_run = time.time()
+        self.hits = 0
+        self.created_at = time.time()
+    
+    def schedule_next(self):
+        """按带抖动的间隔安排下次检查，避免多个监控同时访问"""
+        jitter = settings.WATCHLIST_JITTER
+        self.next_run = time.time() + self.interval * random.uniform(1 - jitter, 1 + jitter)
+    
+    def diff(self, products: List[Listing]) -> List[Listing]:
+        """
+        与已见过的商品比较
+        
+        Args:
+            products: 本次抓取到的商品
+        
+        Returns:
+            新出现或降价的商品
+        """
+        changed = []
+        for product in products:
+            key = listing_key(product)
+            previous = self.seen.get(key)
+            if previous is None or product.price < previous:
+                changed.append(product)
+            self.seen[key] = product.price
+            self.seen.move_to_end(key)
+        
+        # 只记住最近的商品
+        while len(self.seen) > settings.WATCHLIST_MAX_SEEN:
+            self.seen.popitem(last=False)
+        
+        return changed
+    
+    def to_dict(self) -> Dict[str, Any]:
+        # 不保存密码，重启后需要重新提供凭证
+        return {
+            "watch_id": self.watch_id,
+            "query": self.query,
+            "max_price": self.max_price,
+            "username": self.username,
+            "keywords": self.keywords,
+            "interval": self.interval,
+            "analysis": self.analysis,
+            "seen": list(self.seen.items()),
+            "primed": self.primed,
+            "last_run": self.last_run,
+            "hits": self.hits,
+            "created_at": self.created_at
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Watch":
+        watch = cls(
+            data["watch_id"], data["query"], data["max_price"], data["username"],
+            data.get("keywords", []), data.get("interval", settings.WATCHLIST_INTERVAL), data.get("analysis")
+        )
+        watch.seen = OrderedDict((migrate_key(key), price) for key, price in data.get("seen", []))
+        watch.primed = data.get("primed", False)
+        watch.last_run = data.get("last_run")
+        watch.hits = data.get("hits", 0)
+        watch.created_at = data.get("created_at", watch.created_at)
+        return watch
+
+WatchHitHandler = Callable[[Watch, List[Listing], GoofishService], Awaitable[None]]
+
+class WatchlistService:
+    """监控列表服务
+    
+    按抖动后的间隔重新搜索保存的查询，首次完整扫描建立基线，之后只抓取首屏，
+    与已见过的商品比较，只有新出现或降价的商品才交给处理函数做谈判和通知。
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.WATCHLIST_FILE
+        self.watches: Dict[str, Watch] = {}
+        self.credentials: Dict[str, UserCredentials] = {}  # 仅保存在内存中
+        self.sessions: Dict[str, GoofishService] = {}  # 每个账号一个登录会话
+        self.on_hits: Optional[WatchHitHandler] = None
+        self._account_locks: Dict[str, asyncio.Lock] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+        self._write_lock = threading.Lock()
+        self._snapshots = 0
+        self._written = 0
+    
+    def load(self):
+        """从文件加载监控列表（启动时调用）"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for data in json.load(f):
+                    watch = Watch.from_dict(data)
+                    self.watches[watch.watch_id] = watch
+            logger.info(f"已加载 {len(self.watches)} 个监控查询")
+        except Exception as e:
+            logger.error(f"加载监控列表失败: {e}")
+    
+    def _snapshot(self) -> Tuple[int, List[Dict[str, Any]]]:
+        self._snapshots += 1
+        return self._snapshots, [watch.to_dict() for watch in self.watches.values()]
+    
+    def _write(self, version: int, snapshot: List[Dict[str, Any]]):
+        try:
+            with self._write_lock:
+                # 关闭时的写入可能先于进行中的线程写入，不用旧快照覆盖新的
+                if version <= self._written:
+                    return
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                self._written = version
+        except Exception as e:
+            logger.error(f"保存监控列表失败: {e}")
+    
+    def _save(self, delay: float = 0.0):
+        """
+        标记监控列表有变化，稍后在线程中写入文件
+        
+        已有排期的保存时合并到同一次写入，写入期间的新变化在写完后再写一次。
+        
+        Args:
+            delay: 延迟写入的时间(秒)
+        """
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later(delay))
+    
+    async def _save_later(self, delay: float):
+        await asyncio.sleep(delay)
+        while self._dirty:
+            # 在事件循环上取快照，写文件不阻塞事件循环
+            version, snapshot = self._snapshot()
+            self._dirty = False
+            await asyncio.to_thread(self._write, version, snapshot)
+    
+    def add_watch(self, query: str, max_price: float, credentials: UserCredentials, keywords: List[str],
+                  interval: Optional[float] = None, analysis: Optional[Dict[str, Any]] = None) -> Watch:
+        """
+        添加监控查询
+        
+        Args:
+            query: 商品需求描述
+            max_price: 最高价格
+            credentials: 用户凭证，只保存在内存中
+            keywords: 搜索关键词
+            interval: 检查间隔(秒)
+            analysis: 需求分析结果
+        
+        Returns:
+            新建的监控
+        """
+        interval = max(interval or settings.WATCHLIST_INTERVAL, settings.WATCHLIST_MIN_INTERVAL)
+        watch = Watch(f"watch_{uuid.uuid4().hex[:12]}", query, max_price, credentials.username,
+                      keywords, interval, analysis)
+        self.watches[watch.watch_id] = watch
+        self.credentials[credentials.username] = credentials
+        self._save()
+        self.start()
+        logger.info(f"添加监控 {watch.watch_id}: {query} ≤ {max_price}")
+        return watch
+    
+    def set_credentials(self, credentials: UserCredentials) -> int:
+        """提供账号凭证，恢复该账号下的监控，返回恢复的监控数量"""
+        self.credentials[credentials.username] = credentials
+        self.start()
+        return len([w for w in self.watches.values() if w.username == credentials.username])
+    
+    def remove_watch(self, watch_id: str) -> bool:
+        if self.watches.pop(watch_id, None) is None:
+            return False
+        self._save()
+        
+        # 账号下没有监控时释放浏览器
+        usernames = {watch.username for watch in self.watches.values()}
+        for username in list(self.sessions):
+            if username not in usernames:
+                self.sessions.pop(username).close()
+        return True
+    
+    def list_watches(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "watch_id": watch.watch_id,
+                "query": watch.query,
+                "max_price": watch.max_price,
+                "username": watch.username,
+                "interval": watch.interval,
+                "seen": len(watch.seen),
+                "hits": watch.hits,
+                "last_run": watch.last_run,
+                "next_run": watch.next_run,
+                "active": watch.username in self.credentials
+            }
+            for watch in self.watches.values()
+        ]
+    
+    def start(self):
+        """启动调度循环（需在事件循环中调用）"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        # 写入剩余的变化，进行中的线程写入结束后才会执行
+        if self._save_task:
+            self._save_task.cancel()
+            self._save_task = None
+        if self._dirty:
+            self._dirty = False
+            self._write(*self._snapshot())
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+    
+    async def _run(self):
+        running: Dict[str, asyncio.Task] = {}
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            active = [w for w in self.watches.values() if w.username in self.credentials]
+            
+            for watch in active:
+                # 服务关闭过程中不再发起新的检查
+                if watch.next_run <= now and watch.watch_id not in running and lifecycle.accepting:
+                    task = lifecycle.track(asyncio.create_task(self.check_watch(watch)))
+                    running[watch.watch_id] = task
+                    task.add_done_callback(lambda _, watch_id=watch.watch_id: self._finished(running, watch_id))
+            
+            pending = [w.next_run for w in active if w.watch_id not in running]
+            delay = max(min(pending) - time.time(), 0.05) if pending else settings.WATCHLIST_INTERVAL
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _finished(self, running: Dict[str, asyncio.Task], watch_id: str):
+        # 检查结束后唤醒调度循环，按新的下次检查时间重新计算等待
+        running.pop(watch_id, None)
+        self._wakeup.set()
+    
+    async def _get_session(self, username: str) -> GoofishService:
+        session = self.sessions.get(username)
+        if session is None or not session.is_logged_in:
+            session = create_goofish_service()
+            if not await session.login(self.credentials[username]):
+                session.close()
+                raise RuntimeError(f"账号 {username} 登录失败")
+            self.sessions[username] = session
+        return session
+    
+    async def check_watch(self, watch: Watch) -> List[Listing]:
+        """
+        检查一次监控查询
+        
+        Args:
+            watch: 监控
+        
+        Returns:
+            新出现或降价的商品
+        """
+        lock = self._account_locks.setdefault(watch.username, asyncio.Lock())
+        changed: List[Listing] = []
+        just_primed = False
+        try:
+            # 同一账号的浏览器一次只做一件事，谈判结束前不再搜索
+            async with lock:
+                session = await self._get_session(watch.username)
+                found: List[Listing] = []
+                scraped = False
+                for keyword in watch.keywords:
+                    # 基线建立后只看首屏，新发布的商品排在最前面
+                    products = await session.search_products(keyword, watch.max_price, first_page_only=watch.primed)
+                    if not products or all(p.id.startswith("mock_") for p in products):
+                        # 抓取失败时服务返回模拟数据，价格是随机的，不能拿来判断新商品和降价
+                        logger.warning(f"监控 {watch.watch_id} 抓取失败，跳过关键词: {keyword}")
+                        continue
+                    scraped = True
+                    price_index.observe(keyword, products)
+                    listing_store.record(keyword, products)
+                    seller_profiles.observe(products)
+                    image_pipeline.submit(products)
+                    found.extend(p for p in products if p.price <= watch.max_price)
+                
+                changed = watch.diff(found)
+                if not scraped:
+                    # 所有关键词都抓取失败时不建立基线，否则下次会把所有商品都当成新商品
+                    changed = []
+                elif not watch.primed:
+                    logger.info(f"监控 {watch.watch_id} 建立基线: {len(watch.seen)} 个商品")
+                    watch.primed = True
+                    just_primed = True
+                    changed = []
+                elif changed:
+                    watch.hits += len(changed)
+                    logger.info(f"监控 {watch.watch_id} 发现 {len(changed)} 个新商品或降价商品")
+                
+                if changed and self.on_hits:
+                    await self.on_hits(watch, changed, session)
+            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"监控 {watch.watch_id} 检查失败: {e}")
+        
+        finally:
+            watch.last_run = time.time()
+            watch.schedule_next()
+            # 只有建立基线或发现新商品时才保存，其余检查只更新了检查时间，不值得重写整个文件
+            if changed or just_primed:
+                self._save(settings.WATCHLIST_SAVE_DELAY)
+        
+        return changed
+
+# 全局监控列表实例
+watchlist = WatchlistService()
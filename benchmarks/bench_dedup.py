@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+近似重复商品识别基准
+
+生成带有重新上架变体的合成商品集，比较：
+- 旧的精确标题去重
+- 逐对比较的SimHash去重（O(n²)，只在小规模时运行）
+- 分段建桶的 NearDuplicateIndex
+
+输出耗时、比较次数以及相对真实重复关系的准确率和召回率。
+
+用法:
+    python benchmarks/bench_dedup.py --sizes 1000 10000 50000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models.listing import Listing
+from app.services.dedup import NearDuplicateIndex, simhash
+
+BRANDS = ["iPhone", "华为", "小米", "索尼", "佳能", "任天堂", "大疆", "戴森", "苹果", "联想"]
+MODELS = ["13", "14 Pro", "Mate60", "14", "A7M4", "R6", "Switch OLED", "Mini 3", "V12", "MacBook Air", "拯救者Y9000P"]
+SPECS = ["128G", "256G", "512G", "1T", "国行", "港版", "黑色", "白色", "蓝色", "全网通", "M2芯片", "16+512"]
+CONDITIONS = ["99新", "95新", "9成新", "8成新", "准新", "全新未拆", "成色很好", "有轻微划痕", "无拆无修", "电池健康90%"]
+EXTRAS = ["全套配件", "带原装充电器", "送保护壳", "在保", "发票齐全", "可验机", "同城面交", "学生自用"]
+# 卖家重新上架时常见的改动
+REPOST_PREFIXES = ["急出", "包邮", "秒出", "捡漏", "自用", "【降价】", "！！", "闲置"]
+
+def make_title(rng: random.Random) -> str:
+    parts = [rng.choice(BRANDS) + rng.choice(MODELS), rng.choice(SPECS), rng.choice(SPECS),
+             rng.choice(CONDITIONS), rng.choice(EXTRAS)]
+    return " ".join(parts)
+
+def repost(title: str, rng: random.Random) -> str:
+    """模拟卖家重新上架：加减修饰词、改标点、调换或删掉一个词"""
+    words = title.split(" ")
+    change = rng.random()
+    if change < 0.3:
+        words.insert(0, rng.choice(REPOST_PREFIXES))
+    elif change < 0.5 and len(words) > 3:
+        words.pop(rng.randrange(1, len(words)))
+    elif change < 0.7:
+        i, j = rng.sample(range(len(words)), 2)
+        words[i], words[j] = words[j], words[i]
+    elif change < 0.85:
+        words.append(rng.choice(REPOST_PREFIXES))
+    sep = rng.choice([" ", "，", "|", "/", " "])
+    return sep.join(words)
+
+def generate(n: int, repost_rate: float, seed: int = 7):
+    """
+    生成n个商品，返回 (商品列表, 每个商品所属的真实簇ID)
+    """
+    rng = random.Random(seed)
+    products, clusters = [], []
+    originals = []
+    sellers = [f"seller_{i}" for i in range(max(n // 5, 1))]
+    for i in range(n):
+        if originals and rng.random() < repost_rate:
+            cluster, title, seller, price = rng.choice(originals)
+            title = repost(title, rng)
+            price = round(price * rng.uniform(0.92, 1.0), 2)
+        else:
+            cluster = len(originals)
+            title = make_title(rng)
+            seller = rng.choice(sellers)
+            price = round(rng.uniform(500, 8000), 2)
+            originals.append((cluster, title, seller, price))
+        products.append(Listing(
+            id=f"item_{i}", title=title, price=price, seller_name=seller, seller_id=seller,
+            location="上海", description="", url=f"https://www.goofish.com/item?id={i}"
+        ))
+        clusters.append(cluster)
+    return products, clusters
+
+def score(assignments, clusters):
+    """按商品对统计准确率和召回率"""
+    from collections import Counter
+    truth = Counter(clusters)
+    found = Counter(assignments)
+    both = Counter(zip(assignments, clusters))
+    pairs = lambda c: sum(v * (v - 1) // 2 for v in c.values())
+    true_pairs, found_pairs, hit_pairs = pairs(truth), pairs(found), pairs(both)
+    precision = hit_pairs / found_pairs if found_pairs else 1.0
+    recall = hit_pairs / true_pairs if true_pairs else 1.0
+    return precision, recall
+
+def run_exact(products):
+    seen = {}
+    return [seen.setdefault(p.title.lower().strip(), len(seen)) for p in products], 0
+
+def run_index(products, threshold):
+    index = NearDuplicateIndex(threshold=threshold)
+    return [index.add(p)[0] for p in products], index.comparisons
+
+def run_pairwise(products, threshold):
+    index = NearDuplicateIndex(threshold=threshold)
+    fingerprints, kept, assignments = [], [], []
+    comparisons = 0
+    for product in products:
+        fingerprint = simhash(product.title)
+        match = None
+        for i, (other, other_fp) in enumerate(zip(kept, fingerprints)):
+            comparisons += 1
+            if (other.seller_id == product.seller_id
+                    and bin(fingerprint ^ other_fp).count("1") <= threshold
+                    and index._price_close(product.price, other.price)):
+                match = i
+                break
+        if match is None:
+            match = len(kept)
+            kept.append(product)
+            fingerprints.append(fingerprint)
+        assignments.append(match)
+    return assignments, comparisons
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重复商品识别基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repost-rate", type=float, default=0.3)
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[6, 12, 16])
+    parser.add_argument("--pairwise-limit", type=int, default=5000, help="超过该规模不运行逐对比较")
+    args = parser.parse_args()
+    
+    print(f"{'n':>7} {'method':<14} {'seconds':>8} {'compares':>11} {'precision':>9} {'recall':>7} {'kept':>7}")
+    for n in args.sizes:
+        products, clusters = generate(n, args.repost_rate)
+        runs = [("exact-title", lambda: run_exact(products))]
+        for k in args.thresholds:
+            runs.append((f"index k={k}", lambda k=k: run_index(products, k)))
+        if n <= args.pairwise_limit:
+            k = args.thresholds[0]
+            runs.append((f"pairwise k={k}", lambda k=k: run_pairwise(products, k)))
+            
+        for name, run in runs:
+            start = time.perf_counter()
+            assignments, comparisons = run()
+            elapsed = time.perf_counter() - start
+            precision, recall = score(assignments, clusters)
+            print(f"{n:>7} {name:<14} {elapsed:>8.3f} {comparisons:>11} {precision:>9.3f} {recall:>7.3f} "
+                  f"{len(set(assignments)):>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+商品详情补全基准
+
+在本地起一个带固定延迟的详情页服务器，模拟一次比价：去重后的候选商品用 RankingEngine 排序，
+入选的前K个商品进入谈判（用固定时长模拟），谈判结束后生成结果。比较：
+- 排序后逐个顺序抓取前K个详情，抓完再谈判
+- 排序后通过连接池并发抓取前K个详情，抓完再谈判
+- 去重后立即预取，搜索不等待详情，谈判结束时补上已到达的详情（SearchAgent 的做法）
+- 同一批商品再次比价（详情缓存命中）
+
+报告搜索阶段因详情多花的时间，以及生成结果时已补全的商品数。
+
+用法:
+    python benchmarks/bench_detail_enricher.py --candidates 30 --top 10 --latency 0.3 --negotiate-time 2
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aiohttp import web
+from loguru import logger
+from app.models.listing import Listing
+from app.services.detail_enricher import DetailEnricher
+from app.services.ranking import ranking_engine
+from config.settings import settings
+
+_CONDITIONS = ("全新", "99新", "95新", "9成新", "有划痕")
+_SPECS = ("128G", "256G", "国行", "港版", "黑色", "白色")
+
+ANALYSIS = {
+    "keywords": ["iPhone 13"],
+    "category": "手机",
+    "features": ["128G", "国行"],
+    "price_sensitivity": "medium",
+    "quality_requirements": "95新以上"
+}
+
+def make_page(n: int) -> str:
+    condition = _CONDITIONS[n % len(_CONDITIONS)]
+    return (f'<html><body><div class="desc--abc">自用闲置，成色：{condition}，配件齐全 {n}</div>'
+            f'<div class="item-location">杭州</div>'
+            f'<div class="item-main"><img src="//img.example.com/{n}.jpg"></div></body></html>')
+
+async def start_server(latency: float, port: int):
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return web.Response(text=make_page(int(request.query["id"])), content_type="text/html")
+    app = web.Application()
+    app.router.add_get("/item", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+def make_batch(b: int, args) -> list:
+    rng = random.Random(b)
+    products = []
+    for i in range(args.candidates):
+        n = b * args.candidates + i
+        products.append(Listing(
+            id=str(n), title=f"iPhone 13 {rng.choice(_SPECS)} {rng.choice(_SPECS)}", price=rng.uniform(2500, 4500),
+            seller_name="", seller_id=str(n), location="", description="",
+            url=f"http://127.0.0.1:{args.port}/item?id={n}"
+        ))
+    return products
+
+async def search_sequential(enricher: DetailEnricher, products, args):
+    selected = ranking_engine.rank(products, ANALYSIS, args.top)
+    enriched = []
+    for product in selected:
+        detail = await enricher._fetch(product.id, product.url, None)
+        enriched.append(detail.apply(product) if detail else product)
+    return enriched
+
+async def search_pooled(enricher: DetailEnricher, products, args):
+    selected = ranking_engine.rank(products, ANALYSIS, args.top)
+    enricher.select(selected)
+    await enricher.wait(selected, args.deadline)
+    return enricher.apply(selected)
+
+async def search_no_wait(enricher: DetailEnricher, products, args):
+    prefetched = enricher.prefetch(products)
+    selected = ranking_engine.rank(products, ANALYSIS, args.top)
+    enricher.select(selected, prefetched=prefetched)
+    return enricher.apply(selected)
+
+async def measure(label: str, search, enricher: DetailEnricher, batches, args):
+    search_time = 0.0
+    complete = 0
+    for products in batches:
+        start = time.perf_counter()
+        selected = await search(enricher, products, args)
+        search_time += time.perf_counter() - start
+        # 谈判期间详情继续到达，生成结果时补上
+        await asyncio.sleep(args.negotiate_time)
+        complete += sum(1 for product in enricher.apply(selected) if product.condition)
+    print(f"{label:<32} search +{search_time / len(batches) * 1000:>7.1f}ms  "
+          f"enriched at result {complete}/{len(batches) * args.top}")
+
+async def run(args):
+    runner = await start_server(args.latency, args.port)
+    batches = [make_batch(b, args) for b in range(args.searches)]
+    
+    start = time.perf_counter()
+    for _ in range(100):
+        ranking_engine.rank(batches[0], ANALYSIS, args.top)
+    print(f"ranking {args.candidates} candidates: {(time.perf_counter() - start) * 10:.3f}ms")
+    
+    for label, search in [("rank then sequential top-K", search_sequential),
+                          ("rank then pooled top-K", search_pooled),
+                          ("prefetch, no wait", search_no_wait)]:
+        enricher = DetailEnricher()
+        await measure(label, search, enricher, batches, args)
+        if search is search_no_wait:
+            # 等后台请求写完缓存后重复同样的比价
+            await asyncio.gather(*enricher._inflight.values(), return_exceptions=True)
+            await measure("prefetch, no wait, warm cache", search, enricher, batches, args)
+        await enricher.close()
+    await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="商品详情补全基准")
+    parser.add_argument("--candidates", type=int, default=30, help="每次搜索去重后的候选商品数")
+    parser.add_argument("--top", type=int, default=10, help="入选并需要补全的商品数")
+    parser.add_argument("--searches", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.3, help="详情页服务器每个请求的延迟(秒)")
+    parser.add_argument("--negotiate-time", type=float, default=2.0, help="模拟谈判耗时(秒)")
+    parser.add_argument("--deadline", type=float, default=10.0, help="等待详情的方式最多等待的时间(秒)")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+    logger.remove()
+    settings.DETAIL_ENRICH_ENABLED = True
+    settings.DETAIL_PREFETCH = args.candidates
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
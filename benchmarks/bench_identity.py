@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+商品标识基准
+
+- 多个关键词的抓取结果合并后，按位置编号的旧ID(product_{i})与从链接提取的ID各有多少冲突
+- 从链接提取ID的吞吐量
+- 以驻留的商品ID和以完整链接为键查找缓存的耗时
+
+用法:
+    python benchmarks/bench_identity.py --listings 50000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.identity import item_identity, seller_identity
+
+def make_cards(n: int, keywords: int, seed: int = 5):
+    """模拟多个关键词各自抓取的商品卡片，热门商品会出现在多个关键词下"""
+    rng = random.Random(seed)
+    pool = [
+        (f"https://www.goofish.com/item?spm=a21ybx.search.feeds.{rng.randrange(100)}&id={700000000000 + i}"
+         f"&categoryId={rng.randrange(50000)}", f"卖家{i % 3000}")
+        for i in range(n)
+    ]
+    return [[rng.choice(pool) for _ in range(n // keywords)] for _ in range(keywords)]
+
+def main():
+    parser = argparse.ArgumentParser(description="商品标识基准")
+    parser.add_argument("--listings", type=int, default=50000)
+    parser.add_argument("--keywords", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=1000000)
+    args = parser.parse_args()
+    
+    pages = make_cards(args.listings, args.keywords)
+    cards = [card for page in pages for card in page]
+    distinct = len({url for url, _ in cards})
+    
+    # 旧ID：每个关键词的结果都从 product_0 开始编号
+    old_ids = {f"product_{i}" for page in pages for i in range(len(page))}
+    start = time.perf_counter()
+    new_ids = [item_identity(url, "", seller) for url, seller in cards]
+    elapsed = time.perf_counter() - start
+    sellers = {seller_identity([], seller, item_id) for (_, seller), item_id in zip(cards, new_ids)}
+    print(f"distinct listings      {distinct}")
+    print(f"positional ids         {len(old_ids)} keys ({distinct - len(old_ids)} listings collide)")
+    print(f"extracted ids          {len(set(new_ids))} keys, {len(sellers)} sellers")
+    print(f"extract item id        {len(cards) / elapsed:>10.0f}/s")
+    
+    # 查找：以链接为键 vs 以驻留的商品ID为键
+    by_url = {url: 1 for url, _ in cards}
+    by_id = {item_id: 1 for item_id in new_ids}
+    # 查询用的字符串来自新的抓取，与字典里的键不是同一个对象
+    url_queries = [str(url.encode("utf-8"), "utf-8") for url, _ in random.sample(cards, 1000)]
+    id_queries = [item_identity(url, "", "") for url in url_queries]
+    for label, table, queries in [("lookup by url", by_url, url_queries), ("lookup by interned id", by_id, id_queries)]:
+        rounds = args.lookups // len(queries)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for key in queries:
+                table[key]
+        print(f"{label:<22} {(time.perf_counter() - start) / (rounds * len(queries)) * 1e9:>10.1f} ns")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+商品图片管线基准
+
+在本地起一个带固定延迟的图片服务器，比较：
+- 逐张顺序下载并保存
+- ImagePipeline 后台并发下载（冷缓存）
+- 重启后同样的链接（磁盘缓存命中）
+同时统计管线运行期间事件循环的最大卡顿，确认解码和缩放没有阻塞任务。
+
+用法:
+    python benchmarks/bench_image_pipeline.py --images 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aiohttp import web
+from app.models.listing import Listing
+from app.services.image_pipeline import ImagePipeline, Image
+from config.settings import settings
+
+def make_image(seed: int) -> bytes:
+    """生成测试图片：有Pillow时为JPEG，否则为随机字节"""
+    rng = random.Random(seed)
+    if Image is None:
+        return rng.randbytes(60000)
+    image = Image.new("RGB", (640, 480), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    for _ in range(40):
+        x, y = rng.randrange(600), rng.randrange(440)
+        image.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (x, y, x + 40, y + 40))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+async def start_server(images, latency: float, port: int):
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return web.Response(body=images[int(request.match_info["n"])], content_type="image/jpeg")
+    app = web.Application()
+    app.router.add_get("/{n}.jpg", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+async def measure_stall(stop: asyncio.Event) -> float:
+    """事件循环的最大调度延迟"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        worst = max(worst, time.perf_counter() - start - 0.005)
+    return worst
+
+async def run_pipeline(label: str, directory: str, products):
+    pipeline = ImagePipeline(directory)
+    pipeline.start()
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(measure_stall(stop))
+    start = time.perf_counter()
+    pipeline.submit(products)
+    await pipeline.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    stall = await monitor
+    await pipeline.stop()
+    stats = pipeline.get_stats()
+    print(f"{label:<28} {elapsed:>7.2f}s  {len(products) / elapsed:>7.1f} img/s  "
+          f"max loop stall {stall * 1000:>6.1f}ms  fetched={stats['fetched']} hits={stats['cache_hits']}")
+
+async def run(args):
+    images = [make_image(i) for i in range(args.images)]
+    runner = await start_server(images, args.latency, args.port)
+    urls = [f"http://127.0.0.1:{args.port}/{i}.jpg" for i in range(args.images)]
+    products = [
+        Listing(id=str(i), title="", price=1.0, seller_name="", seller_id="", location="", description="",
+                url="", images=[url])
+        for i, url in enumerate(urls)
+    ]
+    
+    # 顺序下载：逐张请求后同步保存
+    sequential = ImagePipeline(tempfile.mkdtemp())
+    start = time.perf_counter()
+    for url in urls:
+        data = await sequential._download(url)
+        sequential._store(url, data)
+    elapsed = time.perf_counter() - start
+    await sequential.stop()
+    print(f"{'sequential':<28} {elapsed:>7.2f}s  {len(urls) / elapsed:>7.1f} img/s")
+    
+    directory = tempfile.mkdtemp()
+    await run_pipeline(f"pipeline concurrency={settings.IMAGE_CONCURRENCY}", directory, products)
+    await run_pipeline("pipeline warm disk cache", directory, products)
+    await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="商品图片管线基准")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="图片服务器每个请求的延迟(秒)")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    # 本地服务器只有一个域名，放开单域名限制
+    settings.IMAGE_PER_HOST_LIMIT = settings.IMAGE_CONCURRENCY
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+商品内部表示基准
+
+比较 Pydantic ProductInfo 与 __slots__ Listing：
+- 构造耗时（ProductInfo 每次构造都做校验）
+- 每个对象的内存占用
+- 一次比价任务中商品在各Agent之间传递的开销：
+  旧流程 构造 -> .dict() -> ProductInfo(**) -> 每个谈判 .dict() -> 结果 .dict()
+  新流程 构造 -> 按引用传递 -> 结果 to_dict()
+
+用法:
+    python benchmarks/bench_listing.py --listings 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models.listing import Listing
+from app.models.schema import ProductInfo
+
+def fields(i: int):
+    return dict(
+        id=str(700000000 + i), title=f"iPhone 13 128G 国行 95新 {i}", price=2999.0 + i % 500,
+        seller_name=f"用户{i % 1000}", seller_id=str(2200000000 + i % 1000), location="上海",
+        description="自用一年，无拆无修，电池健康90%", url=f"https://www.goofish.com/item?id={700000000 + i}"
+    )
+
+def old_pipeline(rows, negotiations):
+    products = [ProductInfo(**row) for row in rows]                 # 解析
+    payload = [product.dict() for product in products]              # SearchAgent 返回
+    products = [ProductInfo(**data) for data in payload]            # CoordinatorAgent 重建
+    inputs = [product.dict() for product in products[:negotiations]]  # 每个谈判Agent
+    return [product.dict() for product in products], inputs         # 结果
+
+def new_pipeline(rows, negotiations):
+    products = [Listing(**row) for row in rows]                     # 解析
+    inputs = products[:negotiations]                                # 按引用传递
+    return [product.to_dict() for product in products], inputs      # 只在API边界转换
+
+def measure(label: str, func, repeat: int, count: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    per_item = (time.perf_counter() - start) / repeat / count * 1e6
+    print(f"{label:<32} {per_item:>9.3f} us/listing")
+
+def memory(cls, rows) -> float:
+    tracemalloc.start()
+    objects = [cls(**row) for row in rows]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size / len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="商品内部表示基准")
+    parser.add_argument("--listings", type=int, default=10000)
+    parser.add_argument("--negotiations", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    # 旧流程沿用 .dict()，忽略Pydantic v2的弃用警告
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    
+    rows = [fields(i) for i in range(args.listings)]
+    n = args.listings
+    
+    measure("construct ProductInfo", lambda: [ProductInfo(**row) for row in rows], args.repeat, n)
+    measure("construct Listing", lambda: [Listing(**row) for row in rows], args.repeat, n)
+    measure("task pipeline (ProductInfo)", lambda: old_pipeline(rows, args.negotiations), args.repeat, n)
+    measure("task pipeline (Listing)", lambda: new_pipeline(rows, args.negotiations), args.repeat, n)
+    
+    print(f"{'memory ProductInfo':<32} {memory(ProductInfo, rows):>9.0f} bytes/listing")
+    print(f"{'memory Listing':<32} {memory(Listing, rows):>9.0f} bytes/listing")
+
+if __name__ == "__main__":
+    main()
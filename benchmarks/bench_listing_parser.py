@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+搜索页解析基准
+
+对录制的搜索结果页（见 replay_fixtures.py）离线运行 listing_parser，报告：
+- 构建文档和提取卡片的耗时、每秒解析的卡片数
+- 解析一页时的内存峰值和解析结果保留的内存
+- 每张卡片的选择器探测次数、未命中次数，以及未命中的探测占提取时间的比例
+
+用法:
+    python benchmarks/bench_listing_parser.py --rounds 50
+    python benchmarks/bench_listing_parser.py --fixtures data/pages --features lxml
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+from app.services.listing_parser import (
+    ParseStats, SEARCH_CARD_LIMIT, make_soup, parse_search_soup, parse_search_page
+)
+from app.services.page_recorder import load_fixtures
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def miss_cost(soup, selector: str, stats: ParseStats, rounds: int) -> float:
+    """卡片上一次未命中的选择器探测的平均耗时(秒)"""
+    cards = soup.select(selector)[:SEARCH_CARD_LIMIT]
+    missing = [
+        (card, probe) for card in cards for probe in stats.hits.keys() | {".no-such-class"}
+        if probe != selector and card.select_one(probe) is None
+    ]
+    if not missing:
+        return 0.0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for card, probe in missing:
+            card.select_one(probe)
+    return (time.perf_counter() - start) / (rounds * len(missing))
+
+def bench_fixture(fixture, args):
+    html = fixture.read()
+    stats = ParseStats()
+    page = parse_search_page(html, features=args.features, stats=stats)
+    if page.selector is None:
+        print(f"{fixture.name:<28} no listing cards, skipped")
+        return None
+        
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        soup = make_soup(html, args.features)
+    build = (time.perf_counter() - start) / args.rounds
+    
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        parse_search_soup(soup)
+    extract = (time.perf_counter() - start) / args.rounds
+    
+    # 内存：构建文档加提取的峰值，以及只保留解析结果时占用的内存
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = parse_search_page(html, features=args.features)
+    peak = tracemalloc.get_traced_memory()[1]
+    # 文档树有父子循环引用，回收后剩下的才是解析结果本身
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    
+    cards = stats.cards
+    probe_time = miss_cost(soup, page.selector, stats, args.rounds) * stats.misses
+    print(f"{fixture.name:<28} {len(html) / 1024:>6.0f}KiB {cards:>3} cards  "
+          f"build {build * 1000:>6.2f}ms  extract {extract * 1000:>6.2f}ms  "
+          f"{cards / (build + extract):>7.0f} cards/s ({cards / extract:>7.0f} extract only)  "
+          f"peak {(peak - baseline) / 1024:>6.0f}KiB  retained {(retained - baseline) / 1024:>5.1f}KiB  "
+          f"probes/card {stats.probes / cards:>4.1f}  misses/card {stats.misses / cards:>4.1f}  "
+          f"miss probes {probe_time / extract * 100:>4.1f}% of extract")
+    return cards, build, extract
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索页解析基准")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="夹具目录")
+    parser.add_argument("--features", default="html.parser", help="BeautifulSoup使用的HTML解析器")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    logger.remove()
+    
+    fixtures = load_fixtures(args.fixtures, "search")
+    if not fixtures:
+        print(f"{args.fixtures} 中没有搜索页夹具")
+        return
+    results = [r for r in (bench_fixture(fixture, args) for fixture in fixtures) if r is not None]
+    cards = sum(r[0] for r in results)
+    build = sum(r[1] for r in results)
+    extract = sum(r[2] for r in results)
+    print(f"{'total':<28} {cards} cards in {(build + extract) * 1000:.2f}ms per pass, "
+          f"{cards / (build + extract):.0f} cards/s, document build {build / (build + extract) * 100:.0f}% of time")
+
+if __name__ == "__main__":
+    main()
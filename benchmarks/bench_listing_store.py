@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地商品库基准
+
+比较逐条提交和批量事务写入的吞吐量，以及按关键词、卖家和商品ID查询的延迟。
+
+用法:
+    python benchmarks/bench_listing_store.py --listings 20000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models.listing import Listing
+from app.services.listing_store import ListingStore
+
+QUERIES = ["iphone 13", "switch oled", "索尼 a7m4", "大疆 mini 3", "戴森 v12"]
+
+def generate(n: int, seed: int = 3):
+    rng = random.Random(seed)
+    batches = []
+    for i in range(n):
+        query = rng.choice(QUERIES)
+        batches.append((query, Listing(
+            id=str(100000 + i), title=f"{query} {rng.choice(['95新', '99新', '9成新'])}",
+            price=round(rng.uniform(200, 8000), 2), seller_name=f"卖家{i % 500}", seller_id=f"seller_{i % 500}",
+            location="上海", description="", url=f"https://www.goofish.com/item?id={100000 + i}"
+        )))
+    return batches
+
+def timed(label: str, func, count: int):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:>8.3f}s {count / elapsed:>10.0f}/s")
+
+async def run(args):
+    records = generate(args.listings)
+    directory = tempfile.mkdtemp()
+    
+    # 逐条提交：每个商品一个事务
+    single = ListingStore(os.path.join(directory, "single.db"))
+    count = min(args.listings, args.single_limit)
+    timed("insert one per commit", lambda: [single._write([(q, p, time.time())]) for q, p in records[:count]], count)
+    
+    # 批量事务
+    batched = ListingStore(os.path.join(directory, "batched.db"))
+    def write_batches():
+        for i in range(0, len(records), args.batch_size):
+            batched._write([(q, p, time.time()) for q, p in records[i:i + args.batch_size]])
+    timed(f"insert batch={args.batch_size}", write_batches, len(records))
+    timed("re-upsert (already stored)", write_batches, len(records))
+    
+    for label, query in [
+        ("search by query", lambda: batched.search("iphone 13", 3000, limit=50)),
+        ("listings by seller", lambda: batched.seller_listings("seller_42")),
+        ("listing by item id", lambda: batched.get_listing("100042")),
+    ]:
+        start = time.perf_counter()
+        for _ in range(args.lookups):
+            await query()
+        print(f"{label:<28} {(time.perf_counter() - start) / args.lookups * 1000:>8.3f}ms")
+        
+    await single.stop()
+    await batched.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="本地商品库基准")
+    parser.add_argument("--listings", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--single-limit", type=int, default=2000, help="逐条提交最多写入的数量")
+    parser.add_argument("--lookups", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+价格解析基准
+
+在标注语料 price_corpus.jsonl 上比较原来的正则提取（卖家回复取第一个数字、
+提到优惠时随机减5-15元；商品价格取第一个数字串）与 price_parser 的准确率，
+并测量每秒可解析的消息数。
+
+用法:
+    python benchmarks/bench_price_parser.py --repeat 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.price_parser import extract_offer, parse_price
+
+CORPUS = os.path.join(os.path.dirname(__file__), "price_corpus.jsonl")
+
+_rng = random.Random(7)
+
+def old_extract_offer(response: str, current_price: float):
+    """原 NegotiationAgent._extract_price_from_response 的逻辑"""
+    for pattern in [r'(\d+\.?\d*)元', r'(\d+\.?\d*)块', r'(\d+\.?\d*)']:
+        matches = re.findall(pattern, response)
+        if matches:
+            try:
+                price = float(matches[0])
+                if 0 < price < current_price * 2:
+                    return price
+            except ValueError:
+                continue
+    if any(keyword in response for keyword in ["优惠", "便宜", "减"]):
+        return max(current_price - _rng.uniform(5, 15), current_price * 0.8)
+    return None
+
+def old_parse_price(text: str):
+    """原 GoofishService.search_products 的逻辑"""
+    match = re.search(r'[\d.]+', text)
+    return float(match.group()) if match else None
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def run(rows, offer_func, price_func):
+    results = []
+    for row in rows:
+        if row["kind"] == "offer":
+            results.append(offer_func(row["text"], row["current"]))
+        else:
+            results.append(price_func(row["text"]))
+    return results
+
+def accuracy(label: str, rows, offer_func, price_func, verbose: bool):
+    results = run(rows, offer_func, price_func)
+    correct = 0
+    for row, got in zip(rows, results):
+        expected = row["expected"]
+        ok = got == expected if expected is None or got is None else abs(got - expected) < 0.01
+        correct += ok
+        if verbose and not ok:
+            print(f"  [{label}] {row['text']!r}: expected {expected}, got {got}")
+    print(f"{label:<16} accuracy {correct}/{len(rows)} ({correct / len(rows):.0%})")
+
+def throughput(label: str, rows, offer_func, price_func, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run(rows, offer_func, price_func)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {len(rows) * repeat / elapsed:>10.0f} msgs/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="价格解析基准")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--verbose", action="store_true", help="打印解析错误的样本")
+    args = parser.parse_args()
+    
+    rows = load_corpus()
+    accuracy("old regex", rows, old_extract_offer, old_parse_price, args.verbose)
+    accuracy("price_parser", rows, extract_offer, parse_price, args.verbose)
+    throughput("old regex", rows, old_extract_offer, old_parse_price, args.repeat)
+    throughput("price_parser", rows, extract_offer, parse_price, args.repeat)
+
+if __name__ == "__main__":
+    main()
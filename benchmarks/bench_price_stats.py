@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+市场价格统计基准
+
+用对数正态分布加少量配件低价和离谱高价模拟一个查询的成交挂牌价，比较：
+- 保存全部样本、每次查询时排序求分位数
+- P²流式分位数（PriceStats）
+
+输出每次更新和查询的耗时、内存占用以及四分位数的相对误差。
+
+用法:
+    python benchmarks/bench_price_stats.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.price_stats import PriceStats
+
+def generate(n: int, seed: int = 5):
+    rng = random.Random(seed)
+    prices = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.1:
+            prices.append(round(rng.uniform(10, 80), 2))  # 配件、求购等低价
+        elif kind < 0.13:
+            prices.append(round(rng.uniform(9000, 20000), 2))  # 离谱高价
+        else:
+            prices.append(round(rng.lognormvariate(8.0, 0.15), 2))  # 中位数约3000
+    return prices
+
+def exact_quartiles(samples):
+    ordered = sorted(samples)
+    return [ordered[min(int(p * len(ordered)), len(ordered) - 1)] for p in (0.25, 0.5, 0.75)]
+
+def main():
+    parser = argparse.ArgumentParser(description="市场价格统计基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+    
+    print(f"{'n':>7} {'method':<8} {'update us':>10} {'lookup us':>10} {'state':>9} {'q1 err':>7} {'med err':>7} {'q3 err':>7}")
+    for n in args.sizes:
+        prices = generate(n)
+        truth = exact_quartiles(prices)
+        
+        # 全量样本
+        samples = []
+        start = time.perf_counter()
+        for price in prices:
+            samples.append(price)
+        update = (time.perf_counter() - start) / n * 1e6
+        start = time.perf_counter()
+        for _ in range(args.lookups):
+            exact_quartiles(samples)
+        lookup = (time.perf_counter() - start) / args.lookups * 1e6
+        print(f"{n:>7} {'exact':<8} {update:>10.3f} {lookup:>10.1f} {len(samples):>9} {0:>7.3f} {0:>7.3f} {0:>7.3f}")
+        
+        # 流式分位数，去重键为空以计入所有样本
+        stats = PriceStats()
+        start = time.perf_counter()
+        for price in prices:
+            stats.add(price)
+        update = (time.perf_counter() - start) / n * 1e6
+        start = time.perf_counter()
+        for _ in range(args.lookups):
+            estimate = [stats.q1, stats.median, stats.q3]
+        lookup = (time.perf_counter() - start) / args.lookups * 1e6
+        errors = [abs(e - t) / t for e, t in zip(estimate, truth)]
+        print(f"{n:>7} {'p2':<8} {update:>10.3f} {lookup:>10.1f} {15:>9} "
+              f"{errors[0]:>7.3f} {errors[1]:>7.3f} {errors[2]:>7.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+商品排序基准
+
+生成混有配件、求购、故障机和其他型号的合成候选集，比较：
+- 旧的按价格取最便宜的前k个
+- RankingEngine 向量化打分 + 部分排序
+
+输出耗时以及前k个中符合需求的比例。
+
+用法:
+    python benchmarks/bench_ranking.py --sizes 100 1000 5000 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models.listing import Listing
+from app.services.ranking import RankingEngine
+
+ANALYSIS = {
+    "keywords": ["iPhone 13", "苹果13"],
+    "category": "手机",
+    "features": ["128G", "国行"],
+    "price_sensitivity": "medium",
+    "quality_requirements": "95新以上"
+}
+
+GOOD_CONDITIONS = ["99新", "95新", "准新", "全新未拆"]
+LOW_CONDITIONS = ["8成新", "7成新 有划痕", "9成新"]
+SPECS = ["128G", "256G", "国行", "港版", "黑色", "白色"]
+# 偏离需求的商品标题模板和价格区间(相对正常价格)
+OFF_TARGET = [
+    ("iPhone 13 手机壳 {spec}", (0.01, 0.05)),
+    ("求购 iPhone 13 {spec}", (0.5, 0.9)),
+    ("iPhone 13 故障 不开机 {spec}", (0.15, 0.3)),
+    ("iPhone 13 钢化膜 两片装", (0.005, 0.02)),
+    ("苹果13 空盒 {spec}", (0.01, 0.03)),
+]
+OTHER_MODELS = ["华为Mate60 {spec} 95新", "小米14 {spec} 99新", "iPhone 12 {spec} 95新"]
+
+def generate(n: int, seed: int = 11):
+    """生成n个候选，返回 (商品列表, 是否符合需求)"""
+    rng = random.Random(seed)
+    products, good = [], []
+    for i in range(n):
+        kind = rng.random()
+        base = rng.uniform(2600, 3600)
+        spec = rng.choice(SPECS)
+        if kind < 0.35:
+            title = f"iPhone 13 {spec} {rng.choice(SPECS)} {rng.choice(GOOD_CONDITIONS)}"
+            ok = True
+        elif kind < 0.55:
+            title = f"苹果13 {spec} {rng.choice(LOW_CONDITIONS)}"
+            base *= 0.8
+            ok = False
+        elif kind < 0.8:
+            template, (low, high) = rng.choice(OFF_TARGET)
+            title = template.format(spec=spec)
+            base *= rng.uniform(low, high)
+            ok = False
+        else:
+            title = rng.choice(OTHER_MODELS).format(spec=spec)
+            base *= rng.uniform(0.6, 1.2)
+            ok = False
+        products.append(Listing(
+            id=f"item_{i}", title=title, price=round(base, 2), seller_name=f"卖家{i}", seller_id=f"seller_{i}",
+            location="上海", description="", url=f"https://www.goofish.com/item?id={i}"
+        ))
+        good.append(ok)
+    return products, good
+
+def run_cheapest(products, analysis, k):
+    return sorted(products, key=lambda x: x.price)[:k]
+
+def run_engine(engine):
+    return lambda products, analysis, k: engine.rank(products, analysis, k)
+
+def main():
+    parser = argparse.ArgumentParser(description="商品排序基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 20000])
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    engine = RankingEngine()
+    methods = [("cheapest", run_cheapest), ("ranking", run_engine(engine))]
+    
+    print(f"{'n':>7} {'method':<10} {'ms':>9} {'good@k':>7}")
+    for n in args.sizes:
+        products, good = generate(n)
+        is_good = {p.id: ok for p, ok in zip(products, good)}
+        for name, run in methods:
+            run(products, ANALYSIS, args.top_k)  # 预热
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                selected = run(products, ANALYSIS, args.top_k)
+            elapsed = (time.perf_counter() - start) / args.repeat * 1000
+            hit_rate = sum(is_good[p.id] for p in selected) / len(selected)
+            print(f"{n:>7} {name:<10} {elapsed:>9.2f} {hit_rate:>7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+录制页面回放
+
+不启动浏览器，用 listing_parser 解析录制的搜索页和详情页，与保存的期望结果对比，
+解析结果有变化时列出差异并以非零状态退出。夹具由 PAGE_RECORD_DIR 录制，
+或使用 benchmarks/fixtures 中自带的页面。
+
+用法:
+    python benchmarks/replay_fixtures.py                      # 对比期望结果
+    python benchmarks/replay_fixtures.py --update             # 重新生成期望结果
+    python benchmarks/replay_fixtures.py --fixtures data/pages
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+from app.services.listing_parser import parse_search_page, parse_detail
+from app.services.page_recorder import load_fixtures, PageFixture
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def replay(fixture: PageFixture, features: str):
+    """按录制时的参数解析页面，返回可以JSON序列化的结果"""
+    html = fixture.read()
+    if fixture.kind == "search":
+        return parse_search_page(html, features=features).to_dict()
+    return parse_detail(html, features=features).to_dict()
+
+def diff(expected, actual, path: str = ""):
+    """逐字段列出不同之处"""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(set(expected) | set(actual)):
+            yield from diff(expected.get(key), actual.get(key), f"{path}.{key}" if path else key)
+    elif isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            yield from diff(a, b, f"{path}[{i}]")
+    elif expected != actual:
+        yield f"{path}: {expected!r} -> {actual!r}"
+
+def main():
+    parser = argparse.ArgumentParser(description="录制页面回放")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="夹具目录")
+    parser.add_argument("--update", action="store_true", help="用当前解析结果覆盖期望结果")
+    parser.add_argument("--features", default="html.parser", help="BeautifulSoup使用的HTML解析器")
+    args = parser.parse_args()
+    # 解析失败的警告会在差异中体现
+    logger.remove()
+    
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"{args.fixtures} 中没有夹具")
+        return 1
+        
+    changed = 0
+    for fixture in fixtures:
+        actual = replay(fixture, args.features)
+        if args.update or not os.path.exists(fixture.expected_path):
+            with open(fixture.expected_path, "w", encoding="utf-8") as f:
+                json.dump(actual, f, ensure_ascii=False, indent=2)
+            print(f"saved    {fixture.kind}/{fixture.name}")
+            continue
+        with open(fixture.expected_path, "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        differences = list(diff(expected, actual))
+        if differences:
+            changed += 1
+            print(f"CHANGED  {fixture.kind}/{fixture.name}")
+            for line in differences[:20]:
+                print(f"    {line}")
+        else:
+            print(f"ok       {fixture.kind}/{fixture.name}")
+            
+    print(f"{len(fixtures)} fixtures, {changed} changed")
+    return 1 if changed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,9 +23,121 @@ class Settings:
     # 咸鱼相关配置
     XIANYU_BASE_URL: str = "https://www.goofish.com/"
     XIANYU_LOGIN_URL: str = "https://www.goofish.com/"
+    # 市场后端: browser 通过Chrome访问咸鱼; simulated 访问 MARKETPLACE_SIM_URL 上的模拟市场，不启动浏览器（压测用）
+    MARKETPLACE_BACKEND: str = os.getenv("MARKETPLACE_BACKEND", "browser")
+    MARKETPLACE_SIM_URL: str = os.getenv("MARKETPLACE_SIM_URL", "http://127.0.0.1:8900")
+    MARKETPLACE_SIM_CONNECTIONS: int = int(os.getenv("MARKETPLACE_SIM_CONNECTIONS", "100"))  # 到模拟市场的最大并发连接数
+    MARKETPLACE_SIM_TIMEOUT: float = float(os.getenv("MARKETPLACE_SIM_TIMEOUT", "30"))  # 模拟市场请求超时(秒)
     
     # Agent配置
     MAX_CONCURRENT_AGENTS: int = 5
     AGENT_TIMEOUT: int = 300  # 5分钟超时
+    NEGOTIATION_TIMEOUT: int = int(os.getenv("NEGOTIATION_TIMEOUT", "120"))  # 单个谈判的截止时间(秒)
+    BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", "50"))  # 单个批量请求的最大查询数
+    BATCH_MAX_RESULTS: int = int(os.getenv("BATCH_MAX_RESULTS", "200"))  # 保留汇总结果的最近批次数
+    
+    # 搜索缓存配置
+    SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", "600"))  # 缓存有效期(秒)，过期后增量刷新
+    SEARCH_CACHE_PRICE_BUCKET: float = float(os.getenv("SEARCH_CACHE_PRICE_BUCKET", "500"))  # 价格上限档位
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "256"))
+    SEARCH_CACHE_MAX_LISTINGS: int = int(os.getenv("SEARCH_CACHE_MAX_LISTINGS", "50"))  # 每个条目保留的商品数
+    
+    # 监控列表配置
+    WATCHLIST_FILE: str = os.getenv("WATCHLIST_FILE", "data/watchlist.json")
+    WATCHLIST_INTERVAL: float = float(os.getenv("WATCHLIST_INTERVAL", "300"))  # 默认检查间隔(秒)
+    WATCHLIST_MIN_INTERVAL: float = float(os.getenv("WATCHLIST_MIN_INTERVAL", "30"))
+    WATCHLIST_JITTER: float = float(os.getenv("WATCHLIST_JITTER", "0.2"))  # 间隔的随机抖动比例
+    WATCHLIST_MAX_SEEN: int = int(os.getenv("WATCHLIST_MAX_SEEN", "2000"))  # 每个监控记住的商品数
+    WATCHLIST_SAVE_DELAY: float = float(os.getenv("WATCHLIST_SAVE_DELAY", "5"))  # 检查结果合并写入文件的延迟(秒)
+    
+    # 启动预热配置
+    PREWARM_BROWSERS: int = int(os.getenv("PREWARM_BROWSERS", "1"))  # 预先启动的Chrome数量
+    WARMUP_TIMEOUT: float = float(os.getenv("WARMUP_TIMEOUT", "30"))  # 单项预热的最长时间(秒)
+    
+    # 关闭与资源回收配置
+    SHUTDOWN_DRAIN_TIMEOUT: float = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))  # 关闭时等待运行中任务的时间(秒)
+    ORPHAN_REAP_INTERVAL: float = float(os.getenv("ORPHAN_REAP_INTERVAL", "300"))  # 孤儿Chrome回收间隔(秒)，0为关闭
+    
+    # 追踪配置
+    TRACE_MAX_TASKS: int = int(os.getenv("TRACE_MAX_TASKS", "200"))  # 保留Span的最近任务数
+    TRACE_MAX_SPANS_PER_TASK: int = int(os.getenv("TRACE_MAX_SPANS_PER_TASK", "500"))
+    TRACE_STATS_WINDOW: int = int(os.getenv("TRACE_STATS_WINDOW", "500"))  # 计算分位数的最近样本数
+    
+    # 近似重复商品识别配置
+    DEDUP_HAMMING_THRESHOLD: int = int(os.getenv("DEDUP_HAMMING_THRESHOLD", "12"))  # 标题指纹最大汉明距离(64位)，越大越宽松
+    DEDUP_SHINGLE_SIZE: int = int(os.getenv("DEDUP_SHINGLE_SIZE", "2"))  # 标题片段长度
+    DEDUP_PRICE_TOLERANCE: float = float(os.getenv("DEDUP_PRICE_TOLERANCE", "0.15"))  # 视为同一件的价格差比例
+    DEDUP_SAME_SELLER: bool = os.getenv("DEDUP_SAME_SELLER", "True").lower() == "true"  # 只合并同一卖家的商品
+    
+    # 商品排序配置
+    RANKING_TOP_K: int = int(os.getenv("RANKING_TOP_K", "10"))  # 筛选后保留的商品数量
+    
+    # 市场价格统计配置
+    PRICE_STATS_FILE: str = os.getenv("PRICE_STATS_FILE", "data/price_stats.json")
+    PRICE_STATS_MIN_SAMPLES: int = int(os.getenv("PRICE_STATS_MIN_SAMPLES", "20"))  # 样本少于该数量时不使用市场目标价
+    PRICE_STATS_MAX_KEYS: int = int(os.getenv("PRICE_STATS_MAX_KEYS", "2000"))  # 最多统计的查询数
+    PRICE_STATS_SAVE_INTERVAL: float = float(os.getenv("PRICE_STATS_SAVE_INTERVAL", "60"))  # 保存到文件的最短间隔(秒)
+    
+    # 本地商品库配置
+    LISTING_STORE_ENABLED: bool = os.getenv("LISTING_STORE_ENABLED", "True").lower() == "true"
+    LISTING_STORE_PATH: str = os.getenv("LISTING_STORE_PATH", "data/listings.db")
+    LISTING_STORE_BATCH_SIZE: int = int(os.getenv("LISTING_STORE_BATCH_SIZE", "500"))  # 每个写入事务的商品数
+    LISTING_STORE_FLUSH_INTERVAL: float = float(os.getenv("LISTING_STORE_FLUSH_INTERVAL", "2"))  # 缓冲写入的最长间隔(秒)
+    LISTING_STORE_MAX_PENDING: int = int(os.getenv("LISTING_STORE_MAX_PENDING", "50000"))  # 缓冲的最大商品数
+    LISTING_STORE_FALLBACK_AGE: float = float(os.getenv("LISTING_STORE_FALLBACK_AGE", "86400"))  # 抓取失败时可用的已保存商品的最长时间(秒)
+    
+    # 商品图片配置
+    IMAGE_PIPELINE_ENABLED: bool = os.getenv("IMAGE_PIPELINE_ENABLED", "True").lower() == "true"
+    IMAGE_CACHE_DIR: str = os.getenv("IMAGE_CACHE_DIR", "data/images")  # 按内容哈希存放图片和缩略图
+    IMAGE_CONCURRENCY: int = int(os.getenv("IMAGE_CONCURRENCY", "8"))  # 同时下载的图片数
+    IMAGE_PER_HOST_LIMIT: int = int(os.getenv("IMAGE_PER_HOST_LIMIT", "4"))  # 同一域名同时下载的图片数
+    IMAGE_QUEUE_SIZE: int = int(os.getenv("IMAGE_QUEUE_SIZE", "2000"))  # 等待下载的最大图片数，超出时丢弃
+    IMAGE_FETCH_TIMEOUT: float = float(os.getenv("IMAGE_FETCH_TIMEOUT", "15"))  # 单张图片下载超时(秒)
+    IMAGE_MAX_BYTES: int = int(os.getenv("IMAGE_MAX_BYTES", str(5 * 1024 * 1024)))  # 单张图片最大字节数
+    IMAGE_MAX_PER_LISTING: int = int(os.getenv("IMAGE_MAX_PER_LISTING", "4"))  # 每个商品下载的图片数
+    IMAGE_THUMBNAIL_SIZE: int = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "256"))  # 缩略图最长边(像素)
+    IMAGE_HASH_THRESHOLD: int = int(os.getenv("IMAGE_HASH_THRESHOLD", "6"))  # 视为同一张照片的dHash最大汉明距离
+    IMAGE_INDEX_MAX_ENTRIES: int = int(os.getenv("IMAGE_INDEX_MAX_ENTRIES", "50000"))  # 内存中保留的图片记录数
+    
+    # 商品详情补全配置
+    DETAIL_ENRICH_ENABLED: bool = os.getenv("DETAIL_ENRICH_ENABLED", "True").lower() == "true"
+    DETAIL_PREFETCH: int = int(os.getenv("DETAIL_PREFETCH", "30"))  # 去重后预取详情的最大商品数
+    DETAIL_CONCURRENCY: int = int(os.getenv("DETAIL_CONCURRENCY", "8"))  # 连接池的最大并发请求数
+    DETAIL_PER_HOST_LIMIT: int = int(os.getenv("DETAIL_PER_HOST_LIMIT", "4"))  # 同一域名的最大并发请求数
+    DETAIL_FETCH_TIMEOUT: float = float(os.getenv("DETAIL_FETCH_TIMEOUT", "8"))  # 单个详情页请求超时(秒)
+    DETAIL_CACHE_TTL: float = float(os.getenv("DETAIL_CACHE_TTL", "3600"))  # 详情缓存有效期(秒)
+    DETAIL_CACHE_MAX_ENTRIES: int = int(os.getenv("DETAIL_CACHE_MAX_ENTRIES", "5000"))
+    DETAIL_USER_AGENT: str = os.getenv(
+        "DETAIL_USER_AGENT",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    )
+    
+    # 页面录制配置（离线回放和解析器基准的夹具）
+    PAGE_RECORD_DIR: str = os.getenv("PAGE_RECORD_DIR", "")  # 保存抓取到的搜索页和详情页的目录，为空时不录制
+    PAGE_RECORD_MAX_PAGES: int = int(os.getenv("PAGE_RECORD_MAX_PAGES", "500"))  # 每次运行最多录制的页面数
+    
+    # 卖家画像配置
+    SELLER_PROFILE_TTL: float = float(os.getenv("SELLER_PROFILE_TTL", "259200"))  # 画像和谈判记录的有效期(秒)
+    SELLER_PROFILE_MAX_ENTRIES: int = int(os.getenv("SELLER_PROFILE_MAX_ENTRIES", "20000"))  # 最多缓存的卖家数
+    SELLER_PRIORITY_BAND: int = int(os.getenv("SELLER_PRIORITY_BAND", "3"))  # 按匹配度排名每多少个商品为一档，档内按卖家预计等待时间排序
+    
+    # 卖家消息配置
+    SELLER_REPLY_TIMEOUT: float = float(os.getenv("SELLER_REPLY_TIMEOUT", "60"))  # 等待卖家回复的最长时间(秒)
+    INBOX_POLL_INTERVAL: float = float(os.getenv("INBOX_POLL_INTERVAL", "0.5"))  # 收件箱扫描会话的间隔(秒)
+    
+    # WebSocket配置
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))  # 每个连接的发送队列长度
+    # 发送队列满时的策略: drop_oldest 丢弃最旧消息; disconnect 断开慢客户端
+    WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+    WS_CHUNK_SIZE: int = int(os.getenv("WS_CHUNK_SIZE", "65536"))  # 超过该字符数的结果分块发送
+    SSE_HEARTBEAT_INTERVAL: float = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))  # SSE保活间隔(秒)
+    
+    # 提前结束配置
+    # cancel: 有谈判达到满意价格后立即取消其余谈判
+    # deprioritize: 其余谈判完成当前轮次后结束
+    # off: 不提前结束
+    EARLY_STOP_MODE: str = os.getenv("EARLY_STOP_MODE", "cancel")
+    # 成交价不高于 目标价格 * 该比例 即视为"足够好"
+    GOOD_ENOUGH_PRICE_RATIO: float = float(os.getenv("GOOD_ENOUGH_PRICE_RATIO", "1.0"))
 
 settings = Settings() 
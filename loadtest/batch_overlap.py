@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批量比价重叠查询检查
+
+同一账号在一个批次中提交关键词重叠的查询，它们会从同一批搜索结果中选中相同的卖家，
+并共用一个聊天会话。检查模拟市场没有收到交错的对话（上一条回复未取走就又向同一卖家发消息），
+并且每个查询都完成了比价。有交错或查询失败时以非零状态退出。
+
+用法:
+    python loadtest/batch_overlap.py
+    python loadtest/batch_overlap.py --queries "iPhone 13" "iPhone 13 128G" "iPhone 13 国行" --reply-latency 0.5
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import aiohttp
+from marketplace import start_marketplace
+from llm_stub import start_llm_stub
+from run import LoadTest, build_parser
+
+async def run_batch(test: LoadTest) -> dict:
+    args = test.args
+    body = {"requests": [
+        {"query": query, "max_price": args.max_price, "credentials": {"username": "overlap", "password": "loadtest"}}
+        for query in args.queries
+    ]}
+    async with test.session.post(f"{test.base_url}/api/batch_comparison", json=body) as response:
+        batch_id = (await response.json())["batch_id"]
+    deadline = asyncio.get_running_loop().time() + args.timeout
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(args.poll_interval)
+        async with test.session.get(f"{test.base_url}/api/batch/{batch_id}") as response:
+            data = await response.json()
+        if data.get("status") == "completed":
+            return data["result"]
+    raise RuntimeError(f"批次 {batch_id} 超时未完成")
+
+async def run(args) -> bool:
+    test = LoadTest(args)
+    test.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None))
+    sim_runner, marketplace = await start_marketplace(args, "127.0.0.1", args.sim_port)
+    llm_runner, _ = await start_llm_stub("127.0.0.1", args.llm_port, args.llm_latency, args.jitter)
+    try:
+        if not args.app_url:
+            await test.start_app(tempfile.mkdtemp(prefix="loadtest_"))
+        else:
+            await test.wait_ready()
+        result = await run_batch(test)
+    finally:
+        await test.stop_app()
+        await test.session.close()
+        await sim_runner.cleanup()
+        await llm_runner.cleanup()
+        
+    interleaved = marketplace.requests["chat_interleaved"]
+    failed = [task["task_id"] for task in result["tasks"] if not task["success"]]
+    print(f"batch success {result['success']}, {len(result['tasks'])} queries, "
+          f"{result['searched_keywords']} keywords searched, failed {failed}")
+    print(f"marketplace requests {dict(marketplace.requests)}")
+    print(f"interleaved conversations: {interleaved}")
+    return result["success"] and not failed and len(result["tasks"]) == len(args.queries) and interleaved == 0
+
+def main():
+    parser = build_parser("批量比价重叠查询检查")
+    parser.set_defaults(queries=["iPhone 13", "iPhone 13 128G"], llm_latency=0.1, reply_latency=0.5, timeout=120)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM替身
+
+实现压测用到的 OpenAI 兼容接口（/v1/models、/v1/chat/completions），按提示词类型返回固定格式的结果：
+需求分析返回JSON，谈判返回带目标价的消息。同样的输入总是得到同样的输出，延迟可以配置。
+应用把 DEEPSEEK_BASE_URL 指向这里、DEEPSEEK_API_KEY 设为任意非空值即可使用。
+
+用法:
+    python loadtest/llm_stub.py --port 8901 --llm-latency 0.6
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, Any, List, Tuple
+
+from aiohttp import web
+
+_TARGET = re.compile(r"目标价格：\s*([\d.]+)")
+_NUMBERED = re.compile(r"^\s*\d+\.\s*(.+)$", re.MULTILINE)
+
+def analysis(query: str) -> Dict[str, Any]:
+    return {
+        "keywords": query.split()[:3] or [query],
+        "category": "数码产品",
+        "features": query.split()[1:],
+        "price_sensitivity": "medium",
+        "quality_requirements": "良好"
+    }
+
+def complete(messages: List[Dict[str, str]]) -> str:
+    """根据提示词生成确定的回复"""
+    user = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+    if "请分析这些商品需求" in user:
+        return json.dumps([analysis(query) for query in _NUMBERED.findall(user)], ensure_ascii=False)
+    if "请分析这个商品需求：" in user:
+        return json.dumps(analysis(user.split("请分析这个商品需求：", 1)[1].strip()), ensure_ascii=False)
+    match = _TARGET.search(user)
+    if match and float(match.group(1)) > 0:
+        return f"您好，诚心想要，{float(match.group(1)):.0f}元可以吗？今天就能付款。"
+    if "谈判" in user or "目标价格" in user:
+        return "您好，我对这个商品很感兴趣，请问价格还能优惠一些吗？"
+    return "好的，我明白了。"
+
+class LLMStub:
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(51)
+        self.requests: Counter = Counter()
+        
+    async def models(self, request: web.Request) -> web.Response:
+        self.requests["models"] += 1
+        return web.json_response({
+            "object": "list",
+            "data": [{"id": "deepseek-reasoner", "object": "model", "created": 0, "owned_by": "stub"}]
+        })
+        
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        self.requests["chat_completions"] += 1
+        body = await request.json()
+        content = complete(body.get("messages", []))
+        if self.latency > 0:
+            await asyncio.sleep(self.latency * (1 + self.jitter * self.rng.uniform(-1, 1)))
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", []))
+        return web.json_response({
+            "id": f"chatcmpl-stub-{self.requests['chat_completions']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "deepseek-reasoner"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content),
+                "total_tokens": prompt_tokens + len(content)
+            }
+        })
+        
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": dict(self.requests)})
+        
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/models", self.models)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+async def start_llm_stub(host: str, port: int, latency: float, jitter: float) -> Tuple[web.AppRunner, LLMStub]:
+    """在当前事件循环中启动LLM替身"""
+    stub = LLMStub(latency, jitter)
+    runner = web.AppRunner(stub.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, stub
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--llm-latency", type=float, default=0.6, help="每次补全的延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="延迟的随机浮动比例")
+    args = parser.parse_args()
+    web.run_app(LLMStub(args.llm_latency, args.jitter).app(), host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模拟市场
+
+压测用的本地咸鱼替身，提供登录、搜索结果页、商品详情页、商品图片和卖家聊天接口，
+每个接口的延迟可以单独配置。同一关键词每次返回相同的商品，卖家按固定的让价规则回复，
+不需要访问外网。应用以 MARKETPLACE_BACKEND=simulated 启动时连接这里。
+
+用法:
+    python loadtest/marketplace.py --port 8900 --search-latency 0.8 --reply-latency 1.5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import zlib
+from collections import Counter
+from html import escape
+from typing import Dict, Any, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aiohttp import web
+from app.services.price_parser import extract_offer
+
+_MODELS = ("128G", "256G", "512G", "国行", "港版", "无拆无修", "电池健康90%", "全套配件", "有小划痕", "自用")
+_CONDITIONS = ("全新", "99新", "95新", "9成新", "有划痕")
+_CREDITS = ("信用极好", "信用优秀", "信用良好", "芝麻信用720", "")
+_CITIES = ("北京", "上海", "广州", "深圳", "杭州", "成都")
+
+def add_latency_args(parser: argparse.ArgumentParser):
+    """模拟市场的延迟参数，压测驱动也使用同一组参数"""
+    parser.add_argument("--login-latency", type=float, default=0.3, help="登录接口延迟(秒)")
+    parser.add_argument("--search-latency", type=float, default=0.8, help="搜索结果页延迟(秒)")
+    parser.add_argument("--detail-latency", type=float, default=0.2, help="详情页和图片延迟(秒)")
+    parser.add_argument("--chat-latency", type=float, default=0.1, help="发送消息和拉取消息接口延迟(秒)")
+    parser.add_argument("--reply-latency", type=float, default=1.5, help="卖家回复前的等待时间(秒)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="延迟的随机浮动比例")
+    parser.add_argument("--cards", type=int, default=20, help="每个关键词的商品数")
+    parser.add_argument("--sellers", type=int, default=500, help="卖家总数，不同关键词的商品会出现同一卖家")
+    parser.add_argument("--base-price", type=float, default=4000, help="商品价格的中心值")
+
+class SimulatedMarketplace:
+    """模拟市场的状态：生成的商品、登录会话和每个会话的待投递回复"""
+    
+    def __init__(self, args: argparse.Namespace, base_url: str):
+        self.args = args
+        self.base_url = base_url.rstrip("/")
+        self.rng = random.Random(50)
+        self.sellers: Dict[str, float] = {}  # 卖家ID -> 该卖家最便宜的商品价格
+        self.sessions: Dict[str, Dict[str, int]] = {}  # 会话令牌 -> 卖家ID -> 已回复轮数
+        self.outbox: Dict[str, List[Tuple[float, str, str]]] = {}  # 会话令牌 -> (投递时间, 卖家ID, 消息)
+        self.requests: Counter = Counter()
+        
+    async def delay(self, base: float):
+        if base > 0:
+            await asyncio.sleep(base * (1 + self.args.jitter * self.rng.uniform(-1, 1)))
+            
+    def listings(self, query: str, count: int) -> List[Dict[str, Any]]:
+        """同一关键词每次生成相同的商品"""
+        rng = random.Random(zlib.crc32(query.encode("utf-8")))
+        items = []
+        for i in range(count):
+            item_id = 700000000000 + rng.randrange(10 ** 11)
+            seller_id = str(2200000000 + rng.randrange(self.args.sellers))
+            price = round(self.args.base_price * rng.uniform(0.5, 1.1))
+            items.append({
+                "id": item_id,
+                "title": f"{rng.choice(_CONDITIONS)} {query} {rng.choice(_MODELS)} {rng.choice(_MODELS)}",
+                "price": price,
+                "seller_id": seller_id,
+                "seller_name": f"卖家{seller_id[-4:]}",
+                "credit": rng.choice(_CREDITS)
+            })
+            self.sellers[seller_id] = min(self.sellers.get(seller_id, price), price)
+        return items
+        
+    def render_search(self, items: List[Dict[str, Any]]) -> str:
+        cards = []
+        for item in items:
+            credit = f'<span class="seller-credit">{item["credit"]}</span>' if item["credit"] else ""
+            cards.append(
+                f'<div class="item-card">'
+                f'<img data-src="{self.base_url}/img/{item["id"]}.jpg" src="{self.base_url}/img/placeholder.jpg">'
+                f'<a class="item-title" href="{self.base_url}/item?id={item["id"]}">{escape(item["title"])}</a>'
+                f'<div class="item-price">¥{item["price"]:,}</div>'
+                f'<a href="{self.base_url}/personal?userId={item["seller_id"]}">'
+                f'<span class="seller-name">{item["seller_name"]}</span></a>{credit}</div>'
+            )
+        return f'<html><body><div class="search-list">{"".join(cards)}</div></body></html>'
+        
+    def render_detail(self, item_id: int) -> str:
+        rng = random.Random(item_id)
+        return (
+            f'<html><head><meta name="description" content="闲置转让"></head><body>'
+            f'<div class="item-main"><img src="{self.base_url}/img/{item_id}.jpg">'
+            f'<img src="{self.base_url}/img/{item_id}_2.jpg"></div>'
+            f'<div class="desc--sim">自用闲置，成色：{rng.choice(_CONDITIONS)}，功能正常，支持验机</div>'
+            f'<div class="item-location">{rng.choice(_CITIES)}</div></body></html>'
+        )
+        
+    def seller_reply(self, token: str, seller_id: str, message: str) -> str:
+        """
+        卖家按轮次让价：每轮降5%，最多降15%；买家出价不低于当前要价时成交
+        """
+        rounds = self.sessions[token]
+        round_num = rounds.get(seller_id, 0)
+        rounds[seller_id] = round_num + 1
+        listed = self.sellers.get(seller_id, self.args.base_price)
+        ask = round(listed * max(1 - 0.05 * (round_num + 1), 0.85))
+        offer = extract_offer(message, listed)
+        if offer is not None and offer >= ask:
+            return f"行，{offer:.0f}元出给你"
+        if round_num == 0:
+            return f"在的，诚心要的话{ask}元"
+        return f"最低{ask}元，不能再少了"
+        
+    def token(self, request: web.Request) -> str:
+        token = request.headers.get("Authorization", "").replace("Bearer ", "", 1)
+        if token not in self.sessions:
+            raise web.HTTPUnauthorized()
+        return token
+        
+    async def login(self, request: web.Request) -> web.Response:
+        self.requests["login"] += 1
+        data = await request.json()
+        await self.delay(self.args.login_latency)
+        token = f"{data.get('username', '')}-{len(self.sessions)}-{self.rng.randrange(10 ** 8)}"
+        self.sessions[token] = {}
+        self.outbox[token] = []
+        return web.json_response({"token": token})
+        
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests["search"] += 1
+        self.token(request)
+        query = request.query.get("q", "")
+        # 不滚动时只有首屏的一半商品
+        count = self.args.cards if request.query.get("scroll") == "1" else max(self.args.cards // 2, 1)
+        await self.delay(self.args.search_latency)
+        return web.Response(text=self.render_search(self.listings(query, count)), content_type="text/html")
+        
+    async def detail(self, request: web.Request) -> web.Response:
+        self.requests["detail"] += 1
+        await self.delay(self.args.detail_latency)
+        return web.Response(text=self.render_detail(int(request.query.get("id", "0"))), content_type="text/html")
+        
+    async def image(self, request: web.Request) -> web.Response:
+        self.requests["image"] += 1
+        await self.delay(self.args.detail_latency)
+        seed = zlib.crc32(request.match_info["name"].encode("utf-8"))
+        return web.Response(body=b"\xff\xd8\xff\xe0" + random.Random(seed).randbytes(4000), content_type="image/jpeg")
+        
+    async def send(self, request: web.Request) -> web.Response:
+        self.requests["chat_send"] += 1
+        token = self.token(request)
+        data = await request.json()
+        await self.delay(self.args.chat_latency)
+        if any(seller_id == data["seller_id"] for _, seller_id, _ in self.outbox[token]):
+            # 上一条回复还没被取走就又发来消息：同一会话上有两个谈判在同时和这个卖家对话
+            self.requests["chat_interleaved"] += 1
+        reply = self.seller_reply(token, data["seller_id"], data.get("message", ""))
+        due = time.monotonic() + self.args.reply_latency * (1 + self.args.jitter * self.rng.uniform(-1, 1))
+        self.outbox[token].append((due, data["seller_id"], reply))
+        return web.json_response({"success": True})
+        
+    async def messages(self, request: web.Request) -> web.Response:
+        self.requests["chat_poll"] += 1
+        token = self.token(request)
+        await self.delay(self.args.chat_latency)
+        now = time.monotonic()
+        due = [item for item in self.outbox[token] if item[0] <= now]
+        self.outbox[token] = [item for item in self.outbox[token] if item[0] > now]
+        return web.json_response({"messages": [{"seller_id": s, "message": m} for _, s, m in due]})
+        
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "requests": dict(self.requests),
+            "sessions": len(self.sessions),
+            "sellers": len(self.sellers)
+        })
+        
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/login", self.login)
+        app.router.add_get("/search", self.search)
+        app.router.add_get("/item", self.detail)
+        app.router.add_get("/img/{name}", self.image)
+        app.router.add_post("/chat/send", self.send)
+        app.router.add_get("/chat/messages", self.messages)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+async def start_marketplace(args: argparse.Namespace, host: str, port: int) -> Tuple[web.AppRunner, SimulatedMarketplace]:
+    """在当前事件循环中启动模拟市场"""
+    marketplace = SimulatedMarketplace(args, f"http://{host}:{port}")
+    runner = web.AppRunner(marketplace.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, marketplace
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟市场")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_latency_args(parser)
+    args = parser.parse_args()
+    marketplace = SimulatedMarketplace(args, f"http://{args.host}:{args.port}")
+    web.run_app(marketplace.app(), host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+端到端压测
+
+在本机启动模拟市场和LLM替身，以 MARKETPLACE_BACKEND=simulated 启动应用子进程，
+通过HTTP（提交后带ETag轮询进度）和WebSocket（提交后等待推送结果）并发发起比价，报告：
+- 吞吐量和端到端延迟的 p50/p95/p99
+- 各阶段（stage.*）和外部调用（goofish.*、llm.*）Span耗时的 p50/p95/p99，取自 /api/tasks/{id}/trace
+- 应用进程的常驻内存（开始、峰值、结束）
+- 应用登记的浏览器数和本机的Chrome进程数
+全程不访问外网。
+
+用法:
+    python loadtest/run.py --comparisons 50 --concurrency 20 --mode mixed
+    python loadtest/run.py --comparisons 200 --concurrency 100 --search-latency 1.5 --json report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import aiohttp
+from marketplace import add_latency_args, start_marketplace
+from llm_stub import start_llm_stub
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TERMINAL = ("completed", "failed", "cancelled")
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+def rss_kib(pid: int) -> Optional[int]:
+    """进程的常驻内存(KiB)，非Linux或进程已退出时返回None"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def chrome_processes() -> int:
+    """本机正在运行的Chrome和chromedriver进程数"""
+    count = 0
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if b"chrome" in cmdline.lower():
+            count += 1
+    return count
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.base_url = args.app_url or f"http://127.0.0.1:{args.app_port}"
+        self.ws_url = self.base_url.replace("http", "ws", 1)
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.results: List[Dict[str, Any]] = []
+        self.spans: Dict[str, List[float]] = defaultdict(list)
+        self.memory: List[int] = []
+        self.browsers: List[int] = []
+        self.chrome: List[int] = []
+        
+    async def start_app(self, data_dir: str):
+        """以模拟后端启动应用子进程，等待就绪"""
+        env = dict(os.environ)
+        env.update({
+            "MARKETPLACE_BACKEND": "simulated",
+            "MARKETPLACE_SIM_URL": f"http://127.0.0.1:{self.args.sim_port}",
+            "DEEPSEEK_BASE_URL": f"http://127.0.0.1:{self.args.llm_port}/v1",
+            "DEEPSEEK_API_KEY": "loadtest",
+            "DEBUG": "False",
+            "PREWARM_BROWSERS": "0",
+            "WATCHLIST_FILE": os.path.join(data_dir, "watchlist.json"),
+            "PRICE_STATS_FILE": os.path.join(data_dir, "price_stats.json"),
+            "LISTING_STORE_PATH": os.path.join(data_dir, "listings.db"),
+            "IMAGE_CACHE_DIR": os.path.join(data_dir, "images")
+        })
+        log = open(os.path.join(data_dir, "app.log"), "wb")
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.args.app_port),
+            "--log-level", "warning", cwd=ROOT, env=env, stdout=log, stderr=log
+        )
+        print(f"app pid {self.process.pid}, log {log.name}")
+        await self.wait_ready()
+        
+    async def wait_ready(self):
+        deadline = time.monotonic() + self.args.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process is not None and self.process.returncode is not None:
+                raise RuntimeError("应用启动失败，见日志")
+            try:
+                async with self.session.get(f"{self.base_url}/readyz") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.25)
+        raise RuntimeError("等待应用就绪超时")
+        
+    async def stop_app(self):
+        if self.process is None or self.process.returncode is not None:
+            return
+        # SIGINT 走应用的正常关闭流程
+        self.process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=60)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+            
+    def request_body(self, n: int) -> Dict[str, Any]:
+        return {
+            "query": self.args.queries[n % len(self.args.queries)],
+            "max_price": self.args.max_price,
+            "credentials": {"username": f"loadtest{n % self.args.accounts}", "password": "loadtest"}
+        }
+        
+    async def compare_http(self, n: int) -> Dict[str, Any]:
+        """HTTP客户端：提交后带ETag轮询进度直到结束"""
+        async with self.session.post(f"{self.base_url}/api/start_comparison", json=self.request_body(n)) as response:
+            task_id = (await response.json())["task_id"]
+        etag = None
+        status = None
+        polls = 0
+        while status not in TERMINAL:
+            await asyncio.sleep(self.args.poll_interval)
+            polls += 1
+            headers = {"If-None-Match": etag} if etag else {}
+            async with self.session.get(f"{self.base_url}/api/task_progress/{task_id}", headers=headers) as response:
+                if response.status == 304:
+                    continue
+                data = await response.json()
+                etag = response.headers.get("ETag")
+            if data.get("success"):
+                status = data["progress"]["status"]
+        return {"task_id": task_id, "status": status, "polls": polls}
+        
+    async def compare_ws(self, n: int) -> Dict[str, Any]:
+        """WebSocket客户端：提交后等待推送的最终结果"""
+        client_id = f"loadtest_{os.getpid()}_{n}"
+        async with self.session.ws_connect(f"{self.ws_url}/ws/{client_id}") as ws:
+            await ws.send_json({"type": "start_comparison", "data": self.request_body(n)})
+            task_id = None
+            frames = 0
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                frames += 1
+                data = json.loads(message.data)
+                kind = data.get("type")
+                payload = data.get("data") or {}
+                if kind == "task_started":
+                    task_id = payload.get("task_id")
+                elif kind == "task_completed":
+                    return {"task_id": task_id, "status": "completed", "frames": frames}
+                elif kind == "result_chunk" and payload.get("message_type") == "task_completed" \
+                        and payload.get("index") == payload.get("total", 0) - 1:
+                    return {"task_id": task_id, "status": "completed", "frames": frames}
+                elif kind == "task_status" and payload.get("status") in ("failed", "cancelled"):
+                    return {"task_id": task_id, "status": payload["status"], "frames": frames}
+                elif kind == "error":
+                    return {"task_id": task_id, "status": "failed", "frames": frames}
+        return {"task_id": task_id, "status": "disconnected"}
+        
+    async def compare(self, n: int, limit: asyncio.Semaphore):
+        async with limit:
+            mode = self.args.mode if self.args.mode != "mixed" else ("http", "ws")[n % 2]
+            start = time.perf_counter()
+            try:
+                runner = self.compare_http if mode == "http" else self.compare_ws
+                result = await asyncio.wait_for(runner(n), timeout=self.args.timeout)
+            except asyncio.TimeoutError:
+                result = {"task_id": None, "status": "timeout"}
+            except Exception as e:
+                result = {"task_id": None, "status": f"error: {e!r}"}
+            result.update(mode=mode, latency=time.perf_counter() - start)
+            self.results.append(result)
+            if result["task_id"]:
+                await self.collect_spans(result["task_id"])
+                
+    async def collect_spans(self, task_id: str):
+        async with self.session.get(f"{self.base_url}/api/tasks/{task_id}/trace") as response:
+            data = await response.json()
+        for span in data.get("spans", []):
+            if span["duration"] is not None and span["name"].startswith(("stage.", "goofish.", "llm.")):
+                self.spans[span["name"]].append(span["duration"])
+                
+    async def sample(self, stop: asyncio.Event):
+        """定期采样应用内存和浏览器数"""
+        while not stop.is_set():
+            if self.process is not None:
+                rss = rss_kib(self.process.pid)
+                if rss is not None:
+                    self.memory.append(rss)
+            try:
+                async with self.session.get(f"{self.base_url}/api/metrics") as response:
+                    metrics = await response.json()
+                self.browsers.append(metrics["lifecycle"]["browsers"])
+            except (aiohttp.ClientError, KeyError, ValueError):
+                pass
+            self.chrome.append(chrome_processes())
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.args.sample_interval)
+            except asyncio.TimeoutError:
+                pass
+                
+    async def run(self) -> Dict[str, Any]:
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0), timeout=aiohttp.ClientTimeout(total=None)
+        )
+        sim_runner, marketplace = await start_marketplace(self.args, "127.0.0.1", self.args.sim_port)
+        llm_runner, llm = await start_llm_stub("127.0.0.1", self.args.llm_port, self.args.llm_latency, self.args.jitter)
+        data_dir = tempfile.mkdtemp(prefix="loadtest_")
+        try:
+            if not self.args.app_url:
+                await self.start_app(data_dir)
+            else:
+                await self.wait_ready()
+                
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(self.sample(stop))
+            limit = asyncio.Semaphore(self.args.concurrency)
+            start = time.perf_counter()
+            await asyncio.gather(*[self.compare(n, limit) for n in range(self.args.comparisons)])
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await sampler
+            
+            return self.report(elapsed, dict(marketplace.requests), dict(llm.requests))
+        finally:
+            await self.stop_app()
+            await self.session.close()
+            await sim_runner.cleanup()
+            await llm_runner.cleanup()
+            
+    def report(self, elapsed: float, marketplace: Dict[str, int], llm: Dict[str, int]) -> Dict[str, Any]:
+        by_status = defaultdict(int)
+        for result in self.results:
+            by_status[result["status"]] += 1
+        completed = [r["latency"] for r in self.results if r["status"] == "completed"]
+        
+        def summary(values: List[float]) -> Dict[str, float]:
+            return {
+                "count": len(values),
+                "p50": round(percentile(values, 0.50), 3),
+                "p95": round(percentile(values, 0.95), 3),
+                "p99": round(percentile(values, 0.99), 3),
+                "max": round(max(values), 3) if values else 0.0
+            }
+            
+        return {
+            "comparisons": len(self.results),
+            "concurrency": self.args.concurrency,
+            "mode": self.args.mode,
+            "elapsed": round(elapsed, 2),
+            "throughput": round(len(completed) / elapsed, 3) if elapsed else 0.0,
+            "status": dict(by_status),
+            "latency": summary(completed),
+            "stages": {name: summary(values) for name, values in sorted(self.spans.items())},
+            "memory_kib": {
+                "start": self.memory[0] if self.memory else None,
+                "peak": max(self.memory) if self.memory else None,
+                "end": self.memory[-1] if self.memory else None
+            },
+            "browsers": {"app_max": max(self.browsers, default=0), "chrome_processes_max": max(self.chrome, default=0)},
+            "marketplace_requests": marketplace,
+            "llm_requests": llm
+        }
+
+def print_report(report: Dict[str, Any]):
+    print(f"comparisons {report['comparisons']} (concurrency {report['concurrency']}, {report['mode']}) "
+          f"in {report['elapsed']}s: {report['throughput']} completed/s, status {report['status']}")
+    rows = [("end-to-end", report["latency"])] + list(report["stages"].items())
+    print(f"{'':<28} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, row in rows:
+        print(f"{name:<28} {row['count']:>6} {row['p50']:>8.3f} {row['p95']:>8.3f} {row['p99']:>8.3f} {row['max']:>8.3f}")
+    memory = report["memory_kib"]
+    if memory["peak"] is not None:
+        print(f"app rss: start {memory['start'] / 1024:.0f}MiB  peak {memory['peak'] / 1024:.0f}MiB  "
+              f"end {memory['end'] / 1024:.0f}MiB")
+    print(f"browsers: app max {report['browsers']['app_max']}, "
+          f"chrome processes max {report['browsers']['chrome_processes_max']}")
+    print(f"marketplace requests {report['marketplace_requests']}")
+    print(f"llm requests {report['llm_requests']}")
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    """压测参数，batch_overlap.py 也使用同一组参数"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--comparisons", type=int, default=20, help="发起的比价总数")
+    parser.add_argument("--concurrency", type=int, default=10, help="同时进行的比价数")
+    parser.add_argument("--mode", choices=("http", "ws", "mixed"), default="mixed")
+    parser.add_argument("--queries", nargs="+", default=["iPhone 13", "iPhone 14 Pro", "Switch OLED", "iPad Air"])
+    parser.add_argument("--max-price", type=float, default=4000)
+    parser.add_argument("--accounts", type=int, default=5, help="轮流使用的账号数")
+    parser.add_argument("--timeout", type=float, default=300, help="单个比价的最长等待时间(秒)")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="HTTP客户端轮询进度的间隔(秒)")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="采样内存和浏览器数的间隔(秒)")
+    parser.add_argument("--llm-latency", type=float, default=0.6, help="LLM每次补全的延迟(秒)")
+    parser.add_argument("--app-port", type=int, default=8910)
+    parser.add_argument("--sim-port", type=int, default=8900)
+    parser.add_argument("--llm-port", type=int, default=8901)
+    parser.add_argument("--app-url", default="", help="压测已经在运行的应用（需自行以模拟后端启动），不启动子进程")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--json", default="", help="把报告另存为JSON文件")
+    add_latency_args(parser)
+    return parser
+
+def main():
+    args = build_parser("端到端压测").parse_args()
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -2,28 +2,64 @@
 # -*- coding: utf-8 -*-
 
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from app.api.routes import router
+from app.api.routes import router, get_coordinator
+from app.services.warmup import warmup
+from app.services.watchlist import watchlist
+from app.services.lifecycle import lifecycle
+from app.services.price_stats import price_index
+from app.services.listing_store import listing_store
+from app.services.image_pipeline import image_pipeline
+from app.services.detail_enricher import detail_enricher
 from config.settings import settings
 from loguru import logger
 import os
 
+STATIC_DIR = "app/static"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时准备资源并在后台预热，关闭时释放"""
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    get_coordinator()
+    watchlist.load()
+    price_index.load()
+    listing_store.start()
+    image_pipeline.start()
+    warmup.start()
+    lifecycle.start()
+    
+    yield
+    
+    # 停止接收新任务，在截止时间内等待运行中的任务结束
+    await lifecycle.drain(settings.SHUTDOWN_DRAIN_TIMEOUT)
+    
+    # 释放所有浏览器，最后回收遗留的Chrome进程
+    watchlist.stop()
+    await warmup.stop()
+    lifecycle.stop_reaper()
+    lifecycle.release_all()
+    lifecycle.reap_orphans()
+    await price_index.stop()
+    await listing_store.stop()
+    await image_pipeline.stop()
+    await detail_enricher.close()
+    if settings.MARKETPLACE_BACKEND == "simulated":
+        from app.services import simulated_marketplace
+        await simulated_marketplace.close_session()
+
 # 创建FastAPI应用
 app = FastAPI(
     title="咸鱼比价助手",
     description="基于多Agent的智能咸鱼比价助手",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# 挂载静态文件
-if not os.path.exists("app/static"):
-    os.makedirs("app/static")
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-
-# 配置模板
-templates = Jinja2Templates(directory="templates")
+# 挂载静态文件，目录在启动时创建
+app.mount("/static", StaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
 
 # 注册路由
 app.include_router(router)